@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Branch, Room, Shift, Employee, Schedule, ShiftPreference
+from .models import Branch, Room, Shift, Employee, Schedule, ShiftPreference, Job
 
 admin.site.register(Branch)
 admin.site.register(Room)
@@ -7,3 +7,4 @@ admin.site.register(Shift)
 admin.site.register(Employee)
 admin.site.register(Schedule)
 admin.site.register(ShiftPreference)
+admin.site.register(Job)
@@ -6,4 +6,5 @@ class ShiftsConfig(AppConfig):
     name = 'shifts'
     
     def ready(self):
-        import shifts.signals
\ No newline at end of file
+        import shifts.signals
+        import shifts.services  # регистрирует обработчики фоновых задач (shifts/jobs.py)
\ No newline at end of file
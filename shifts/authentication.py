@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import Employee, UserTokenState
+from .roles import load_roles, primary_role
+
+# Токены содержат employee_id, branch_id и роль пользователя, поэтому
+# ClaimsJWTAuthentication собирает пользователя запроса из claims без
+# обращения к БД. Отзыв — через версию токенов пользователя (UserTokenState):
+# токены несут claim "ver", revoke_user_tokens увеличивает версию в БД.
+# Для access-токенов версия и is_active пользователя читаются через кэш
+# (TOKEN_STATE_CACHE_SECONDS), при промахе — из БД; refresh всегда сверяется с БД
+# и пересобирает claims из БД.
+
+CLAIMS = ('username', 'employee_id', 'branch_id', 'role')
+VERSION_CLAIM = 'ver'
+TOKEN_STATE_CACHE_SECONDS = getattr(settings, 'TOKEN_STATE_CACHE_SECONDS', 60)
+
+_MISSING_USER = 'missing'
+
+
+def set_user_claims(token, user, token_version=None):
+    """
+    Записывает в токен claims пользователя по данным из БД. token_version —
+    версия, с которой сверялся refresh-токен (иначе текущая из БД).
+    """
+    employee = Employee.objects.filter(user=user).values_list('id', 'branch_id').first()
+    token['username'] = user.username
+    token['employee_id'], token['branch_id'] = employee or (None, None)
+    load_roles(user)
+    token['role'] = primary_role(user)
+    token[VERSION_CLAIM] = current_token_version(user.pk) if token_version is None else token_version
+    return token
+
+
+class EmployeeTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        return set_user_claims(super().get_token(user), user)
+
+
+class TokenPrincipal(TokenUser):
+    """
+    Пользователь запроса, построенный из claims токена. Для операций записи
+    настоящая модель доступна через .user (один запрос, лениво).
+    """
+
+    def __init__(self, token):
+        super().__init__(token)
+        self.employee_id = token.get('employee_id')
+        self.branch_id = token.get('branch_id')
+        self.role = token.get('role')
+        # Роль уже известна — shifts.roles не пойдёт в БД за группами
+        self._shift_roles = frozenset([self.role]) if self.role else frozenset()
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.id)
+
+
+def resolve_user(user):
+    """
+    Настоящий объект User для request.user (TokenPrincipal или User).
+    """
+    return user.user if isinstance(user, TokenPrincipal) else user
+
+
+def _token_state_key(user_id):
+    return f"jwt-token-state:user:{user_id}"
+
+
+def current_token_version(user_id):
+    return UserTokenState.objects.filter(user_id=user_id).values_list('token_version', flat=True).first() or 0
+
+
+def load_token_state(user_id):
+    """
+    (is_active, token_version) из БД или None, если пользователя нет.
+    """
+    row = User.objects.filter(pk=user_id).values_list('is_active', 'token_state__token_version').first()
+    if row is None:
+        return None
+    is_active, token_version = row
+    return is_active, token_version or 0
+
+
+def token_state(user_id):
+    """
+    Как load_token_state, но через кэш.
+    """
+    key = _token_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = load_token_state(user_id) or _MISSING_USER
+        cache.set(key, state, TOKEN_STATE_CACHE_SECONDS)
+    return None if state == _MISSING_USER else state
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отзывает все токены пользователя, выданные до текущего момента.
+    """
+    now = timezone.now()
+    updated = UserTokenState.objects.filter(user_id=user_id).update(
+        token_version=F('token_version') + 1, revoked_at=now,
+    )
+    if not updated and User.objects.filter(pk=user_id).exists():
+        state, created = UserTokenState.objects.get_or_create(
+            user_id=user_id, defaults={'token_version': 1, 'revoked_at': now},
+        )
+        if not created:
+            UserTokenState.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1, revoked_at=now)
+    cache.delete(_token_state_key(user_id))
+
+
+def token_rejection(token, state):
+    """
+    Причина отказа для токена при состоянии пользователя state или None, если токен действителен.
+    """
+    if state is None:
+        return "User not found"
+    is_active, token_version = state
+    if not is_active:
+        return "User is inactive"
+    if token.get(VERSION_CLAIM, 0) != token_version:
+        return "Token has been revoked"
+    return None
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(settings.SIMPLE_JWT['USER_ID_CLAIM'])
+        rejection = token_rejection(validated_token, token_state(user_id))
+        if rejection:
+            raise AuthenticationFailed(rejection, code="token_revoked")
+        if all(claim in validated_token for claim in CLAIMS):
+            return TokenPrincipal(validated_token)
+        # Старые токены без claims — обычная загрузка пользователя из БД
+        return super().get_user(validated_token)
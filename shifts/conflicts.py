@@ -0,0 +1,124 @@
+from .models import Schedule
+from .solver import DAY_INDEX, SHIFT_ORDER, WEEK_DAYS
+
+# Обнаружение двойных назначений: сотрудник стоит в двух местах в один день
+# и тип смены одной недели. Присланная сетка проверяется в памяти против уже
+# сохранённых назначений тех же сотрудников, загруженных одним запросом по
+# индексу ограничения schedule_employee_slot_uniq, поэтому проверка недели
+# линейна по числу ячеек. Само ограничение — последняя защита на уровне БД.
+
+BOOKING_FIELDS = (
+    'id', 'branch_id', 'week_start_date', 'day_of_week', 'shift_type', 'shift__room__name', 'employee_id',
+)
+
+
+def load_bookings(week_start_dates, employee_ids):
+    """
+    Сохранённые назначения сотрудников на недели одним запросом:
+    список (schedule_id, branch_id, week_start_date, day, shift_type, room_name, employee_id).
+    """
+    employee_ids = {employee_id for employee_id in employee_ids if employee_id}
+    if not week_start_dates or not employee_ids:
+        return []
+    return list(Schedule.objects.filter(
+        week_start_date__in=set(week_start_dates),
+        employee_id__in=employee_ids,
+    ).values_list(*BOOKING_FIELDS))
+
+
+def _placement(branch_id, room_name, schedule_id):
+    return {'branch_id': branch_id, 'room': room_name, 'schedule_id': schedule_id}
+
+
+def _double_bookings(placements):
+    return [
+        {
+            'employee_id': employee_id,
+            'week_start_date': week_start_date,
+            'day': day,
+            'shift_type': shift_type,
+            'placements': booked,
+        }
+        for (employee_id, week_start_date, day, shift_type), booked in sorted(
+            placements.items(), key=lambda item: (item[0][0], item[0][1], DAY_INDEX.get(item[0][2], 7), item[0][3]),
+        )
+        if len(booked) > 1
+    ]
+
+
+def find_conflicts(branch_id, cells, replaced=()):
+    """
+    Проверяет итоговые назначения ячеек филиала перед записью.
+    cells — (week_start_date, day, shift_type, room_name, employee_id) по одному
+    на каждую запись ячейки после сохранения (schedule_id, если запись уже есть, шестым элементом:
+    её сохранённое значение заменяется ячейкой и не учитывается);
+    replaced — ключи (week_start_date, day, shift_type, room_name) ячеек филиала,
+    сохранённые значения которых перезаписываются и поэтому не учитываются.
+    Возвращает список двойных назначений (пустой, если конфликтов нет).
+    """
+    cells = [cell for cell in cells if cell[4]]
+    if not cells:
+        return []
+    replaced = set(replaced)
+    own_ids = {cell[5] for cell in cells if len(cell) > 5 and cell[5]}
+
+    placements = {}
+    for cell in cells:
+        week_start_date, day, shift_type, room_name, employee_id = cell[:5]
+        schedule_id = cell[5] if len(cell) > 5 else None
+        placements.setdefault((employee_id, week_start_date, day, shift_type), []).append(
+            _placement(branch_id, room_name, schedule_id),
+        )
+
+    bookings = load_bookings([cell[0] for cell in cells], [cell[4] for cell in cells])
+    for schedule_id, booked_branch_id, week_start_date, day, shift_type, room_name, employee_id in bookings:
+        if schedule_id in own_ids or (booked_branch_id == branch_id and (week_start_date, day, shift_type, room_name) in replaced):
+            continue
+        key = (employee_id, week_start_date, day, shift_type)
+        # Ячейки других сотрудников в том же слоте не нужны
+        if key in placements:
+            placements[key].append(_placement(booked_branch_id, room_name, schedule_id))
+
+    return _double_bookings(placements)
+
+
+def week_conflicts(branch, week_start_date):
+    """
+    Отчёт по неделе филиала для всех сотрудников, назначенных в филиал, с учётом
+    их смен в других филиалах: двойные назначения и вечерняя смена перед утренней
+    на следующий день. Один запрос.
+    """
+    branch_employees = Schedule.objects.filter(
+        branch=branch, week_start_date=week_start_date, employee__isnull=False,
+    ).values('employee_id')
+    rows = Schedule.objects.filter(
+        week_start_date=week_start_date, employee_id__in=branch_employees,
+    ).order_by('id').values_list(*BOOKING_FIELDS)
+
+    placements = {}
+    for schedule_id, branch_id, _, day, shift_type, room_name, employee_id in rows:
+        placements.setdefault((employee_id, week_start_date, day, shift_type), []).append(
+            _placement(branch_id, room_name, schedule_id),
+        )
+
+    rest_violations = []
+    morning, evening = SHIFT_ORDER[0], SHIFT_ORDER[-1]
+    for (employee_id, _, day, shift_type), booked in sorted(placements.items(), key=lambda item: (item[0][0], DAY_INDEX.get(item[0][2], 7))):
+        day_index = DAY_INDEX.get(day)
+        if shift_type != evening or day_index is None or day_index == len(WEEK_DAYS) - 1:
+            continue
+        next_day = WEEK_DAYS[day_index + 1]
+        next_morning = placements.get((employee_id, week_start_date, next_day, morning))
+        if next_morning:
+            rest_violations.append({
+                'employee_id': employee_id,
+                'evening': {'day': day, 'placements': booked},
+                'morning': {'day': next_day, 'placements': next_morning},
+            })
+
+    return {
+        'branch_id': branch.id,
+        'week_start_date': week_start_date,
+        'double_bookings': _double_bookings(placements),
+        'rest_violations': rest_violations,
+    }
@@ -0,0 +1,162 @@
+import csv
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, Sum, Value, When
+from .models import Schedule
+
+# Потоковые выгрузки: строки читаются из БД через values() + iterator()
+# порциями и сразу отдаются клиенту, поэтому память не растёт с объёмом.
+
+EXPORT_CHUNK_SIZE = 2000
+
+RANGE_FIELDS = (
+    'id', 'branch_id', 'week_start_date', 'status',
+    'shift__shift_type', 'shift__day_of_week', 'shift__room_id', 'shift__room__name',
+    'employee_id', 'employee__user__first_name', 'employee__user__last_name',
+)
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def schedule_range_rows(branch_ids, start_date, end_date, statuses=None):
+    """
+    Записи расписания за диапазон недель (по week_start_date, включительно)
+    в формате элементов GetScheduleView плюс branch_id и status.
+    """
+    schedules = Schedule.objects.filter(week_start_date__range=(start_date, end_date))
+    if branch_ids:
+        schedules = schedules.filter(branch_id__in=branch_ids)
+    if statuses:
+        schedules = schedules.filter(status__in=statuses)
+    rows = schedules.order_by('week_start_date', 'branch_id', 'id').values_list(*RANGE_FIELDS)
+
+    for (schedule_id, branch_id, week_start_date, status, shift_type, day, room_id, room_name,
+         employee_id, first_name, last_name) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            "id": schedule_id,
+            "branch_id": branch_id,
+            "status": status,
+            "week_start_date": week_start_date,
+            "shift_details": {
+                "shift_type": shift_type,
+                "room": room_name,
+                "room_details": {"id": room_id, "name": room_name},
+            },
+            "day": day,
+            "employee_name": f"{first_name} {last_name}".strip() if employee_id else None,
+            "employee_id": employee_id,
+        }
+
+
+def _buffered(parts, size=500):
+    """
+    Склеивает мелкие части в блоки, чтобы не писать в сокет по строке.
+    """
+    buffer = []
+    for part in parts:
+        buffer.append(part)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_ndjson(rows):
+    return _buffered(_dumps(row) + '\n' for row in rows)
+
+
+def _json_array_parts(rows):
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + _dumps(row)
+        separator = ',\n'
+    yield ']'
+
+
+def iter_json_array(rows):
+    """
+    Один JSON-массив, отдаваемый по частям.
+    """
+    return _buffered(_json_array_parts(rows))
+
+
+# Зарплатная выгрузка: количество смен и часы по сотрудникам считаются в БД
+# одним GROUP BY. Длительность — end_time - start_time (через полночь +24ч),
+# если время смены не задано — по умолчанию для типа смены из настроек.
+
+DEFAULT_SHIFT_HOURS = 8
+
+PAYROLL_HEADER = ['employee_id', 'first_name', 'last_name', 'branch', 'shifts', 'hours']
+
+
+def _shift_duration():
+    default_hours = getattr(settings, 'PAYROLL_DEFAULT_SHIFT_HOURS', {})
+    timed = ExpressionWrapper(F('shift__end_time') - F('shift__start_time'), output_field=DurationField())
+    return Case(
+        When(
+            shift__start_time__isnull=False, shift__end_time__isnull=False,
+            shift__end_time__lt=F('shift__start_time'),
+            then=ExpressionWrapper(timed + Value(timedelta(days=1)), output_field=DurationField()),
+        ),
+        When(shift__start_time__isnull=False, shift__end_time__isnull=False, then=timed),
+        *[
+            When(shift__shift_type=shift_type, then=Value(timedelta(hours=hours)))
+            for shift_type, hours in default_hours.items()
+        ],
+        default=Value(timedelta(hours=DEFAULT_SHIFT_HOURS)),
+        output_field=DurationField(),
+    )
+
+
+def payroll_rows(start_date, end_date, branch_ids=None, statuses=(Schedule.APPROVED,)):
+    """
+    (employee_id, first_name, last_name, branch, shifts, hours) по сотрудникам
+    за недели с week_start_date в [start_date, end_date].
+    """
+    schedules = Schedule.objects.filter(
+        week_start_date__range=(start_date, end_date),
+        employee__isnull=False,
+    )
+    if branch_ids:
+        schedules = schedules.filter(branch_id__in=branch_ids)
+    if statuses:
+        schedules = schedules.filter(status__in=statuses)
+
+    rows = schedules.values(
+        'employee_id', 'employee__user__first_name', 'employee__user__last_name', 'employee__branch__name',
+    ).annotate(
+        shifts=Count('id'),
+        duration=Sum(_shift_duration()),
+    ).order_by('employee_id').values_list(
+        'employee_id', 'employee__user__first_name', 'employee__user__last_name', 'employee__branch__name',
+        'shifts', 'duration',
+    )
+
+    for employee_id, first_name, last_name, branch_name, shifts, duration in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        hours = round(duration.total_seconds() / 3600, 2) if duration else 0
+        yield employee_id, first_name, last_name, branch_name, shifts, hours
+
+
+class _Echo:
+    """
+    Псевдо-файл для csv.writer: write() возвращает строку, а не пишет её.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo())
+    return _buffered(writer.writerow(row) for row in _with_header(header, rows))
+
+
+def _with_header(header, rows):
+    yield header
+    yield from rows
@@ -0,0 +1,172 @@
+from operator import itemgetter
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него используется стандартный json
+    orjson = None
+
+# Быстрая сериализация списков только для чтения. Вместо ModelSerializer
+# (создание полей и обход атрибутов на каждую строку) данные берутся одним
+# values_list() и собираются в dict заранее скомпилированными извлекателями.
+# Результат совпадает с соответствующим ModelSerializer байт в байт.
+
+
+class Nested:
+    """
+    Вложенный объект; None, если значение null_if в строке равно None.
+    """
+
+    def __init__(self, fields, null_if=None):
+        self.fields = fields
+        self.null_if = null_if
+
+
+class Computed:
+    """
+    Значение, вычисляемое из нескольких колонок: func(*values).
+    """
+
+    def __init__(self, func, *paths):
+        self.func = func
+        self.paths = paths
+
+
+def iso(value):
+    return value.isoformat() if value is not None else None
+
+
+class RowSerializer:
+    """
+    fields — список (ключ, источник), где источник — путь values_list
+    ('employee__user__first_name'), пара (путь, функция преобразования), Nested или Computed.
+    """
+
+    def __init__(self, fields):
+        self.columns = []
+        self._build = self._compile(fields)
+
+    def _column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return self.columns.index(path)
+
+    def _compile(self, fields):
+        getters = []
+        for key, source in fields:
+            if isinstance(source, Nested):
+                build = self._compile(source.fields)
+                if source.null_if:
+                    guard = itemgetter(self._column(source.null_if))
+                    getter = lambda row, build=build, guard=guard: None if guard(row) is None else build(row)
+                else:
+                    getter = build
+            elif isinstance(source, Computed):
+                indexes = [self._column(path) for path in source.paths]
+                getter = lambda row, func=source.func, indexes=indexes: func(*[row[i] for i in indexes])
+            elif isinstance(source, tuple):
+                path, convert = source
+                value = itemgetter(self._column(path))
+                getter = lambda row, convert=convert, value=value: convert(value(row))
+            else:
+                getter = itemgetter(self._column(source))
+            getters.append((key, getter))
+        return lambda row: {key: getter(row) for key, getter in getters}
+
+    def rows(self, queryset):
+        """
+        queryset кортежей нужных колонок (например, для пагинации).
+        """
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, queryset):
+        """
+        Список dict-ов по queryset или по уже полученным кортежам из rows().
+        """
+        rows = self.rows(queryset) if hasattr(queryset, 'values_list') else queryset
+        build = self._build
+        return [build(row) for row in rows]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson (если установлен), с тем же выводом:
+    компактные разделители, UTF-8, даты через encoder DRF, экранирование U+2028/U+2029.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+ROOM_ROWS = RowSerializer([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('branch', 'branch_id'),
+])
+
+EMPLOYEE_ROWS = RowSerializer([
+    ('id', 'id'),
+    ('phone_number', 'phone_number'),
+    ('notes', 'notes'),
+    ('user', Nested([
+        ('username', 'user__username'),
+        ('first_name', 'user__first_name'),
+        ('last_name', 'user__last_name'),
+        ('email', 'user__email'),
+    ])),
+    ('branch', Nested([
+        ('id', 'branch__id'),
+        ('name', 'branch__name'),
+        ('location', 'branch__location'),
+        ('notes', 'branch__notes'),
+    ], null_if='branch_id')),
+])
+
+SHIFT_PREFERENCE_ROWS = RowSerializer([
+    ('id', 'id'),
+    ('employee_details', Nested([
+        ('first_name', 'employee__user__first_name'),
+        ('last_name', 'employee__user__last_name'),
+    ])),
+    ('week_start_date', ('week_start_date', iso)),
+    ('day', 'day'),
+    ('shift_type', 'shift_type'),
+    ('status', 'status'),
+    ('employee', 'employee_id'),
+    ('branch', 'branch_id'),
+    ('room', 'room_id'),
+])
+
+SCHEDULE_ROWS = RowSerializer([
+    ('week_start_date', ('week_start_date', iso)),
+    ('branch', 'branch_id'),
+    ('shift', 'shift_id'),
+    ('shift_details', Nested([
+        ('room', 'shift__room__name'),
+        ('shift_type', 'shift__shift_type'),
+    ])),
+    ('employee', 'employee_id'),
+    ('employee_name', Computed(
+        lambda employee_id, first_name, last_name: f"{first_name} {last_name}" if employee_id else None,
+        'employee_id', 'employee__user__first_name', 'employee__user__last_name',
+    )),
+    ('employee_details', Nested([
+        ('username', 'employee__user__username'),
+        ('first_name', 'employee__user__first_name'),
+        ('last_name', 'employee__user__last_name'),
+        ('email', 'employee__user__email'),
+    ], null_if='employee_id')),
+    ('room_details', Nested([
+        ('id', 'shift__room_id'),
+        ('name', 'shift__room__name'),
+    ])),
+    ('status', 'status'),
+])
@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db.models import Q
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from .models import Job
+import logging
+import threading
+
+logger = logging.getLogger('system_logger')
+
+# Фоновые задачи: запрос записывает Job и сразу отвечает id задачи,
+# выполняет её пул потоков — в этом же процессе после коммита
+# (если JOBS_AUTORUN) или management-командой run_jobs.
+# Пока задача выполняется, поток-heartbeat раз в JOBS_HEARTBEAT_SECONDS
+# обновляет Job.heartbeat_at. Задачи running без heartbeat дольше
+# JOBS_RUNNING_TIMEOUT (процесс упал или был перезапущен посреди задачи)
+# возвращаются в очередь; долгая, но живая задача повторно не запускается.
+# Обработчики регистрируются декоратором @job_handler(kind) и получают
+# (payload, progress), где progress(percent) обновляет прогресс задачи.
+
+JOB_WORKERS = 2
+JOBS_HEARTBEAT_SECONDS = getattr(settings, 'JOBS_HEARTBEAT_SECONDS', 30)
+JOBS_RUNNING_TIMEOUT = getattr(settings, 'JOBS_RUNNING_TIMEOUT', 5 * 60)  # секунды без heartbeat
+
+_handlers = {}
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='jobs')
+
+
+class JobError(Exception):
+    """
+    Ожидаемая ошибка задачи: сообщение сохраняется в Job.error как есть.
+    """
+
+
+def job_handler(kind):
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, user_id=None):
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job.objects.create(kind=kind, payload=payload, created_by_id=user_id)
+    if getattr(settings, 'JOBS_AUTORUN', True):
+        transaction.on_commit(lambda: _submit([job.pk] + requeue_stale()))
+    return job
+
+
+def _submit(job_ids):
+    for job_id in job_ids:
+        _executor.submit(_run_in_thread, job_id)
+
+
+def _run_in_thread(job_id):
+    try:
+        job = claim(job_id)
+        if job is not None:
+            run_job(job)
+    except Exception:
+        logger.exception(f"Job {job_id} crashed")
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+def claim(job_id):
+    """
+    Атомарно переводит задачу queued -> running. None, если её уже взял другой воркер.
+    """
+    now = timezone.now()
+    if not Job.objects.filter(pk=job_id, status=Job.QUEUED).update(status=Job.RUNNING, started_at=now, heartbeat_at=now):
+        return None
+    return Job.objects.get(pk=job_id)
+
+
+def _stale(timeout):
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Q(status=Job.RUNNING) & (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff))
+
+
+def requeue_stale(timeout=None):
+    """
+    Возвращает в очередь задачи running без heartbeat дольше timeout секунд.
+    Возвращает id задач, которые вернул именно этот вызов.
+    """
+    timeout = JOBS_RUNNING_TIMEOUT if timeout is None else timeout
+    stale_ids = list(Job.objects.filter(_stale(timeout)).values_list('id', flat=True))
+    requeued = [
+        job_id for job_id in stale_ids
+        # Условие повторяется в UPDATE: задачу мог вернуть другой процесс или оживить heartbeat
+        if Job.objects.filter(_stale(timeout), pk=job_id).update(
+            status=Job.QUEUED, started_at=None, heartbeat_at=None, progress=0,
+        )
+    ]
+    if requeued:
+        logger.warning(f"Requeued stale running jobs: {requeued}")
+    return requeued
+
+
+def claim_batch(limit):
+    requeue_stale()
+    claimed = []
+    for job_id in Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True)[:limit]:
+        job = claim(job_id)
+        if job is not None:
+            claimed.append(job)
+    return claimed
+
+
+def _heartbeat(job_id, stop):
+    try:
+        while not stop.wait(JOBS_HEARTBEAT_SECONDS):
+            Job.objects.filter(pk=job_id, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+    except Exception:
+        logger.exception(f"Job {job_id} heartbeat failed")
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    def progress(percent):
+        Job.objects.filter(pk=job.pk).update(progress=max(0, min(100, int(percent))), heartbeat_at=timezone.now())
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.pk, stop), name=f'job-{job.pk}-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        result = _handlers[job.kind](job.payload, progress)
+    except JobError as e:
+        _finish(job, Job.FAILED, error=str(e))
+    except Exception as e:
+        logger.exception(f"Job {job.pk} ({job.kind}) failed")
+        _finish(job, Job.FAILED, error=str(e))
+    else:
+        _finish(job, Job.SUCCEEDED, result=result)
+    finally:
+        stop.set()
+        heartbeat.join()
+    return job
+
+
+def _finish(job, status, result=None, error=''):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    fields = {'status': status, 'result': result, 'error': error, 'finished_at': job.finished_at}
+    if status == Job.SUCCEEDED:
+        job.progress = fields['progress'] = 100
+    Job.objects.filter(pk=job.pk).update(**fields)
+    logger.info(f"Job {job.pk} ({job.kind}) {status}")
+
+
+def serialize_job(job):
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'result': job.result,
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
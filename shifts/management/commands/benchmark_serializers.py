@@ -0,0 +1,101 @@
+import time
+from datetime import date
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from shifts.fast_serializers import (
+    EMPLOYEE_ROWS, ROOM_ROWS, SCHEDULE_ROWS, SHIFT_PREFERENCE_ROWS, FastJSONRenderer,
+)
+from shifts.models import Branch, Employee, Room, Schedule, Shift, ShiftPreference
+from shifts.serializers import EmployeeSerializer, RoomSerializer, ScheduleSerializer, ShiftPreferenceSerializer
+
+WEEK = date(2000, 1, 2)
+
+
+def _fixture(rows):
+    branch = Branch.objects.create(name='benchmark', location='בדיקה', notes='line\u2028separator')
+    rooms = Room.objects.bulk_create([Room(name=f'חדר {i}', branch=branch) for i in range(rows)])
+    users = User.objects.bulk_create([
+        User(username=f'benchmark-{i}', first_name='שם', last_name=f'Last {i}', email=f'{i}@example.com')
+        for i in range(rows)
+    ])
+    employees = Employee.objects.bulk_create([
+        Employee(user=user, branch=branch if i % 10 else None, phone_number='050', notes=None if i % 2 else 'הערה')
+        for i, user in enumerate(users)
+    ])
+    ShiftPreference.objects.bulk_create([
+        ShiftPreference(employee=employee, branch=branch, week_start_date=WEEK, day='ראשון',
+                        shift_type=Shift.MORNING, room=rooms[i])
+        for i, employee in enumerate(employees)
+    ])
+    shifts = Shift.objects.bulk_create([
+        Shift(room=room, shift_type=Shift.EVENING, day_of_week='שני', date=WEEK) for room in rooms
+    ])
+    Schedule.objects.bulk_create([
+        Schedule(branch=branch, week_start_date=WEEK, shift=shift, employee=employees[i] if i % 3 else None)
+        for i, shift in enumerate(shifts)
+    ])
+    return branch
+
+
+def _cases(branch):
+    """
+    (имя, старый путь, быстрый путь): оба возвращают байты ответа.
+    """
+    renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    rooms = Room.objects.filter(branch=branch).order_by('id')
+    employees = Employee.objects.filter(user__username__startswith='benchmark-').order_by('id')
+    preferences = ShiftPreference.objects.filter(branch=branch).order_by('id')
+    schedules = Schedule.objects.filter(branch=branch).order_by('id')
+    return [
+        ('RoomSerializer',
+         lambda: renderer.render(RoomSerializer(rooms, many=True).data),
+         lambda: fast_renderer.render(ROOM_ROWS.serialize(rooms))),
+        ('EmployeeSerializer',
+         lambda: renderer.render(EmployeeSerializer(employees.select_related('user', 'branch'), many=True).data),
+         lambda: fast_renderer.render(EMPLOYEE_ROWS.serialize(employees))),
+        ('ShiftPreferenceSerializer',
+         lambda: renderer.render(ShiftPreferenceSerializer(preferences.select_related('employee__user'), many=True).data),
+         lambda: fast_renderer.render(SHIFT_PREFERENCE_ROWS.serialize(preferences))),
+        ('ScheduleSerializer',
+         lambda: renderer.render(ScheduleSerializer(schedules.select_related('shift__room', 'employee__user'), many=True).data),
+         lambda: fast_renderer.render(SCHEDULE_ROWS.serialize(schedules))),
+    ]
+
+
+def _best(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = "Compares per-row cost of the fast list serializers with the DRF serializers (fixture data is rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        mismatches = []
+        with transaction.atomic():
+            branch = _fixture(rows)
+            for name, drf, fast in _cases(branch):
+                if drf() != fast():
+                    mismatches.append(name)
+                    self.stdout.write(self.style.ERROR(f"{name}: fast output differs"))
+                    continue
+                drf_time = _best(drf, options['runs'])
+                fast_time = _best(fast, options['runs'])
+                self.stdout.write(
+                    f"{name}: {drf_time / rows * 1e6:.1f} us/row -> {fast_time / rows * 1e6:.1f} us/row "
+                    f"({drf_time / fast_time:.1f}x), identical output"
+                )
+            transaction.set_rollback(True)
+        if mismatches:
+            raise CommandError(f"Output differs for {', '.join(mismatches)}")
@@ -0,0 +1,43 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from shifts.solver import SLOTS_PER_DAY, WEEK_DAYS, assign
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the shift-assignment solver on a synthetic week (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=50)
+        parser.add_argument('--rooms', type=int, default=20)
+        parser.add_argument('--preferences', type=int, default=30, help='Preferences per employee.')
+        parser.add_argument('--max-shifts', type=int, default=6)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--max-ms', type=float, default=None, help='Fail if the median run is slower.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        slots = len(WEEK_DAYS) * SLOTS_PER_DAY
+        cells = [(slot, room_id) for slot in range(slots) for room_id in range(options['rooms'])]
+        preferences = [
+            (employee_id, slot, room_id, rng.choice((1, 2)))
+            for employee_id in range(options['employees'])
+            for slot, room_id in rng.sample(cells, min(options['preferences'], len(cells)))
+        ]
+
+        timings = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            result = assign(cells, preferences, options['max_shifts'])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        median = timings[len(timings) // 2]
+
+        self.stdout.write(
+            f"{options['employees']} employees, {options['rooms']} rooms, {len(cells)} cells, "
+            f"{len(preferences)} preferences: assigned {len(result)}; "
+            f"median {median:.2f} ms, max {timings[-1]:.2f} ms over {options['runs']} runs"
+        )
+        if options['max_ms'] is not None and median > options['max_ms']:
+            raise CommandError(f"Median {median:.2f} ms exceeds {options['max_ms']} ms")
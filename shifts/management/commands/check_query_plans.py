@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from shifts.query_plans import explain, full_scans, hot_queries
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the hot API queries and fails if any of them does a full table scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plan checks are not supported for {connection.vendor}")
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            plan = explain(queryset)
+            scanned = full_scans(plan)
+            if options['verbose_plans']:
+                self.stdout.write(f"{name}:\n{plan}\n")
+            if scanned:
+                failures.append(f"{name}: full scan of {', '.join(scanned)}")
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: full scan of {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+
+        if failures:
+            raise CommandError(f"{len(failures)} queries regressed to a full table scan")
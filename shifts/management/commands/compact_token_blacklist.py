@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = "Deletes expired outstanding/blacklisted refresh tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted_outstanding = deleted_blacklisted = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lt=now)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            # Истёкший токен отклоняется по exp и без записи в blacklist
+            deleted_blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            deleted_outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(f"Deleted {deleted_outstanding} outstanding and {deleted_blacklisted} blacklisted tokens")
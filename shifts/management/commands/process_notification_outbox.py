@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from shifts.notifications import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Delivers pending notification outbox events (once, or continuously with --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls in --loop mode.')
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = drain_outbox(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f"Processed {processed} outbox events")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
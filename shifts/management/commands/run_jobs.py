@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from shifts.jobs import JOB_WORKERS, claim_batch, run_job
+
+
+def _run(job):
+    try:
+        run_job(job)
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs in a thread pool (once, or continuously with --loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the job queue.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls in --loop mode.')
+        parser.add_argument('--workers', type=int, default=JOB_WORKERS)
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='jobs') as executor:
+            while True:
+                jobs = claim_batch(options['workers'])
+                if jobs:
+                    wait([executor.submit(_run, job) for job in jobs])
+                    for job in jobs:
+                        self.stdout.write(f"Job {job.pk} ({job.kind}): {job.status}")
+                elif not options['loop']:
+                    break
+                else:
+                    time.sleep(options['interval'])
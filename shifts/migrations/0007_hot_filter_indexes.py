@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0006_shiftpreference_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['employee', '-created_at'], name='notification_emp_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['branch', 'status', 'week_start_date'], name='schedule_branch_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['branch', 'week_start_date'], name='schedule_branch_week_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['room', 'shift_type', 'day_of_week'], name='shift_room_type_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shiftpreference',
+            index=models.Index(fields=['branch', 'week_start_date'], name='shiftpref_branch_week_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:52
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_unread_notifications(apps, schema_editor):
+    Employee = apps.get_model('shifts', 'Employee')
+    counts = Employee.objects.annotate(unread=Count('notification', filter=Q(notification__is_read=False)))
+    for employee in counts.filter(unread__gt=0):
+        Employee.objects.filter(pk=employee.pk).update(unread_notifications=employee.unread)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0007_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-18 00:54
+
+import re
+import django.db.models.deletion
+from django.db import migrations, models
+
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def backfill_notification_keys(apps, schema_editor):
+    # Разбираем старые тексты: уведомление администратору о неделе и
+    # уведомления сотрудникам об утверждённых сменах
+    Notification = apps.get_model('shifts', 'Notification')
+    seen = set()
+    batch = []
+    notifications = Notification.objects.select_related('employee').order_by('id')
+    for notification in notifications.iterator(chunk_size=2000):
+        match = DATE_RE.search(notification.message)
+        if not match:
+            continue
+        week_start_date = match.group(0)
+        branch_id = notification.employee.branch_id
+        if 'כל המשמרות אושרו לשבוע' in notification.message:
+            key = (notification.employee_id, branch_id, week_start_date)
+            if key in seen:
+                continue  # старый дубликат остаётся без ключа
+            seen.add(key)
+            notification.kind = 'week_approved'
+        elif 'שלך' in notification.message:
+            notification.kind = 'shift_approved'
+        else:
+            continue
+        notification.branch_id = branch_id
+        notification.week_start_date = week_start_date
+        batch.append(notification)
+        if len(batch) >= 500:
+            Notification.objects.bulk_update(batch, ['kind', 'branch', 'week_start_date'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['kind', 'branch', 'week_start_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0009_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shifts.branch'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('', 'General'), ('shift_approved', 'Shift approved'), ('week_approved', 'Week approved')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='week_start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_notification_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'week_approved')), fields=('employee', 'kind', 'branch', 'week_start_date'), name='unique_week_approved_notification'),
+        ),
+    ]
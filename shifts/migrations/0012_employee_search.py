@@ -0,0 +1,99 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:07
+
+import re
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+# Копии shifts.search на момент миграции: миграция не должна зависеть от
+# текущего кода приложения.
+
+FTS_TABLE = 'shifts_employee_search'
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+]
+
+POSTGRESQL_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS employee_search_trgm_idx ON shifts_employee USING gin (search_text gin_trgm_ops)",
+]
+
+
+def build_search_text(first_name, last_name, username, phone_number):
+    parts = [first_name, last_name, username, phone_number]
+    digits = re.sub(r'\D', '', phone_number or '')
+    if digits and digits != phone_number:
+        parts.append(digits)
+    return ' '.join(part for part in parts if part).lower()
+
+
+def backfill_search_text(apps, schema_editor):
+    Employee = apps.get_model('shifts', 'Employee')
+    batch = []
+    for employee in Employee.objects.select_related('user').order_by('id').iterator(chunk_size=2000):
+        employee.search_text = build_search_text(
+            employee.user.first_name, employee.user.last_name, employee.user.username, employee.phone_number,
+        )
+        batch.append(employee)
+        if len(batch) >= 500:
+            Employee.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    Employee.objects.bulk_update(batch, ['search_text'])
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INDEX_SQL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"search_text, content='shifts_employee', content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:
+                return  # SQLite без FTS5 или trigram-токенизатора (< 3.34)
+            for sql in SQLITE_INDEX_SQL:
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS employee_search_trgm_idx")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        # Trigram GIN на PostgreSQL, FTS5-таблица с триггерами на SQLite
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:12
+
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger('system_logger')
+
+DRAFT = 'draft'
+
+
+def backfill_slot_fields(apps, schema_editor):
+    Schedule = apps.get_model('shifts', 'Schedule')
+    batch = []
+    for schedule in Schedule.objects.select_related('shift').order_by('id').iterator(chunk_size=2000):
+        schedule.day_of_week = schedule.shift.day_of_week
+        schedule.shift_type = schedule.shift.shift_type
+        batch.append(schedule)
+        if len(batch) >= 500:
+            Schedule.objects.bulk_update(batch, ['day_of_week', 'shift_type'])
+            batch = []
+    Schedule.objects.bulk_update(batch, ['day_of_week', 'shift_type'])
+
+
+def release_double_bookings(apps, schema_editor):
+    # Перед созданием ограничения: из нескольких записей сотрудника на один слот
+    # остаётся утверждённая (или самая ранняя, если все черновики), в остальных
+    # черновиках сотрудник снимается, каждая такая запись пишется в лог.
+    # Утверждённые недели не меняются: если в слоте больше одной утверждённой
+    # записи, миграция прерывается со списком их id.
+    Schedule = apps.get_model('shifts', 'Schedule')
+    slots = {}
+    rows = Schedule.objects.filter(employee__isnull=False).order_by('id').values_list(
+        'id', 'status', 'employee_id', 'week_start_date', 'day_of_week', 'shift_type',
+    )
+    for schedule_id, status, *slot in rows.iterator(chunk_size=2000):
+        slots.setdefault(tuple(slot), []).append((schedule_id, status))
+
+    released = []
+    unresolved = []
+    for slot, booked in slots.items():
+        if len(booked) < 2:
+            continue
+        approved = [schedule_id for schedule_id, status in booked if status != DRAFT]
+        if len(approved) > 1:
+            unresolved.append(approved)
+            continue
+        keep = approved[0] if approved else booked[0][0]
+        released.extend((schedule_id, slot, keep) for schedule_id, _ in booked if schedule_id != keep)
+
+    if unresolved:
+        raise RuntimeError(
+            "Employees are double-booked in approved schedules; resolve these schedule ids "
+            f"before migrating: {unresolved}"
+        )
+    for schedule_id, (employee_id, week_start_date, day, shift_type), keep in released:
+        logger.warning(
+            f"Migration 0013: released employee {employee_id} from draft schedule {schedule_id} "
+            f"({week_start_date} {day} {shift_type}), kept schedule {keep}"
+        )
+    ids = [schedule_id for schedule_id, _, _ in released]
+    for start in range(0, len(ids), 500):
+        Schedule.objects.filter(id__in=ids[start:start + 500]).update(employee=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0012_employee_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='day_of_week',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='shift_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=10),
+        ),
+        migrations.RunPython(backfill_slot_fields, migrations.RunPython.noop),
+        migrations.RunPython(release_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='schedule',
+            constraint=models.UniqueConstraint(condition=models.Q(('employee__isnull', False)), fields=('employee', 'week_start_date', 'day_of_week', 'shift_type'), name='schedule_employee_slot_uniq'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:16
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия shifts.solver.DAY_OFFSETS на момент миграции: смещение дня от воскресенья,
+# дни на иврите (данные) и по-английски (choices Shift.DAYS_OF_WEEK)
+DAY_OFFSETS = {
+    'ראשון': 0, 'שני': 1, 'שלישי': 2, 'רביעי': 3, 'חמישי': 4, 'שישי': 5, 'שבת': 6,
+    'Sunday': 0, 'Monday': 1, 'Tuesday': 2, 'Wednesday': 3, 'Thursday': 4, 'Friday': 5, 'Saturday': 6,
+}
+
+
+def shift_date(week_start_date, day):
+    day_index = DAY_OFFSETS.get(day)
+    if week_start_date is None or day_index is None:
+        return None
+    return week_start_date + timedelta(days=day_index)
+
+
+def backfill_calendar_date(apps, schema_editor):
+    Shift = apps.get_model('shifts', 'Shift')
+    batch = []
+    for shift in Shift.objects.only('id', 'date', 'day_of_week').order_by('id').iterator(chunk_size=2000):
+        shift.calendar_date = shift_date(shift.date, shift.day_of_week)
+        batch.append(shift)
+        if len(batch) >= 500:
+            Shift.objects.bulk_update(batch, ['calendar_date'])
+            batch = []
+    Shift.objects.bulk_update(batch, ['calendar_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0013_schedule_employee_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shift',
+            name='calendar_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_calendar_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['room', 'calendar_date', 'shift_type'], name='shift_room_date_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['calendar_date', 'shift_type'], name='shift_date_type_idx'),
+        ),
+    ]
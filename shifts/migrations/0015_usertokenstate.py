@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('shifts', '0014_shift_calendar_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTokenState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='token_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('token_version', models.PositiveIntegerField(default=0)),
+                ('revoked_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
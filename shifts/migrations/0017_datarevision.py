@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shifts', '0016_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataRevision',
+            fields=[
+                ('scope', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('revision', models.BigIntegerField()),
+            ],
+        ),
+    ]
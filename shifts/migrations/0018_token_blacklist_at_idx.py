@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Индекс для догрузки фильтра blacklist по окну blacklisted_at
+    # (shifts/token_revocation.py). Таблица принадлежит simplejwt, поэтому RunSQL.
+
+    dependencies = [
+        ('shifts', '0017_datarevision'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS token_blacklist_at_idx ON token_blacklist_blacklistedtoken (blacklisted_at)",
+            "DROP INDEX IF EXISTS token_blacklist_at_idx",
+        ),
+    ]
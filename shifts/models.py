@@ -50,7 +50,9 @@ class Shift(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     shift_type = models.CharField(max_length=10, choices=SHIFT_TYPES)
     day_of_week = models.CharField(max_length=10, choices=DAYS_OF_WEEK)  # Используем CHOICES для дней недели
-    date = models.DateField(default=timezone.now)
+    date = models.DateField(default=timezone.now)  # Начало недели
+    # Дата самой смены: date + номер дня недели; ведётся сигналом pre_save и пакетными операциями shifts/services.py
+    calendar_date = models.DateField(null=True, blank=True, editable=False)
     start_time = models.TimeField(null=True, blank=True)
     end_time = models.TimeField(null=True, blank=True)
     employee = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -58,6 +60,13 @@ class Shift(models.Model):
 
     class Meta:
         unique_together = ('room', 'shift_type', 'date', 'start_time')  # Ограничение уникальности для предотвращения конфликтов смен
+        indexes = [
+            models.Index(fields=['room', 'shift_type', 'day_of_week'], name='shift_room_type_day_idx'),
+            # Смены комнаты по датам
+            models.Index(fields=['room', 'calendar_date', 'shift_type'], name='shift_room_date_type_idx'),
+            # DayView: все филиалы на дату (или диапазон дат)
+            models.Index(fields=['calendar_date', 'shift_type'], name='shift_date_type_idx'),
+        ]
         
     def __str__(self):
         return f"{self.get_shift_type_display()} - {self.get_day_of_week_display()} ({self.room.branch.name}, {self.room.name})"
@@ -69,6 +78,8 @@ class Employee(models.Model):
     phone_number = models.CharField(max_length=15)
     notes = models.TextField(null=True, blank=True)
     branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True)
+    unread_notifications = models.PositiveIntegerField(default=0)  # Счётчик непрочитанных, ведётся в shifts/notifications.py
+    search_text = models.TextField(default='', blank=True, editable=False)  # Имя, логин и телефон для поиска, ведётся в shifts/search.py
 
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} ({self.branch.name})"
@@ -93,17 +104,67 @@ class Schedule(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True, blank=True)  # Сотрудник
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)  # Связь с филиалом
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DRAFT)  # Статус расписания
+    # Копия полей смены для ограничения уникальности: ведётся в save(), пакетных операциях shifts/services.py и сигнале Shift
+    day_of_week = models.CharField(max_length=10, blank=True, default='', editable=False)
+    shift_type = models.CharField(max_length=10, blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # GetScheduleView, AvailableWeeksView: branch + status (+ неделя)
+            models.Index(fields=['branch', 'status', 'week_start_date'], name='schedule_branch_status_idx'),
+            # Save/Update/удаление недели: branch + неделя без статуса
+            models.Index(fields=['branch', 'week_start_date'], name='schedule_branch_week_idx'),
+        ]
+        constraints = [
+            # Сотрудник не может стоять в двух местах в один день и тип смены (shifts/conflicts.py)
+            models.UniqueConstraint(
+                fields=['employee', 'week_start_date', 'day_of_week', 'shift_type'],
+                condition=models.Q(employee__isnull=False),
+                name='schedule_employee_slot_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.week_start_date} - {self.branch.name} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        self.day_of_week = self.shift.day_of_week
+        self.shift_type = self.shift.shift_type
+        super().save(*args, **kwargs)
+
 
 class Notification(models.Model):
+    GENERAL = ''
+    SHIFT_APPROVED = 'shift_approved'
+    WEEK_APPROVED = 'week_approved'
+    KIND_CHOICES = [
+        (GENERAL, 'General'),
+        (SHIFT_APPROVED, 'Shift approved'),
+        (WEEK_APPROVED, 'Week approved'),
+    ]
+
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
-    
+    # Структурированный ключ для дедупликации вместо поиска по тексту сообщения
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=GENERAL, blank=True)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True)
+    week_start_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', '-created_at'], name='notification_emp_created_idx'),
+        ]
+        constraints = [
+            # Одно уведомление администратору на неделю филиала
+            models.UniqueConstraint(
+                fields=['employee', 'kind', 'branch', 'week_start_date'],
+                condition=models.Q(kind='week_approved'),
+                name='unique_week_approved_notification',
+            ),
+        ]
+
     def __str__(self):
         return f"Notification for {self.employee.user.username} - {self.message[:30]}"
     
@@ -125,6 +186,93 @@ class ShiftPreference(models.Model):
 
     class Meta:
         unique_together = ('employee', 'week_start_date', 'day', 'shift_type', 'room')
+        indexes = [
+            models.Index(fields=['branch', 'week_start_date'], name='shiftpref_branch_week_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee} - {self.week_start_date} - {self.day} - {self.shift_type} - {self.room}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Очередь событий для уведомлений. Пишется в той же транзакции, что и
+    изменение расписания, и разбирается воркером (shifts/notifications.py).
+    """
+    SCHEDULE_APPROVED = 'schedule_approved'
+    KIND_CHOICES = [
+        (SCHEDULE_APPROVED, 'Schedule approved'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    week_start_date = models.DateField()
+    schedule_ids = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} - {self.branch.name} - {self.week_start_date}"
+
+
+class Job(models.Model):
+    """
+    Фоновая задача (тяжёлые операции с расписанием). Очередь — эта таблица,
+    выполняет воркер из shifts/jobs.py.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    progress = models.PositiveSmallIntegerField(default=0)  # 0..100
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # обновляет воркер, пока задача выполняется
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class UserTokenState(models.Model):
+    """
+    Версия токенов пользователя. Токены несут её в claim "ver"; увеличение
+    версии (revoke_user_tokens) отзывает все ранее выданные токены, в том числе
+    после перезапуска процесса и очистки кэша.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_state')
+    token_version = models.PositiveIntegerField(default=0)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id}: v{self.token_version}"
+
+
+class DataRevision(models.Model):
+    """
+    Ревизия области данных (расписание филиала/недели, ленты уведомлений) для
+    ETag/Last-Modified и ключей кэша read-моделей. Хранится в БД, поэтому
+    изменение из любого процесса сразу видно всем остальным.
+    """
+    scope = models.CharField(max_length=100, primary_key=True)
+    revision = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.scope}: {self.revision}"
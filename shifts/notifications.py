@@ -0,0 +1,170 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from .models import Employee, Notification, NotificationOutbox, Schedule
+import logging
+from .roles import branch_admin_ids
+from .revisions import bump_revision, employee_notifications_scope, branch_notifications_scope
+
+logger = logging.getLogger('system_logger')
+
+# Счётчик непрочитанных уведомлений (Employee.unread_notifications) ведётся
+# здесь, чтобы unread-count не делал COUNT(*) по таблице уведомлений.
+
+
+def add_unread(counts):
+    """
+    Увеличивает счётчики одним UPDATE. counts — {employee_id: сколько добавить}.
+    """
+    counts = {employee_id: n for employee_id, n in counts.items() if n}
+    if not counts:
+        return
+    Employee.objects.filter(pk__in=counts).update(
+        unread_notifications=F('unread_notifications') + Case(
+            *[When(pk=employee_id, then=Value(n)) for employee_id, n in counts.items()],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def subtract_unread(employee_id, n):
+    if n:
+        Employee.objects.filter(pk=employee_id).update(
+            unread_notifications=Greatest(F('unread_notifications') - n, 0)
+        )
+
+
+def mark_read(employee_id, branch_id, ids=None):
+    """
+    Помечает уведомления сотрудника прочитанными одним UPDATE (все или только ids).
+    Возвращает количество помеченных.
+    """
+    notifications = Notification.objects.filter(employee_id=employee_id, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    with transaction.atomic():
+        marked = notifications.update(is_read=True)
+        subtract_unread(employee_id, marked)
+    if marked:
+        bump_revision(employee_notifications_scope(employee_id), branch_notifications_scope(branch_id))
+    return marked
+
+
+def unread_count(employee_id):
+    return Employee.objects.filter(pk=employee_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+
+# Outbox: запрос только записывает событие, уведомления создаёт воркер.
+# Воркер — фоновый поток (после коммита, если NOTIFICATION_OUTBOX_AUTODRAIN)
+# или management-команда process_notification_outbox.
+
+OUTBOX_BATCH_SIZE = 500
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-outbox')
+
+
+def enqueue_schedule_approvals(branch_id, week_start_date, schedules):
+    """
+    Записывает событие об утверждённых сменах в outbox (один INSERT).
+    Вызывать внутри транзакции, изменяющей расписание.
+    """
+    schedule_ids = [schedule.pk for schedule in schedules if schedule.status == Schedule.APPROVED and schedule.employee_id]
+    if not schedule_ids:
+        return
+    NotificationOutbox.objects.create(
+        kind=NotificationOutbox.SCHEDULE_APPROVED,
+        branch_id=branch_id,
+        week_start_date=week_start_date,
+        schedule_ids=schedule_ids,
+    )
+    if getattr(settings, 'NOTIFICATION_OUTBOX_AUTODRAIN', True):
+        transaction.on_commit(lambda: _executor.submit(_drain_in_thread))
+
+
+def _drain_in_thread():
+    try:
+        drain_outbox()
+    except Exception:
+        logger.exception("Notification outbox drain failed")
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Разбирает очередь пачками. События группируются по ключу
+    (branch, week, kind), уведомления создаются bulk_create.
+    Возвращает количество обработанных событий.
+    """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            entries = NotificationOutbox.objects.select_related('branch').order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                entries = entries.select_for_update(skip_locked=True, of=('self',))
+            entries = list(entries[:batch_size])
+            if not entries:
+                return processed
+
+            groups = {}
+            for entry in entries:
+                groups.setdefault((entry.branch_id, entry.week_start_date, entry.kind), []).append(entry)
+            for (branch_id, week_start_date, kind), group in groups.items():
+                if kind == NotificationOutbox.SCHEDULE_APPROVED:
+                    _deliver_schedule_approvals(group[0].branch, week_start_date, group)
+
+            NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+            processed += len(entries)
+
+
+def _deliver_schedule_approvals(branch, week_start_date, entries):
+    schedule_ids = {schedule_id for entry in entries for schedule_id in entry.schedule_ids}
+    # Берём только то, что всё ещё утверждено на момент доставки
+    schedules = list(Schedule.objects.filter(
+        pk__in=schedule_ids,
+        status=Schedule.APPROVED,
+        employee__isnull=False,
+    ).select_related('shift__room').order_by('pk'))
+    if not schedules:
+        return
+
+    Notification.objects.bulk_create([
+        Notification(
+            employee_id=schedule.employee_id,
+            message=f" {schedule.shift.room.name} - המשמרת {schedule.shift.shift_type} שלך אושרה   בתאריך {schedule.week_start_date}",
+            kind=Notification.SHIFT_APPROVED,
+            branch=branch,
+            week_start_date=week_start_date,
+        )
+        for schedule in schedules
+    ], batch_size=OUTBOX_BATCH_SIZE)
+    counts = Counter(schedule.employee_id for schedule in schedules)
+    logger.info(f"{len(schedules)} notifications created for branch {branch.name} - Week {week_start_date}")
+
+    # Уведомление для администратора (только одно на неделю): insert-or-ignore
+    # по уникальному индексу (employee, kind, branch, week_start_date)
+    admin_ids = branch_admin_ids(branch.id)
+    if admin_ids:
+        try:
+            with transaction.atomic():
+                Notification.objects.create(
+                    employee_id=admin_ids[0],
+                    message=f"כל המשמרות אושרו לשבוע שמתחיל בתאריך {week_start_date} בסניף {branch.name}",
+                    kind=Notification.WEEK_APPROVED,
+                    branch=branch,
+                    week_start_date=week_start_date,
+                )
+            logger.info(f"Admin notification created for branch {branch.name} - Week {week_start_date}")
+        except IntegrityError:
+            pass
+
+    add_unread(counts)
+    bump_revision(
+        *[employee_notifications_scope(employee_id) for employee_id in counts],
+        branch_notifications_scope(branch.id),
+    )
@@ -0,0 +1,79 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+
+# Keyset-пагинация лент по (created_at, id), от новых к старым.
+# cursor — страница старше указанной записи, since — только записи новее неё.
+# Тело ответа остаётся списком, курсоры передаются в заголовках.
+# Без limit/cursor/since лента отдаётся целиком, как раньше.
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+KEYSET_PARAMS = ('limit', 'cursor', 'since')
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        created_at, obj_id = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        obj_id = int(obj_id)
+    except (ValueError, UnicodeError):
+        created_at = None
+    if created_at is None:
+        raise ValidationError({"cursor": "Invalid cursor."})
+    return created_at, obj_id
+
+
+def paginate_keyset(queryset, params):
+    """
+    Возвращает (items, headers) для queryset, отфильтрованного по параметрам
+    limit, cursor и since. Если ни одного из них нет — все записи без ограничения.
+    """
+    if not any(params.get(name) for name in KEYSET_PARAMS):
+        items = list(queryset.order_by('-created_at', '-id'))
+        return items, ({'X-Poll-Cursor': encode_cursor(items[0])} if items else {})
+
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise ValidationError({"limit": "Must be an integer."})
+
+    if params.get('cursor'):
+        created_at, obj_id = decode_cursor(params['cursor'])
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=obj_id))
+    if params.get('since'):
+        created_at, obj_id = decode_cursor(params['since'])
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=obj_id))
+
+    items = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    headers = {}
+    if len(items) > limit:
+        items = items[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(items[-1])
+    if items:
+        headers['X-Poll-Cursor'] = encode_cursor(items[0])
+    elif params.get('since'):
+        headers['X-Poll-Cursor'] = params['since']
+    return items, headers
+
+
+class OptionalPageNumberPagination(PageNumberPagination):
+    """
+    Постраничный вывод только по запросу (?page= или ?page_size=), иначе
+    список целиком, как раньше.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .roles import ADMIN, WORKER, has_role
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -11,7 +12,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
 
         # Проверка, является ли пользователь админом.
-        return request.user and request.user.groups.filter(name='Admin').exists()
+        return bool(request.user and has_role(request.user, ADMIN))
 
 
 class IsWorkerOrAdmin(permissions.BasePermission):
@@ -21,8 +22,7 @@ class IsWorkerOrAdmin(permissions.BasePermission):
 
     def has_permission(self, request, view):
         # Проверить, является ли пользователь работником или админом.
-        return request.user and (request.user.groups.filter(name='Worker').exists() or 
-                                 request.user.groups.filter(name='Admin').exists())
+        return bool(request.user and has_role(request.user, WORKER, ADMIN))
         
 
 class IsAdminGroup(permissions.BasePermission):
@@ -33,5 +33,5 @@ class IsAdminGroup(permissions.BasePermission):
         return bool(
             request.user and
             request.user.is_authenticated and
-            request.user.groups.filter(name='Admin').exists()
+            has_role(request.user, ADMIN)
         )        
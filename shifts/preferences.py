@@ -0,0 +1,257 @@
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from .models import Room, Schedule, ShiftPreference
+from .fast_serializers import SHIFT_PREFERENCE_ROWS
+from .conflicts import load_bookings
+from .services import WeekPublishedError, load_week_schedules, save_week_diff
+
+# Пакетное сохранение пожеланий сотрудника. Проверка всех элементов —
+# без сериализатора и без запроса на каждый элемент: комнаты одним in_bulk,
+# уже существующие пожелания одним SELECT, запись одним bulk_create с
+# update_conflicts по unique_together, так что повторная отправка недели не падает.
+
+PREFERENCE_KEY_FIELDS = ['employee', 'week_start_date', 'day', 'shift_type', 'room']
+
+CREATED = 'created'
+UPDATED = 'updated'
+ERROR = 'error'
+
+
+def _validate(item, rooms):
+    errors = {}
+    if not isinstance(item, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+
+    week_start_date = parse_date(str(item.get('week_start_date') or ''))
+    if not week_start_date:
+        errors['week_start_date'] = ['A valid date is required.']
+    for field, max_length in (('day', 10), ('shift_type', 20)):
+        value = item.get(field)
+        if not isinstance(value, str) or not value:
+            errors[field] = ['This field is required.']
+        elif len(value) > max_length:
+            errors[field] = [f'Ensure this field has no more than {max_length} characters.']
+    room_id = _room_id(item)
+    if room_id not in rooms:
+        errors['room'] = [f'Invalid pk "{item.get("room")}" - object does not exist.']
+    if errors:
+        return None, errors
+    return (week_start_date, item['day'], item['shift_type'], room_id), None
+
+
+def _room_id(item):
+    # Как PrimaryKeyRelatedField: принимаем и число, и строку с числом
+    value = item.get('room') if isinstance(item, dict) else None
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _room_ids(items):
+    return {room_id for room_id in map(_room_id, items) if room_id is not None}
+
+
+def upsert_preferences(employee_id, branch_id, items, replace=False):
+    """
+    Сохраняет пожелания сотрудника. Возвращает (results, deleted):
+    results — по элементу на каждый входной элемент (данные пожелания и
+    "result": created/updated или "result": error с ошибками),
+    deleted — сколько ожидающих пожеланий удалено в режиме replace.
+    replace=True: прочие ожидающие (pending) пожелания тех же недель удаляются,
+    утверждённые и отклонённые остаются.
+    """
+    rooms = Room.objects.in_bulk(_room_ids(items))
+
+    keys = []
+    results = []
+    for index, item in enumerate(items):
+        key, errors = _validate(item, rooms)
+        keys.append(key)
+        if errors:
+            results.append({'index': index, 'result': ERROR, 'errors': errors})
+        else:
+            results.append(None)
+
+    valid_keys = list(dict.fromkeys(key for key in keys if key))
+    weeks = {key[0] for key in valid_keys}
+    existing = set(
+        ShiftPreference.objects.filter(employee_id=employee_id, week_start_date__in=weeks)
+        .values_list('week_start_date', 'day', 'shift_type', 'room_id')
+    ) if weeks else set()
+
+    deleted = 0
+    with transaction.atomic():
+        if valid_keys:
+            ShiftPreference.objects.bulk_create(
+                [
+                    ShiftPreference(
+                        employee_id=employee_id,
+                        branch_id=branch_id,
+                        week_start_date=week_start_date,
+                        day=day,
+                        shift_type=shift_type,
+                        room_id=room_id,
+                    )
+                    for week_start_date, day, shift_type, room_id in valid_keys
+                ],
+                update_conflicts=True,
+                unique_fields=PREFERENCE_KEY_FIELDS,
+                update_fields=['branch'],
+                batch_size=500,
+            )
+        if replace and weeks:
+            submitted = set(valid_keys)
+            stale = [
+                pk for pk, *key in ShiftPreference.objects.filter(
+                    employee_id=employee_id, week_start_date__in=weeks, status='pending',
+                ).values_list('pk', 'week_start_date', 'day', 'shift_type', 'room_id')
+                if tuple(key) not in submitted
+            ]
+            if stale:
+                deleted, _ = ShiftPreference.objects.filter(pk__in=stale).delete()
+
+    saved = {}
+    if valid_keys:
+        rows = ShiftPreference.objects.filter(employee_id=employee_id, week_start_date__in=weeks).order_by('id')
+        for data in SHIFT_PREFERENCE_ROWS.serialize(rows):
+            saved[(parse_date(data['week_start_date']), data['day'], data['shift_type'], data['room'])] = data
+
+    for index, key in enumerate(keys):
+        if key is not None:
+            results[index] = {**saved[key], 'result': UPDATED if key in existing else CREATED}
+    return results, deleted
+
+
+def preference_matrix(branch_id, week_start_date):
+    """
+    Пожелания и назначения недели в одной структуре:
+    slots[day][shift_type][room_id] = {assigned, status, requested: [[employee_id, status, preference_id], ...]}.
+    Имена сотрудников и комнат — в отдельных словарях, чтобы не повторять их в каждой ячейке.
+    Два запроса с values_list, сопоставление — в памяти.
+    """
+    employees = {}
+    rooms = {}
+    slots = {}
+
+    def cell(day, shift_type, room_id):
+        return slots.setdefault(day, {}).setdefault(shift_type, {}).setdefault(
+            room_id, {'assigned': None, 'status': None, 'requested': []},
+        )
+
+    schedules = Schedule.objects.filter(branch_id=branch_id, week_start_date=week_start_date).order_by('id').values_list(
+        'shift__day_of_week', 'shift__shift_type', 'shift__room_id', 'shift__room__name',
+        'employee_id', 'employee__user__first_name', 'employee__user__last_name', 'status',
+    )
+    for day, shift_type, room_id, room_name, employee_id, first_name, last_name, schedule_status in schedules:
+        rooms[room_id] = room_name
+        target = cell(day, shift_type, room_id)
+        target['assigned'] = employee_id
+        target['status'] = schedule_status
+        if employee_id:
+            employees[employee_id] = f"{first_name} {last_name}"
+
+    preferences = ShiftPreference.objects.filter(branch_id=branch_id, week_start_date=week_start_date).order_by('id').values_list(
+        'id', 'day', 'shift_type', 'room_id', 'room__name',
+        'employee_id', 'employee__user__first_name', 'employee__user__last_name', 'status',
+    )
+    for preference_id, day, shift_type, room_id, room_name, employee_id, first_name, last_name, preference_status in preferences:
+        rooms[room_id] = room_name
+        employees[employee_id] = f"{first_name} {last_name}"
+        cell(day, shift_type, room_id)['requested'].append([employee_id, preference_status, preference_id])
+
+    return {
+        'branch_id': branch_id,
+        'week_start_date': week_start_date.isoformat(),
+        'employees': employees,
+        'rooms': rooms,
+        'slots': slots,
+    }
+
+
+# Пакетная смена статуса пожеланий и перенос утверждённых в черновик недели.
+# Конфликты разрешаются детерминированно, по возрастанию id пожелания:
+# - опубликованную (не draft) неделю не трогаем вовсе: WeekPublishedError;
+# - ячейку, где уже назначен другой сотрудник, не трогаем: occupied;
+# - сотрудник уже стоит в этом слоте (день, тип смены) в другой комнате или филиале: employee_busy;
+# - ячейку уже занял сотрудник с более ранним пожеланием: taken.
+
+def bulk_set_status(branch, new_status, ids=None, week_start_date=None, employee_ids=None,
+                    current_status=None, materialize=False):
+    """
+    Меняет статус пожеланий филиала одним UPDATE. При materialize утверждённые
+    пожелания затронутых недель переносятся в черновик расписания в той же
+    транзакции. Возвращает {updated, materialized: {неделя: {...}}}.
+    """
+    preferences = ShiftPreference.objects.filter(branch=branch)
+    if ids is not None:
+        preferences = preferences.filter(pk__in=ids)
+    if week_start_date:
+        preferences = preferences.filter(week_start_date=week_start_date)
+    if employee_ids is not None:
+        preferences = preferences.filter(employee_id__in=employee_ids)
+    if current_status:
+        preferences = preferences.filter(status=current_status)
+
+    with transaction.atomic():
+        weeks = sorted(set(preferences.values_list('week_start_date', flat=True))) if materialize else []
+        updated = preferences.update(status=new_status)
+        materialized = {
+            week.isoformat(): materialize_week(branch, week)
+            for week in weeks
+        }
+    return {'updated': updated, 'materialized': materialized}
+
+
+def materialize_week(branch, week_start_date):
+    """
+    Назначает сотрудников по утверждённым пожеланиям недели в черновые ячейки расписания.
+    Опубликованную неделю не трогает, как и generate_week_draft.
+    """
+    schedules = load_week_schedules(branch, week_start_date)
+    if any(schedule.status != Schedule.DRAFT for cell in schedules.values() for schedule in cell):
+        raise WeekPublishedError("Schedule for this week is already published")
+    busy = {
+        (day, shift_type, schedule.employee_id)
+        for (day, shift_type, _), cell in schedules.items() for schedule in cell if schedule.employee_id
+    }
+    preferences = list(ShiftPreference.objects.filter(
+        branch=branch, week_start_date=week_start_date, status='approved',
+    ).order_by('id').values_list('id', 'employee_id', 'day', 'shift_type', 'room__name'))
+    # Смены в других филиалах тоже занимают сотрудника (shifts/conflicts.py)
+    for _, booked_branch_id, _, day, shift_type, _, employee_id in load_bookings(
+        [week_start_date], [row[1] for row in preferences],
+    ):
+        if booked_branch_id != branch.id:
+            busy.add((day, shift_type, employee_id))
+
+    assigned = {}
+    conflicts = []
+    for preference_id, employee_id, day, shift_type, room_name in preferences:
+        key = (day, shift_type, room_name)
+        cell = schedules.get(key, [])
+        if any(schedule.employee_id == employee_id for schedule in cell):
+            continue  # уже назначен
+        if key in assigned:
+            reason = 'taken'
+        elif any(schedule.employee_id for schedule in cell):
+            reason = 'occupied'
+        elif (day, shift_type, employee_id) in busy:
+            reason = 'employee_busy'
+        else:
+            assigned[key] = employee_id
+            busy.add((day, shift_type, employee_id))
+            continue
+        conflicts.append({'preference_id': preference_id, 'reason': reason})
+
+    grid = {}
+    for (day, shift_type, room_name), employee_id in assigned.items():
+        grid.setdefault(day, {}).setdefault(shift_type, []).append({'room': room_name, 'employee': employee_id})
+    schedule_data = [
+        {'day': day, 'shifts': [{'shift': shift_type, 'rooms': cells} for shift_type, cells in shifts.items()]}
+        for day, shifts in grid.items()
+    ]
+    summary = save_week_diff(branch, week_start_date, schedule_data, status=Schedule.DRAFT) if schedule_data else {}
+    return {'assigned': len(assigned), 'created_cells': summary.get('added', 0), 'conflicts': conflicts}
@@ -0,0 +1,73 @@
+import re
+from datetime import date, datetime, timezone
+from django.db import connection, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import Schedule, Shift, ShiftPreference, Notification
+from .conflicts import BOOKING_FIELDS
+
+# Запросы горячих путей API в том виде, в каком их строят views/read_models/services.
+# Тест QueryPlanTests и команда check_query_plans прогоняют по ним EXPLAIN и падают, если какой-то
+# из них читает таблицу целиком.
+
+WEEK = date(2025, 1, 5)
+SINCE = datetime(2025, 1, 5, tzinfo=timezone.utc)
+
+
+def hot_queries():
+    return {
+        'get-schedule week grid': Schedule.objects.filter(
+            branch_id=1, status=Schedule.APPROVED, week_start_date=WEEK,
+        ).select_related('shift__room', 'employee__user'),
+        'get-schedule latest week': Schedule.objects.filter(
+            branch_id=1, status=Schedule.APPROVED,
+        ).order_by('-week_start_date').values_list('week_start_date', flat=True)[:1],
+        'available-weeks': Schedule.objects.filter(
+            branch_id=1, status=Schedule.APPROVED,
+        ).values_list('week_start_date', flat=True).distinct(),
+        'save-schedule week load': Schedule.objects.filter(
+            branch_id=1, week_start_date=WEEK,
+        ).select_related('shift__room'),
+        'update-schedule week load': Schedule.objects.filter(
+            branch_id=1, week_start_date__in=[WEEK],
+        ).select_related('shift__room'),
+        'delete-by-week': Schedule.objects.filter(branch_id=1, week_start_date=WEEK),
+        'conflict check bookings': Schedule.objects.filter(
+            week_start_date__in=[WEEK], employee_id__in=[1, 2],
+        ).values_list(*BOOKING_FIELDS),
+        'day-view (all branches)': Schedule.objects.filter(shift__calendar_date=WEEK),
+        'shift by room/date': Shift.objects.filter(room_id=1, calendar_date=WEEK, shift_type=Shift.MORNING),
+        'shift by room/type/day': Shift.objects.filter(
+            room_id=1, shift_type=Shift.MORNING, day_of_week='ראשון',
+        ),
+        'shift-preferences (employee)': ShiftPreference.objects.filter(employee_id=1, week_start_date=WEEK),
+        'shift-preferences-admin': ShiftPreference.objects.filter(branch_id=1, week_start_date=WEEK),
+        'employee-notifications': Notification.objects.filter(employee_id=1).order_by('-created_at'),
+        'admin-notifications': Notification.objects.filter(employee__branch_id=1).order_by('-created_at'),
+        'token blacklist sync window': BlacklistedToken.objects.filter(
+            blacklisted_at__gte=SINCE,
+        ).values_list('token__jti', flat=True),
+    }
+
+
+# SQLite: "SCAN shifts_schedule" без USING INDEX; PostgreSQL: "Seq Scan on shifts_schedule"
+_FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?! COVERING)\s*$', re.MULTILINE),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+def explain(queryset):
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик и так выберет Seq Scan;
+            # проверяем, что индекс вообще применим
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def full_scans(plan):
+    pattern = _FULL_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        return []
+    return pattern.findall(plan)
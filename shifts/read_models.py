@@ -0,0 +1,134 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from .models import Schedule
+from .revisions import get_revisions, schedule_branch_scope, schedule_week_scope
+from .solver import SHIFT_INDEX
+
+# Материализованная "сетка недели" для GetScheduleView: готовый JSON,
+# ключ (branch, week_start_date, status, ревизия недели). Ревизия читается из
+# БД (shifts/revisions.py) и растёт при любом изменении недели в любом
+# процессе, поэтому устаревшая сетка из кэша процесса не отдаётся никогда.
+WEEK_GRID_TIMEOUT = getattr(settings, 'WEEK_GRID_CACHE_TIMEOUT', 60 * 60 * 24)
+
+_renderer = JSONRenderer()
+
+
+def week_grid_key(branch_id, week_start_date, status, revision):
+    return f"week-grid:{branch_id}:{week_start_date}:{status}:{revision}"
+
+
+def default_week_key(branch_id, status, revision):
+    return f"week-grid-default:{branch_id}:{status}:{revision}"
+
+
+def current_week_start(today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday() + 1)  # Начало текущей недели (воскресенье)
+
+
+def build_week_grid(branch_id, week_start_date, status):
+    schedules = Schedule.objects.filter(
+        branch_id=branch_id,
+        status=status,
+        week_start_date=week_start_date,
+    ).select_related('shift__room', 'employee__user')
+
+    data = [
+        {
+            "week_start_date": schedule.week_start_date,
+            "shift_details": {
+                "shift_type": schedule.shift.shift_type,
+                "room": schedule.shift.room.name if schedule.shift.room else None,
+                "room_details": {
+                  "id": schedule.shift.room.id if schedule.shift.room else None,
+                  "name": schedule.shift.room.name if schedule.shift.room else None,
+                }
+            },
+            "day": schedule.shift.day_of_week,
+            "employee_name": schedule.employee.user.get_full_name() if schedule.employee else None,
+            "employee_id": schedule.employee.id if schedule.employee else None,
+        }
+        for schedule in schedules
+    ]
+    return _renderer.render(data)
+
+
+def get_week_grid(branch_id, week_start_date, status):
+    """
+    Возвращает JSON сетки недели из кэша, при промахе собирает его из БД.
+    """
+    revision, = get_revisions([schedule_week_scope(branch_id, week_start_date)])
+    key = week_grid_key(branch_id, week_start_date, status, revision)
+    content = cache.get(key)
+    if content is None:
+        content = build_week_grid(branch_id, week_start_date, status)
+        cache.set(key, content, WEEK_GRID_TIMEOUT)
+    return content
+
+
+def resolve_default_week(branch_id, status):
+    """
+    Неделя по умолчанию: текущая, если для неё есть расписание, иначе последняя
+    доступная. Результат кэшируется до смены недели или изменения в филиале.
+    """
+    this_week = current_week_start()
+    revision, = get_revisions([schedule_branch_scope(branch_id)])
+    key = default_week_key(branch_id, status, revision)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == this_week:
+        return cached[1]
+
+    schedules = Schedule.objects.filter(branch_id=branch_id, status=status)
+    if schedules.filter(week_start_date=this_week).exists():
+        week_start_date = this_week
+    else:
+        week_start_date = schedules.order_by('-week_start_date').values_list('week_start_date', flat=True).first()
+    cache.set(key, (this_week, week_start_date), WEEK_GRID_TIMEOUT)
+    return week_start_date
+
+
+# "День по всем филиалам": записи расписания, чьи смены приходятся на дату.
+# Фильтр по Shift.calendar_date — один проход по индексу shift_date_type_idx.
+
+DAY_VIEW_FIELDS = (
+    'id', 'branch_id', 'branch__name', 'status', 'week_start_date',
+    'shift__day_of_week', 'shift__shift_type', 'shift__start_time', 'shift__end_time',
+    'shift__room_id', 'shift__room__name',
+    'employee_id', 'employee__user__first_name', 'employee__user__last_name',
+)
+
+
+def build_day_view(day, branch_ids=None, statuses=None):
+    """
+    {date, branches: [{branch_id, branch_name, shifts: [...]}]} — смены даты,
+    сгруппированные по филиалам, внутри — по порядку типов смен и комнатам.
+    """
+    schedules = Schedule.objects.filter(shift__calendar_date=day)
+    if branch_ids:
+        schedules = schedules.filter(branch_id__in=branch_ids)
+    if statuses:
+        schedules = schedules.filter(status__in=statuses)
+
+    rows = sorted(
+        schedules.values_list(*DAY_VIEW_FIELDS),
+        key=lambda row: (row[1], SHIFT_INDEX.get(row[6], len(SHIFT_INDEX)), row[10], row[0]),
+    )
+    branches = {}
+    for (schedule_id, branch_id, branch_name, status, week_start_date, day_of_week, shift_type,
+         start_time, end_time, room_id, room_name, employee_id, first_name, last_name) in rows:
+        branch = branches.setdefault(branch_id, {"branch_id": branch_id, "branch_name": branch_name, "shifts": []})
+        branch["shifts"].append({
+            "id": schedule_id,
+            "status": status,
+            "week_start_date": week_start_date,
+            "day": day_of_week,
+            "shift_type": shift_type,
+            "start_time": start_time,
+            "end_time": end_time,
+            "room_details": {"id": room_id, "name": room_name},
+            "employee_id": employee_id,
+            "employee_name": f"{first_name} {last_name}".strip() if employee_id else None,
+        })
+    return {"date": day, "branches": list(branches.values())}
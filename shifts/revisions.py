@@ -0,0 +1,103 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import DataRevision, Employee
+
+# Ревизии данных для ETag/Last-Modified. Ревизия — время последнего изменения
+# в наносекундах, строго возрастающее; сигналы увеличивают её при изменениях.
+# Ревизии хранятся в БД (DataRevision), а не в кэше процесса: изменение,
+# сделанное другим процессом (воркер gunicorn, фоновая задача, outbox),
+# сразу меняет ETag для всех. Чтение — один запрос по первичному ключу.
+
+def schedule_branch_scope(branch_id):
+    return f"schedule:{branch_id}"
+
+
+def schedule_week_scope(branch_id, week_start_date):
+    return f"schedule:{branch_id}:{week_start_date}"
+
+
+def employee_notifications_scope(employee_id):
+    return f"notifications:employee:{employee_id}"
+
+
+def branch_notifications_scope(branch_id):
+    return f"notifications:branch:{branch_id}"
+
+
+def get_revisions(scopes):
+    found = dict(DataRevision.objects.filter(scope__in=scopes).values_list('scope', 'revision'))
+    missing = [scope for scope in scopes if scope not in found]
+    if missing:
+        # Первое обращение к области: ревизия — текущее время, поэтому старый
+        # ETag клиента (например, после пересоздания БД) случайно не совпадёт
+        now = time.time_ns()
+        DataRevision.objects.bulk_create([DataRevision(scope=scope, revision=now) for scope in missing], ignore_conflicts=True)
+        found.update(DataRevision.objects.filter(scope__in=missing).values_list('scope', 'revision'))
+    return [found[scope] for scope in scopes]
+
+
+def bump_revision(*scopes):
+    scopes = set(scopes)
+    if not scopes:
+        return
+    now = time.time_ns()
+    updated = DataRevision.objects.filter(scope__in=scopes).update(revision=Greatest(F('revision') + 1, Value(now)))
+    if updated < len(scopes):
+        DataRevision.objects.bulk_create([DataRevision(scope=scope, revision=now) for scope in scopes], ignore_conflicts=True)
+
+
+def get_validators(scopes, *variant):
+    """
+    Возвращает (etag, last_modified) для набора областей данных.
+    variant — всё, от чего ещё зависит ответ (статус, параметры запроса).
+    """
+    revisions = get_revisions(scopes)
+    raw = "|".join([*scopes, *map(str, revisions), *map(str, variant)])
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, max(revisions) // 1_000_000_000
+
+
+def not_modified(request, etag, last_modified):
+    """
+    304-ответ, если у клиента актуальная версия (If-None-Match/If-Modified-Since), иначе None.
+    """
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _employee_scope_key(user_id):
+    return f"employee-scope:{user_id}"
+
+
+def get_employee_scope(user):
+    """
+    (employee_id, branch_id) текущего пользователя из кэша; при промахе — один запрос.
+    Возвращает None, если у пользователя нет записи Employee.
+    """
+    employee_id = getattr(user, 'employee_id', None)
+    if employee_id is not None:
+        # TokenPrincipal: всё уже есть в claims токена
+        return employee_id, user.branch_id
+
+    key = _employee_scope_key(user.id)
+    scope = cache.get(key)
+    if scope is None:
+        scope = Employee.objects.filter(user_id=user.id).values_list('id', 'branch_id').first()
+        if scope is None:
+            return None
+        cache.set(key, tuple(scope), None)
+    return tuple(scope)
+
+
+def invalidate_employee_scope(user_id):
+    cache.delete(_employee_scope_key(user_id))
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from .models import Employee
+
+# Роли пользователя (группы Admin/Worker) загружаются один раз и кэшируются:
+# на объекте пользователя в рамках запроса и в кэше Django между запросами.
+# Кэш сбрасывается сигналами при изменении User.groups (shifts/signals.py).
+
+ADMIN = 'Admin'
+WORKER = 'Worker'
+
+
+def _roles_key(user_id):
+    return f"user-roles:{user_id}"
+
+
+def _branch_admins_key(branch_id):
+    return f"branch-admins:{branch_id}"
+
+
+def get_roles(user):
+    """
+    Множество имён групп пользователя. В устойчивом состоянии — без запросов к БД.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_shift_roles', None)
+    if roles is None:
+        roles = cache.get(_roles_key(user.id))
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(_roles_key(user.id), roles, None)
+        user._shift_roles = roles
+    return roles
+
+
+def load_roles(user):
+    """
+    Роли прямо из БД (мимо кэша) — для выдачи токенов; заодно обновляет кэш.
+    """
+    roles = frozenset(user.groups.values_list('name', flat=True))
+    cache.set(_roles_key(user.id), roles, None)
+    user._shift_roles = roles
+    return roles
+
+
+def has_role(user, *roles):
+    return not get_roles(user).isdisjoint(roles)
+
+
+def primary_role(user):
+    roles = get_roles(user)
+    for role in (ADMIN, WORKER):
+        if role in roles:
+            return role
+    return next(iter(sorted(roles)), None)
+
+
+def invalidate_roles(user_ids):
+    cache.delete_many([_roles_key(user_id) for user_id in user_ids])
+
+
+def branch_admin_ids(branch_id):
+    """
+    id сотрудников-администраторов филиала (по возрастанию id), из кэша.
+    """
+    key = _branch_admins_key(branch_id)
+    admin_ids = cache.get(key)
+    if admin_ids is None:
+        admin_ids = list(
+            Employee.objects.filter(branch_id=branch_id, user__groups__name=ADMIN)
+            .order_by('id').values_list('id', flat=True).distinct()
+        )
+        cache.set(key, admin_ids, None)
+    return admin_ids
+
+
+def invalidate_branch_admins(branch_ids):
+    cache.delete_many([_branch_admins_key(branch_id) for branch_id in set(branch_ids) if branch_id])
+
+
+def invalidate_user_branch_admins(user_ids):
+    """
+    Сбрасывает списки администраторов филиалов, где работают эти пользователи.
+    """
+    invalidate_branch_admins(Employee.objects.filter(user_id__in=user_ids).values_list('branch_id', flat=True))
@@ -0,0 +1,116 @@
+import re
+from functools import lru_cache
+from django.db import connections
+from django.db.utils import OperationalError
+from django.db.models.expressions import RawSQL
+from .models import Employee
+
+# Поиск по справочнику сотрудников. Employee.search_text — имя, фамилия,
+# логин и телефон в нижнем регистре; обновляется сигналами при сохранении
+# Employee/User. Индекс: на PostgreSQL — GIN (pg_trgm) по search_text,
+# на SQLite — FTS5-таблица с триграммами, которую синхронизируют триггеры
+# (оба создаются миграцией 0012).
+
+FTS_TABLE = 'shifts_employee_search'
+MIN_TRIGRAM_LENGTH = 3
+
+
+def build_search_text(first_name, last_name, username, phone_number):
+    parts = [first_name, last_name, username, phone_number]
+    digits = re.sub(r'\D', '', phone_number or '')
+    if digits and digits != phone_number:
+        parts.append(digits)  # "050-1234567" находится и по "0501234567"
+    return ' '.join(part for part in parts if part).lower()
+
+
+def refresh_search_text(employee_ids):
+    """
+    Пересчитывает search_text для сотрудников одним SELECT и одним bulk_update.
+    """
+    rows = Employee.objects.filter(pk__in=employee_ids).values_list(
+        'id', 'user__first_name', 'user__last_name', 'user__username', 'phone_number', 'search_text',
+    )
+    changed = []
+    for employee_id, first_name, last_name, username, phone_number, search_text in rows:
+        text = build_search_text(first_name, last_name, username, phone_number)
+        if text != search_text:
+            changed.append(Employee(pk=employee_id, search_text=text))
+    Employee.objects.bulk_update(changed, ['search_text'], batch_size=500)
+
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_text ON shifts_employee BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+        INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text);
+    END""",
+]
+
+POSTGRESQL_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS employee_search_trgm_idx ON shifts_employee USING gin (search_text gin_trgm_ops)",
+]
+
+
+def ensure_search_index(connection):
+    """
+    Создаёт индекс поиска, если его нет. На SQLite заодно восстанавливает
+    триггеры (Django удаляет их, когда пересоздаёт таблицу при миграции)
+    и перестраивает FTS-таблицу. Без FTS5/trigram поиск работает через LIKE.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INDEX_SQL:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"search_text, content='shifts_employee', content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:
+                return  # SQLite без FTS5 или trigram-токенизатора (< 3.34)
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%'])
+            missing = cursor.fetchone()[0] < len(SQLITE_INDEX_SQL)
+            for sql in SQLITE_INDEX_SQL:
+                cursor.execute(sql)
+            if missing:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _has_fts_table.cache_clear()
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS employee_search_trgm_idx")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _has_fts_table.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _has_fts_table(alias):
+    with connections[alias].cursor() as cursor:
+        return FTS_TABLE in connections[alias].introspection.table_names(cursor)
+
+
+def search_employees(queryset, term):
+    """
+    Фильтрует сотрудников по подстроке в имени, фамилии, логине или телефоне.
+    """
+    term = term.strip().lower()
+    if not term:
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite' and len(term) >= MIN_TRIGRAM_LENGTH and _has_fts_table(queryset.db):
+        phrase = '"' + term.replace('"', '""') + '"'
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]))
+    # PostgreSQL: LIKE '%term%' по GIN-индексу с gin_trgm_ops
+    return queryset.filter(search_text__contains=term)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
 from .models import Branch, Room, Shift, Employee, Schedule, ShiftPreference
+from .conflicts import find_conflicts
+from .services import ScheduleConflictError
 
 class BranchSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +21,33 @@ class ShiftSerializer(serializers.ModelSerializer):
         model = Shift
         fields = '__all__'
 
+    def validate(self, attrs):
+        # Новый день или тип смены переносит и её записи расписания
+        # (сигнал sync_schedule_slot_fields): сотрудник не должен оказаться занят дважды
+        instance = self.instance
+        if instance is None:
+            return attrs
+        day_of_week = attrs.get('day_of_week', instance.day_of_week)
+        shift_type = attrs.get('shift_type', instance.shift_type)
+        if (day_of_week, shift_type) == (instance.day_of_week, instance.shift_type):
+            return attrs
+        room_name = attrs.get('room', instance.room).name
+        cells_by_branch = {}
+        for schedule_id, branch_id, week_start_date, employee_id in Schedule.objects.filter(
+            shift=instance, employee__isnull=False,
+        ).values_list('id', 'branch_id', 'week_start_date', 'employee_id'):
+            cells_by_branch.setdefault(branch_id, []).append(
+                (week_start_date, day_of_week, shift_type, room_name, employee_id, schedule_id),
+            )
+        conflicts = [
+            conflict
+            for branch_id, cells in cells_by_branch.items()
+            for conflict in find_conflicts(branch_id, cells)
+        ]
+        if conflicts:
+            raise ScheduleConflictError(conflicts)
+        return attrs
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -34,6 +63,8 @@ class EmployeeSerializer(serializers.ModelSerializer):
 
 
 class ScheduleSerializer(serializers.ModelSerializer):
+    # Все поля читаются из уже загруженных связей: queryset должен делать
+    # select_related('shift__room', 'employee__user') (см. ScheduleViewSet)
     shift_details = serializers.SerializerMethodField()
     employee_name = serializers.SerializerMethodField()
     employee_details = serializers.SerializerMethodField()
@@ -43,6 +74,23 @@ class ScheduleSerializer(serializers.ModelSerializer):
         model = Schedule
         fields = ['week_start_date', 'branch', 'shift', 'shift_details', 'employee', 'employee_name', 'employee_details', 'room_details', 'status']
 
+    def validate(self, attrs):
+        # Двойное назначение проверяется до записи, чтобы ответить 409 со списком
+        # конфликтов, а не IntegrityError из schedule_employee_slot_uniq
+        instance = self.instance
+        employee = attrs.get('employee', instance.employee if instance else None)
+        if employee is not None:
+            shift = attrs.get('shift', instance.shift if instance else None)
+            branch = attrs.get('branch', instance.branch if instance else None)
+            week_start_date = attrs.get('week_start_date', instance.week_start_date if instance else None)
+            conflicts = find_conflicts(branch.id, [(
+                week_start_date, shift.day_of_week, shift.shift_type, shift.room.name, employee.id,
+                instance.pk if instance else None,
+            )])
+            if conflicts:
+                raise ScheduleConflictError(conflicts)
+        return attrs
+
     def get_shift_details(self, obj):
         return {
             "room": obj.shift.room.name,
@@ -59,7 +107,6 @@ class ScheduleSerializer(serializers.ModelSerializer):
     def get_employee_name(self, obj):
         if obj.employee and obj.employee.user:
             return f"{obj.employee.user.first_name} {obj.employee.user.last_name}"
-        print("No employee found for schedule:", obj.id)
         return None
 
     def get_employee_details(self, obj):
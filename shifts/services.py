@@ -0,0 +1,507 @@
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from .models import Branch, Room, Shift, Employee, Schedule
+from .conflicts import find_conflicts
+from .jobs import JobError, job_handler
+from .notifications import enqueue_schedule_approvals
+from .signals import schedule_batch_saved
+from .solver import shift_date, solve_week
+import logging
+
+logger = logging.getLogger('system_logger')
+
+BULK_BATCH_SIZE = 500
+
+
+class ScheduleGridError(Exception):
+    """
+    Ошибка во входных данных сетки расписания (например, неизвестная комната).
+    """
+
+
+class ScheduleConflictError(ScheduleGridError):
+    """
+    Сетка ставит сотрудника в два места в один день и тип смены.
+    conflicts — список двойных назначений (shifts/conflicts.py).
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        first = conflicts[0]
+        super().__init__(
+            f"Employee {first['employee_id']} is booked more than once for {first['shift_type']} "
+            f"on {first['day']} ({first['week_start_date']})."
+        )
+
+
+class WeekPublishedError(Exception):
+    """
+    Неделя уже опубликована, черновик поверх неё не пишется.
+    """
+
+
+def iter_grid_cells(schedule_data):
+    """
+    Разворачивает сетку [{day, shifts: [{shift, rooms: [{room, employee}]}]}]
+    в плоский список (day, shift_type, room_name, employee_id).
+    """
+    for day_data in schedule_data:
+        day_of_week = day_data.get('day')
+        for shift_data in day_data.get('shifts', []):
+            shift_type = shift_data.get('shift')
+            for room_data in shift_data.get('rooms', []):
+                yield day_of_week, shift_type, room_data.get('room'), room_data.get('employee') or None
+
+
+def resolve_rooms(branch, room_names):
+    """
+    Загружает все комнаты филиала одним запросом и возвращает {name: Room}.
+    """
+    rooms = {room.name: room for room in Room.objects.filter(branch=branch, name__in=set(room_names))}
+    missing = [name for name in room_names if name not in rooms]
+    if missing:
+        raise ScheduleGridError(f'Room "{missing[0]}" does not exist in branch "{branch.name}".')
+    return rooms
+
+
+def resolve_employees(employee_ids):
+    """
+    Загружает всех упомянутых сотрудников одним запросом. Несуществующие id
+    просто отсутствуют в результате (как и раньше с .first()).
+    """
+    ids = {employee_id for employee_id in employee_ids if employee_id}
+    return Employee.objects.in_bulk(ids) if ids else {}
+
+
+def _new_shift(room, shift_type, day_of_week, week_start_date):
+    return Shift(
+        room=room,
+        shift_type=shift_type,
+        day_of_week=day_of_week,
+        date=week_start_date,
+        calendar_date=shift_date(week_start_date, day_of_week),
+        start_time=None,
+        end_time=None,
+    )
+
+
+def check_conflicts(branch, cells, replaced=()):
+    """
+    Поднимает ScheduleConflictError, если итоговые назначения дают двойное
+    назначение (аргументы — как у conflicts.find_conflicts).
+    """
+    conflicts = find_conflicts(branch.id, cells, replaced)
+    if conflicts:
+        raise ScheduleConflictError(conflicts)
+
+
+def _new_schedule(shift, week_start_date, branch, status, employee=None, employee_id=None):
+    schedule = Schedule(
+        week_start_date=week_start_date,
+        shift=shift,
+        employee=employee,
+        branch=branch,
+        status=status,
+        day_of_week=shift.day_of_week,
+        shift_type=shift.shift_type,
+    )
+    if employee is None and employee_id:
+        schedule.employee_id = employee_id
+    return schedule
+
+
+def _release_employees(schedules):
+    # Перед bulk_update снимаем сотрудников с изменяемых записей: при обмене
+    # сотрудниками между ячейками одного слота промежуточное состояние внутри
+    # UPDATE иначе нарушило бы schedule_employee_slot_uniq
+    ids = [schedule.pk for schedule in schedules]
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        Schedule.objects.filter(pk__in=ids[start:start + BULK_BATCH_SIZE], employee__isnull=False).update(employee=None)
+
+
+def bulk_create_week(branch, week_start_date, schedule_data, status=Schedule.DRAFT):
+    """
+    Создаёт смены и записи расписания для всей недели пачками.
+    Количество запросов не зависит от размера сетки.
+    """
+    cells = list(iter_grid_cells(schedule_data))
+    rooms = resolve_rooms(branch, [room_name for _, _, room_name, _ in cells])
+    employees = resolve_employees(employee_id for _, _, _, employee_id in cells)
+
+    shifts = []
+    schedules = []
+    for day_of_week, shift_type, room_name, employee_id in cells:
+        shift = _new_shift(rooms[room_name], shift_type, day_of_week, week_start_date)
+        shifts.append(shift)
+        schedules.append(_new_schedule(
+            shift, week_start_date, branch, status,
+            employee=employees.get(employee_id) if employee_id else None,
+        ))
+    check_conflicts(branch, [
+        (week_start_date, schedule.day_of_week, schedule.shift_type, room_name, schedule.employee_id)
+        for schedule, (_, _, room_name, _) in zip(schedules, cells)
+    ])
+
+    with transaction.atomic():
+        Shift.objects.bulk_create(shifts, batch_size=BULK_BATCH_SIZE)
+        Schedule.objects.bulk_create(schedules, batch_size=BULK_BATCH_SIZE)
+        enqueue_schedule_approvals(branch.id, week_start_date, schedules)
+        transaction.on_commit(lambda: schedule_batch_saved.send(
+            sender=Schedule,
+            branch=branch,
+            week_start_date=week_start_date,
+            created=schedules,
+            updated=[],
+        ))
+
+    return len(schedules)
+
+
+def load_week_schedules(branch, week_start_date):
+    """
+    Загружает все записи расписания недели одним запросом и возвращает
+    {(day, shift_type, room_name): [Schedule, ...]}. Список — потому что в старых
+    данных у ячейки бывает несколько записей (см. cell_assignments).
+    """
+    schedules = Schedule.objects.filter(
+        branch=branch,
+        week_start_date=week_start_date,
+    ).select_related('shift__room').order_by('id')
+    by_key = {}
+    for schedule in schedules:
+        key = (schedule.shift.day_of_week, schedule.shift.shift_type, schedule.shift.room.name)
+        by_key.setdefault(key, []).append(schedule)
+    return by_key
+
+
+def cell_assignments(schedules, employee):
+    """
+    (запись, сотрудник) для всех записей одной ячейки. Сотрудник ставится только
+    в первую запись (меньший id): в остальных дублях старых данных он оказался
+    бы занят дважды в одном слоте. Их статус обновляется вместе с первой.
+    """
+    return [(schedule, employee if index == 0 else None) for index, schedule in enumerate(schedules)]
+
+
+def save_week_diff(branch, week_start_date, schedule_data, status=Schedule.DRAFT):
+    """
+    Сравнивает присланную сетку с сохранённой неделей и записывает только
+    изменившиеся ячейки. Возвращает сводку {added, changed, unchanged}.
+    """
+    # При повторе ячейки в сетке побеждает последнее значение
+    cells = list({cell[:3]: cell for cell in iter_grid_cells(schedule_data)}.values())
+    existing = load_week_schedules(branch, week_start_date)
+    employees = resolve_employees(employee_id for _, _, _, employee_id in cells)
+
+    new_cells = [cell for cell in cells if cell[:3] not in existing]
+    rooms = resolve_rooms(branch, [room_name for _, _, room_name, _ in new_cells]) if new_cells else {}
+
+    new_shifts = []
+    added = []
+    changed = []
+    unchanged = 0
+    final = []
+    for day_of_week, shift_type, room_name, employee_id in cells:
+        employee = employees.get(employee_id) if employee_id else None
+        schedules = existing.get((day_of_week, shift_type, room_name))
+        if not schedules:
+            final.append((week_start_date, day_of_week, shift_type, room_name, employee.id if employee else None))
+            shift = _new_shift(rooms[room_name], shift_type, day_of_week, week_start_date)
+            new_shifts.append(shift)
+            added.append(_new_schedule(shift, week_start_date, branch, status, employee=employee))
+            continue
+        for schedule, assigned in cell_assignments(schedules, employee):
+            final.append((
+                week_start_date, day_of_week, shift_type, room_name, assigned.id if assigned else None, schedule.pk,
+            ))
+            if schedule.employee_id != (assigned.id if assigned else None) or schedule.status != status:
+                schedule.employee = assigned
+                schedule.status = status
+                changed.append(schedule)
+            else:
+                unchanged += 1
+
+    if added or changed:
+        # Перезаписываемые ячейки недели не считаются, сравниваются итоговые назначения
+        check_conflicts(branch, final, replaced=[cell[:4] for cell in final])
+        with transaction.atomic():
+            _release_employees(changed)
+            Shift.objects.bulk_create(new_shifts, batch_size=BULK_BATCH_SIZE)
+            Schedule.objects.bulk_create(added, batch_size=BULK_BATCH_SIZE)
+            Schedule.objects.bulk_update(changed, ['employee', 'status'], batch_size=BULK_BATCH_SIZE)
+            enqueue_schedule_approvals(branch.id, week_start_date, [*added, *changed])
+            transaction.on_commit(lambda: schedule_batch_saved.send(
+                sender=Schedule,
+                branch=branch,
+                week_start_date=week_start_date,
+                created=added,
+                updated=changed,
+            ))
+
+    return {'added': len(added), 'changed': len(changed), 'unchanged': unchanged}
+
+
+def preview_week_conflicts(branch, week_start_date, schedule_data):
+    """
+    Проверка сетки без сохранения, с той же семантикой, что у save_week_diff.
+    """
+    cells = {cell[:3]: cell for cell in iter_grid_cells(schedule_data)}.values()
+    final = [
+        (week_start_date, day_of_week, shift_type, room_name, employee_id)
+        for day_of_week, shift_type, room_name, employee_id in cells
+    ]
+    return find_conflicts(branch.id, final, replaced=[cell[:4] for cell in final])
+
+
+def validate_update_entries(entries, new_status=None):
+    """
+    Проверяет записи UpdateScheduleView до выполнения или постановки в очередь.
+    Поднимает ScheduleGridError с номером первой некорректной записи.
+    """
+    if new_status is not None and new_status not in dict(Schedule.STATUS_CHOICES):
+        raise ScheduleGridError(f'Invalid status "{new_status}".')
+    if not isinstance(entries, list):
+        raise ScheduleGridError("schedules must be a list.")
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ScheduleGridError(f"Entry {index}: expected an object.")
+        try:
+            week_start_date = parse_date(str(entry.get('week_start_date') or ''))
+        except ValueError:
+            week_start_date = None
+        if not week_start_date:
+            raise ScheduleGridError(f"Entry {index}: a valid week_start_date is required.")
+        details = entry.get('shift_details')
+        if not isinstance(entry.get('day'), str) or not isinstance(details, dict) or not all(
+            isinstance(details.get(field), str) for field in ('shift_type', 'room')
+        ):
+            raise ScheduleGridError(f"Entry {index}: day, shift_details.shift_type and shift_details.room are required.")
+        employee_id = entry.get('employee_id')
+        if employee_id not in (None, '') and not (
+            (isinstance(employee_id, int) and not isinstance(employee_id, bool))
+            or (isinstance(employee_id, str) and employee_id.isdigit())
+        ):
+            raise ScheduleGridError(f"Entry {index}: employee_id must be an integer.")
+
+
+def _entry_employee_id(entry):
+    employee_id = entry.get('employee_id')
+    return int(employee_id) if employee_id not in (None, '') else None
+
+
+def update_week_entries(branch, entries, new_status=None):
+    """
+    Пакетно обновляет сотрудников/статус записей расписания.
+    Сотрудники загружаются одним in_bulk, все ключи (неделя, день, тип смены,
+    комната) разрешаются одним запросом с join, изменения пишутся bulk_update.
+    Возвращает (найдено записей, изменено записей).
+    """
+    weeks = {parse_date(str(entry['week_start_date'])) for entry in entries}
+    employees = resolve_employees(_entry_employee_id(entry) for entry in entries)
+
+    by_key = {}
+    schedules = Schedule.objects.filter(
+        branch=branch,
+        week_start_date__in=weeks,
+    ).select_related('shift__room').order_by('id')
+    for schedule in schedules:
+        key = (schedule.week_start_date, schedule.shift.day_of_week, schedule.shift.shift_type, schedule.shift.room.name)
+        by_key.setdefault(key, []).append(schedule)
+
+    matched = 0
+    changed = {}
+    matched_keys = set()
+    for entry in entries:
+        key = (
+            parse_date(str(entry['week_start_date'])),
+            entry.get('day'),
+            entry['shift_details']['shift_type'],
+            entry['shift_details']['room'],
+        )
+        if key not in by_key:
+            logger.warning(f"No schedule found for {key[3]} {key[2]} on {key[1]} ({key[0]})")
+            continue
+
+        employee_id = _entry_employee_id(entry)
+        employee = employees.get(employee_id) if employee_id else None
+        matched_keys.add(key)
+        for schedule, assigned in cell_assignments(by_key[key], employee):
+            matched += 1
+            new_employee_id = assigned.id if assigned else None
+            if schedule.employee_id == new_employee_id and (not new_status or schedule.status == new_status):
+                continue
+            schedule.employee = assigned
+            if new_status:
+                schedule.status = new_status
+            changed.setdefault(schedule.week_start_date, {})[schedule.pk] = schedule
+
+    if changed:
+        check_conflicts(branch, [
+            (*key, schedule.employee_id, schedule.pk)
+            for key in matched_keys for schedule in by_key[key]
+        ], replaced=matched_keys)
+        all_changed = [schedule for week in changed.values() for schedule in week.values()]
+        with transaction.atomic():
+            _release_employees(all_changed)
+            Schedule.objects.bulk_update(
+                all_changed,
+                ['employee', 'status'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            for week_start_date, week_changed in changed.items():
+                enqueue_schedule_approvals(branch.id, week_start_date, week_changed.values())
+                transaction.on_commit(lambda week_start_date=week_start_date, week_changed=week_changed: schedule_batch_saved.send(
+                    sender=Schedule,
+                    branch=branch,
+                    week_start_date=week_start_date,
+                    created=[],
+                    updated=list(week_changed.values()),
+                ))
+
+    return matched, sum(len(week) for week in changed.values())
+
+
+def delete_week(branch_id, week_start_date):
+    """
+    Удаляет все записи расписания недели. Возвращает количество удалённых записей.
+    """
+    deleted_count, _ = Schedule.objects.filter(branch_id=branch_id, week_start_date=week_start_date).delete()
+    return deleted_count
+
+
+def generate_week_draft(branch, week_start_date, max_shifts=None, save=True, progress=None):
+    """
+    Заполняет неделю решателем (shifts/solver.py) и сохраняет как черновик.
+    Записываются только ячейки, которые заполнил решатель: назначения,
+    уже сделанные в черновике, и пустые ячейки не меняются.
+    Возвращает {schedule, cells, assigned, ...}.
+    """
+    schedule_data, summary = solve_week(branch, week_start_date, max_shifts, only_assigned=save)
+    if not save:
+        return {'schedule': schedule_data, **summary}
+    if progress:
+        progress(50)
+    # Уже утверждённую неделю решатель не перезаписывает
+    if Schedule.objects.filter(branch=branch, week_start_date=week_start_date).exclude(status=Schedule.DRAFT).exists():
+        raise WeekPublishedError("Schedule for this week is already published")
+    saved = {'added': 0, 'changed': 0, 'unchanged': 0}
+    if schedule_data:
+        saved = save_week_diff(branch, week_start_date, schedule_data, status=Schedule.DRAFT)
+    return {'schedule': schedule_data, **summary, **saved}
+
+
+def clone_week(branch, source_week_start_date, target_week_start_date, clear_employees=False):
+    """
+    Копирует все смены и записи расписания недели филиала на другую неделю
+    как черновик. Один SELECT, проверка двойных назначений и две пачки
+    bulk_create в одной транзакции.
+    Возвращает количество скопированных записей.
+    """
+    if source_week_start_date == target_week_start_date:
+        raise ScheduleGridError("Source and target weeks must differ.")
+
+    with transaction.atomic():
+        if Schedule.objects.filter(branch=branch, week_start_date=target_week_start_date).exists():
+            raise ScheduleGridError(f"Week {target_week_start_date} already has a schedule.")
+
+        source = Schedule.objects.filter(
+            branch=branch,
+            week_start_date=source_week_start_date,
+        ).select_related('shift__room').order_by('id')
+
+        shifts = []
+        schedules = []
+        for schedule in source:
+            shift = Shift(
+                room_id=schedule.shift.room_id,
+                shift_type=schedule.shift.shift_type,
+                day_of_week=schedule.shift.day_of_week,
+                date=target_week_start_date,
+                calendar_date=shift_date(target_week_start_date, schedule.shift.day_of_week),
+                start_time=schedule.shift.start_time,
+                end_time=schedule.shift.end_time,
+                employee_id=None if clear_employees else schedule.shift.employee_id,
+            )
+            shifts.append(shift)
+            schedules.append(_new_schedule(
+                shift, target_week_start_date, branch, Schedule.DRAFT,
+                employee_id=None if clear_employees else schedule.employee_id,
+            ))
+        check_conflicts(branch, [
+            (target_week_start_date, new.day_of_week, new.shift_type, old.shift.room.name, new.employee_id)
+            for new, old in zip(schedules, source)
+        ])
+
+        if schedules:
+            Shift.objects.bulk_create(shifts, batch_size=BULK_BATCH_SIZE)
+            Schedule.objects.bulk_create(schedules, batch_size=BULK_BATCH_SIZE)
+            transaction.on_commit(lambda: schedule_batch_saved.send(
+                sender=Schedule,
+                branch=branch,
+                week_start_date=target_week_start_date,
+                created=schedules,
+                updated=[],
+            ))
+
+    return len(schedules)
+
+
+# Обработчики фоновых задач (shifts/jobs.py). payload содержит то же, что
+# синхронный запрос, даты — в ISO-формате.
+
+def _job_branch(payload):
+    try:
+        return Branch.objects.get(pk=payload['branch_id'])
+    except Branch.DoesNotExist:
+        raise JobError("Branch not found")
+
+
+@job_handler('create_week')
+def create_week_job(payload, progress):
+    branch = _job_branch(payload)
+    try:
+        created = bulk_create_week(branch, parse_date(payload['start_date']), payload['schedule'])
+    except ScheduleGridError as e:
+        raise JobError(str(e))
+    return {'created_count': created}
+
+
+@job_handler('update_week')
+def update_week_job(payload, progress):
+    branch = _job_branch(payload)
+    try:
+        updated_count, changed_count = update_week_entries(branch, payload['schedules'], payload.get('status'))
+    except ScheduleGridError as e:
+        raise JobError(str(e))
+    return {'updated_count': updated_count, 'changed_count': changed_count}
+
+
+@job_handler('delete_week')
+def delete_week_job(payload, progress):
+    return {'deleted_count': delete_week(payload['branch_id'], parse_date(payload['week_start_date']))}
+
+
+@job_handler('solve_week')
+def solve_week_job(payload, progress):
+    branch = _job_branch(payload)
+    try:
+        result = generate_week_draft(branch, parse_date(payload['start_date']), payload.get('max_shifts'), progress=progress)
+    except (WeekPublishedError, ScheduleGridError) as e:
+        raise JobError(str(e))
+    result.pop('schedule')
+    return result
+
+
+@job_handler('clone_week')
+def clone_week_job(payload, progress):
+    branch = _job_branch(payload)
+    try:
+        cloned = clone_week(
+            branch,
+            parse_date(payload['source_week_start_date']),
+            parse_date(payload['target_week_start_date']),
+            clear_employees=payload.get('clear_employees', False),
+        )
+    except ScheduleGridError as e:
+        raise JobError(str(e))
+    return {'cloned_count': cloned}
@@ -1,10 +1,28 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from .models import Schedule, Shift, Notification, Employee
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate, m2m_changed
+from django.dispatch import receiver, Signal
+from django.contrib.auth.models import User
+from .models import Schedule, Shift, Notification, Employee, Room
+from .roles import invalidate_roles, invalidate_branch_admins, invalidate_user_branch_admins
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .authentication import revoke_user_tokens
+from .token_revocation import revocation_filter
+from .search import ensure_search_index, refresh_search_text
+from .solver import shift_date
+from .notifications import add_unread, subtract_unread, enqueue_schedule_approvals
+from .revisions import (
+    bump_revision, schedule_branch_scope, schedule_week_scope,
+    employee_notifications_scope, branch_notifications_scope, invalidate_employee_scope,
+)
 import logging
 
 logger = logging.getLogger('system_logger')
 
+# bulk_create/bulk_update не вызывают post_save, поэтому пакетные операции
+# над расписанием отправляют один сводный сигнал на весь вызов.
+# Аргументы: branch, week_start_date, created (list), updated (list).
+schedule_batch_saved = Signal()
+
 @receiver(post_save, sender=Schedule)
 def log_schedule_changes(sender, instance, created, **kwargs):
     if created:
@@ -12,6 +30,10 @@ def log_schedule_changes(sender, instance, created, **kwargs):
     else:
         logger.info(f"Schedule updated: {instance}")
 
+@receiver(schedule_batch_saved, sender=Schedule)
+def log_schedule_batch(sender, branch, week_start_date, created, updated, **kwargs):
+    logger.info(f"Schedule batch saved for branch {branch.name} - Week {week_start_date}: {len(created)} created, {len(updated)} updated")
+
 @receiver(post_delete, sender=Schedule)
 def log_schedule_deletion(sender, instance, **kwargs):
     logger.info(f"Schedule deleted: {instance}")
@@ -23,6 +45,12 @@ def log_shift_changes(sender, instance, created, **kwargs):
     else:
         logger.info(f"Shift updated: {instance}")
 
+@receiver(pre_save, sender=Shift)
+def set_shift_calendar_date(sender, instance, **kwargs):
+    # date может прийти строкой или datetime (default=timezone.now)
+    week_start_date = Shift._meta.get_field('date').to_python(instance.date)
+    instance.calendar_date = shift_date(week_start_date, instance.day_of_week)
+
 @receiver(post_delete, sender=Shift)
 def log_shift_deletion(sender, instance, **kwargs):
     logger.info(f"Shift deleted: {instance}") 
@@ -41,21 +69,174 @@ def delete_unused_shift(sender, instance, **kwargs):
     
 @receiver(post_save, sender=Schedule)
 def create_schedule_notification(sender, instance, created, **kwargs):
-    if instance.status == Schedule.APPROVED and instance.employee:
-        # Уведомление для сотрудника
-        Notification.objects.create(
-            employee=instance.employee,
-            message = f" {instance.shift.room.name} - המשמרת {instance.shift.shift_type} שלך אושרה   בתאריך {instance.week_start_date}"
-        )
-        logger.info(f"Notification created for {instance.employee.user.username}: {instance}")
-        
-        # 🔹 Уведомление для администратора (только одно!)
-        admin_user = Employee.objects.filter(branch=instance.branch, user__groups__name="Admin").first()
-        if admin_user:
-            # Проверяем, есть ли уже уведомление на эту неделю
-            if not Notification.objects.filter(employee=admin_user, message__contains=str(instance.week_start_date)).exists():
-                Notification.objects.create(
-                    employee=admin_user,
-                    message=f"כל המשמרות אושרו לשבוע שמתחיל בתאריך {instance.week_start_date} בסניף {instance.branch.name}"
-                )
-                logger.info(f"Admin notification created for branch {instance.branch.name} - Week {instance.week_start_date}")  
+    if instance.status == Schedule.APPROVED and instance.employee_id:
+        # Уведомления создаёт воркер outbox, здесь только событие в той же транзакции
+        enqueue_schedule_approvals(instance.branch_id, instance.week_start_date, [instance])
+
+
+# Ревизии недели (revisions): меняют ETag и ключ кэша сетки недели (read_models)
+
+def week_changed(branch_id, week_start_date):
+    bump_revision(schedule_branch_scope(branch_id), schedule_week_scope(branch_id, week_start_date))
+
+def _invalidate_weeks(schedules):
+    for branch_id, week_start_date in set(schedules.values_list('branch_id', 'week_start_date')):
+        week_changed(branch_id, week_start_date)
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def invalidate_schedule_week_grid(sender, instance, **kwargs):
+    week_changed(instance.branch_id, instance.week_start_date)
+
+@receiver(schedule_batch_saved, sender=Schedule)
+def invalidate_batch_week_grid(sender, branch, week_start_date, **kwargs):
+    week_changed(branch.id, week_start_date)
+
+@receiver(post_save, sender=Shift)
+def invalidate_shift_week_grid(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_weeks(Schedule.objects.filter(shift=instance))
+
+@receiver(post_save, sender=Shift)
+def sync_schedule_slot_fields(sender, instance, created, **kwargs):
+    # Schedule хранит копию дня и типа смены для ограничения schedule_employee_slot_uniq
+    if not created:
+        Schedule.objects.filter(shift=instance).exclude(
+            day_of_week=instance.day_of_week, shift_type=instance.shift_type,
+        ).update(day_of_week=instance.day_of_week, shift_type=instance.shift_type)
+
+@receiver(post_save, sender=Room)
+def invalidate_room_week_grid(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_weeks(Schedule.objects.filter(shift__room=instance))
+
+@receiver(post_save, sender=Employee)
+def invalidate_employee_week_grid(sender, instance, created, **kwargs):
+    invalidate_employee_scope(instance.user_id)
+    if not created:
+        _invalidate_weeks(Schedule.objects.filter(employee=instance))
+
+@receiver(post_delete, sender=Employee)
+def invalidate_deleted_employee_scope(sender, instance, **kwargs):
+    invalidate_employee_scope(instance.user_id)
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_employee_branch_admins(sender, instance, **kwargs):
+    # Прежний филиал запоминает remember_employee_branch
+    invalidate_branch_admins([instance.branch_id, getattr(instance, '_old_branch_id', None)])
+
+@receiver(post_save, sender=User)
+def invalidate_user_week_grid(sender, instance, created, **kwargs):
+    if not created:
+        _invalidate_weeks(Schedule.objects.filter(employee__user=instance))
+
+
+# Ревизии лент уведомлений
+
+def notifications_changed(employee_ids, branch_ids):
+    bump_revision(
+        *[employee_notifications_scope(employee_id) for employee_id in set(employee_ids)],
+        *[branch_notifications_scope(branch_id) for branch_id in set(branch_ids)],
+    )
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notification_revision(sender, instance, **kwargs):
+    try:
+        branch_id = instance.employee.branch_id
+    except Employee.DoesNotExist:
+        branch_id = None
+    notifications_changed([instance.employee_id], [branch_id] if branch_id else [])
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        add_unread({instance.employee_id: 1})
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        subtract_unread(instance.employee_id, 1)
+
+
+# Кэш ролей (shifts/roles.py)
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_cached_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear(): после очистки список пользователей уже не узнать
+        user_ids = list(instance.user_set.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear') and not (action == 'post_clear' and reverse):
+        user_ids = list(pk_set or []) if reverse else [instance.pk]
+    else:
+        return
+    invalidate_roles(user_ids)
+    # Роль зашита в токен — старые токены с прежней ролью отзываем
+    for user_id in user_ids:
+        revoke_user_tokens(user_id)
+    invalidate_user_branch_admins(user_ids)
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_roles(sender, instance, **kwargs):
+    invalidate_roles([instance.pk])
+    revoke_user_tokens(instance.pk)
+
+
+# Отзыв токенов, claims которых устарели (shifts/authentication.py)
+
+@receiver(pre_save, sender=Employee)
+def remember_employee_branch(sender, instance, **kwargs):
+    if instance.pk:
+        old_branch_id = Employee.objects.filter(pk=instance.pk).values_list('branch_id', flat=True).first()
+        instance._old_branch_id = old_branch_id
+        instance._branch_changed = old_branch_id != instance.branch_id
+
+@receiver(post_save, sender=Employee)
+def revoke_tokens_on_branch_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_branch_changed', False):
+        revoke_user_tokens(instance.user_id)
+
+@receiver(post_delete, sender=Employee)
+def revoke_tokens_on_employee_delete(sender, instance, origin=None, **kwargs):
+    # При удалении самого пользователя (каскад) отзывать нечего: его токены
+    # отклоняются как токены несуществующего пользователя
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is User:
+        return
+    revoke_user_tokens(instance.user_id)
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_deactivation(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        revoke_user_tokens(instance.pk)
+
+# Фильтр blacklist этого процесса узнаёт о новой записи сразу,
+# остальные процессы — при следующей синхронизации (shifts/token_revocation.py)
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_revocation_filter(sender, instance, created, **kwargs):
+    if created:
+        revocation_filter.add(instance.token.jti)
+
+# Поиск по справочнику сотрудников (shifts/search.py)
+
+@receiver(post_save, sender=Employee)
+def update_employee_search_text(sender, instance, **kwargs):
+    refresh_search_text([instance.pk])
+
+@receiver(post_save, sender=User)
+def update_user_search_text(sender, instance, created, **kwargs):
+    if not created:
+        refresh_search_text(Employee.objects.filter(user=instance).values_list('id', flat=True))
+
+@receiver(post_migrate)
+def restore_employee_search_index(sender, using, **kwargs):
+    # Миграции SQLite, пересоздающие shifts_employee, удаляют триггеры FTS
+    if sender.name != 'shifts':
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        columns = [column.name for column in connection.introspection.get_table_description(cursor, 'shifts_employee')]
+    if 'search_text' in columns:
+        ensure_search_index(connection)
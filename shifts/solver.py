@@ -0,0 +1,190 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from .models import Employee, Room, Schedule, Shift, ShiftPreference
+
+# Автоматическое распределение смен по пожеланиям сотрудников (ShiftPreference).
+# Слот — пара (день, тип смены), занятость сотрудника хранится битовой маской
+# по 21 слоту недели, поэтому все ограничения проверяются за O(1):
+# - не больше одной смены в слоте;
+# - не больше max_shifts смен в неделю;
+# - нельзя вечернюю смену и утреннюю на следующий день.
+# Ячейки заполняются жадно: сначала те, на которые меньше всего желающих.
+
+WEEK_DAYS = ['ראשון', 'שני', 'שלישי', 'רביעי', 'חמישי', 'שישי', 'שבת']
+SHIFT_ORDER = [Shift.MORNING, Shift.AFTERNOON, Shift.EVENING]
+
+DAY_INDEX = {day: i for i, day in enumerate(WEEK_DAYS)}
+# Смещение дня от начала недели (воскресенья) для календарной даты: в данных
+# дни на иврите, а choices Shift.DAYS_OF_WEEK — английские, поэтому оба написания
+DAY_OFFSETS = {
+    **DAY_INDEX,
+    **{day: i for i, day in enumerate([
+        Shift.SUNDAY, Shift.MONDAY, Shift.TUESDAY, Shift.WEDNESDAY, Shift.THURSDAY, Shift.FRIDAY, Shift.SATURDAY,
+    ])},
+}
+SHIFT_INDEX = {shift_type: i for i, shift_type in enumerate(SHIFT_ORDER)}
+SLOTS_PER_DAY = len(SHIFT_ORDER)
+
+# Утверждённое пожелание ценнее ожидающего
+PREFERENCE_WEIGHTS = {'approved': 2, 'pending': 1}
+
+
+def slot_index(day, shift_type):
+    """
+    Номер слота недели (0..20) или None для неизвестного дня/типа смены.
+    """
+    day_index = DAY_INDEX.get(day)
+    shift_index = SHIFT_INDEX.get(shift_type)
+    if day_index is None or shift_index is None:
+        return None
+    return day_index * SLOTS_PER_DAY + shift_index
+
+
+def shift_date(week_start_date, day):
+    """
+    Календарная дата смены по началу недели и дню (на иврите или по-английски);
+    None для неизвестного дня.
+    """
+    day_index = DAY_OFFSETS.get(day)
+    if week_start_date is None or day_index is None:
+        return None
+    return week_start_date + timedelta(days=day_index)
+
+
+def _rest_mask(slot):
+    """
+    Маска слотов, занятость в которых запрещает слот: вечер накануне для
+    утренней смены и утро следующего дня для вечерней.
+    """
+    day_index, shift_index = divmod(slot, SLOTS_PER_DAY)
+    mask = 0
+    if shift_index == 0 and day_index > 0:
+        mask |= 1 << ((day_index - 1) * SLOTS_PER_DAY + SLOTS_PER_DAY - 1)
+    if shift_index == SLOTS_PER_DAY - 1 and day_index < len(WEEK_DAYS) - 1:
+        mask |= 1 << ((day_index + 1) * SLOTS_PER_DAY)
+    return mask
+
+
+REST_MASKS = [_rest_mask(slot) for slot in range(len(WEEK_DAYS) * SLOTS_PER_DAY)]
+
+
+def assign(cells, preferences, max_shifts, booked=None):
+    """
+    Ядро решателя без обращения к БД.
+    cells — список (slot, room_id); preferences — список
+    (employee_id, slot, room_id, weight); booked — {employee_id: маска слотов},
+    уже занятых в других филиалах. Возвращает {(slot, room_id): employee_id}.
+    """
+    cell_set = set(cells)
+    candidates = {}
+    remaining = {}
+    for employee_id, slot, room_id, weight in preferences:
+        cell = (slot, room_id)
+        if cell not in cell_set:
+            continue
+        options = candidates.setdefault(cell, {})
+        if weight > options.get(employee_id, 0):
+            options[employee_id] = weight
+        remaining[employee_id] = remaining.get(employee_id, 0) + 1
+
+    busy = dict(booked or {})
+    counts = {employee_id: mask.bit_count() for employee_id, mask in busy.items()}
+    result = {}
+    # Самые "узкие" ячейки первыми, порядок детерминирован
+    for cell in sorted(candidates, key=lambda cell: (len(candidates[cell]), cell)):
+        slot, _ = cell
+        bit = 1 << slot
+        blocked = bit | REST_MASKS[slot]
+        best = None
+        best_key = None
+        for employee_id, weight in candidates[cell].items():
+            remaining[employee_id] -= 1
+            if busy.get(employee_id, 0) & blocked or counts.get(employee_id, 0) >= max_shifts:
+                continue
+            # Выше вес, затем тот, у кого меньше других вариантов
+            key = (-weight, remaining[employee_id], employee_id)
+            if best_key is None or key < best_key:
+                best, best_key = employee_id, key
+        if best is not None:
+            busy[best] = busy.get(best, 0) | bit
+            counts[best] = counts.get(best, 0) + 1
+            result[cell] = best
+    return result
+
+
+def solve_week(branch, week_start_date, max_shifts=None, only_assigned=False):
+    """
+    Строит сетку недели филиала по пожеланиям (pending/approved) активных
+    сотрудников. Ячейки, где сотрудник уже назначен (например, вручную в
+    черновике), решатель не трогает, а занятые ими слоты учитывает.
+    Возвращает (schedule_data, summary); schedule_data имеет формат
+    CreateScheduleView/SaveScheduleView и покрывает все комнаты, дни и типы смен
+    (уже назначенные ячейки — с прежним сотрудником). only_assigned=True —
+    только ячейки, заполненные решателем: их и нужно записать.
+    """
+    if max_shifts is None:
+        max_shifts = getattr(settings, 'SCHEDULE_SOLVER_MAX_SHIFTS_PER_WEEK', 6)
+
+    rooms = dict(Room.objects.filter(branch=branch).order_by('id').values_list('id', 'name'))
+    active_ids = set(Employee.objects.filter(branch=branch, user__is_active=True).values_list('id', flat=True))
+    rows = ShiftPreference.objects.filter(
+        branch=branch,
+        week_start_date=week_start_date,
+        status__in=PREFERENCE_WEIGHTS,
+    ).values_list('employee_id', 'day', 'shift_type', 'room_id', 'status')
+
+    preferences = []
+    for employee_id, day, shift_type, room_id, preference_status in rows:
+        slot = slot_index(day, shift_type)
+        if slot is None or employee_id not in active_ids:
+            continue
+        preferences.append((employee_id, slot, room_id, PREFERENCE_WEIGHTS[preference_status]))
+
+    # Уже назначенные ячейки филиала и смены сотрудников в других филиалах
+    # на эту неделю занимают слоты заранее
+    booked = {}
+    fixed = {}
+    existing = Schedule.objects.filter(
+        week_start_date=week_start_date, employee__isnull=False,
+    ).filter(
+        Q(branch=branch) | Q(employee_id__in={employee_id for employee_id, _, _, _ in preferences}),
+    ).values_list('branch_id', 'employee_id', 'day_of_week', 'shift_type', 'shift__room_id')
+    for branch_id, employee_id, day, shift_type, room_id in existing:
+        slot = slot_index(day, shift_type)
+        if slot is None:
+            continue
+        booked[employee_id] = booked.get(employee_id, 0) | 1 << slot
+        if branch_id == branch.id:
+            fixed[(slot, room_id)] = employee_id
+
+    cells = [
+        (slot, room_id)
+        for slot in range(len(WEEK_DAYS) * SLOTS_PER_DAY) for room_id in rooms
+        if (slot, room_id) not in fixed
+    ]
+    assignment = assign(cells, preferences, max_shifts, booked)
+    grid = assignment if only_assigned else {**fixed, **assignment}
+
+    schedule_data = []
+    for day in WEEK_DAYS:
+        shifts = []
+        for shift_type in SHIFT_ORDER:
+            slot = slot_index(day, shift_type)
+            cells_data = [
+                {'room': room_name, 'employee': grid.get((slot, room_id))}
+                for room_id, room_name in rooms.items()
+                if not only_assigned or (slot, room_id) in grid
+            ]
+            if cells_data:
+                shifts.append({'shift': shift_type, 'rooms': cells_data})
+        if shifts:
+            schedule_data.append({'day': day, 'shifts': shifts})
+    summary = {
+        'cells': len(cells),
+        'kept': len(fixed),
+        'assigned': len(assignment),
+        'preferences': len(preferences),
+        'employees': len(set(assignment.values())),
+    }
+    return schedule_data, summary
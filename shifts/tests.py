@@ -1,3 +1,958 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .jobs import claim_batch, requeue_stale
+from .notifications import drain_outbox
+from .fast_serializers import EMPLOYEE_ROWS, ROOM_ROWS, SCHEDULE_ROWS, SHIFT_PREFERENCE_ROWS, FastJSONRenderer
+from .models import Branch, DataRevision, Employee, Job, Notification, NotificationOutbox, Room, Schedule, Shift, ShiftPreference
+from .pagination import paginate_keyset
+from .query_plans import explain, full_scans, hot_queries
+from .services import save_week_diff
+from .token_revocation import RevocationFilter
+from .revisions import bump_revision, get_validators, schedule_week_scope
+from .serializers import EmployeeSerializer, RoomSerializer, ScheduleSerializer, ShiftPreferenceSerializer
+from .roles import ADMIN, branch_admin_ids, load_roles
+from .solver import assign, shift_date, slot_index
+from .views import EmployeeViewSet, RoomsByBranchView, ScheduleViewSet, ShiftPreferenceAdminView
+
+
+class QueryPlanTests(TestCase):
+    """
+    Горячие запросы API не должны читать таблицы целиком (shifts/query_plans.py).
+    """
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"Query plan checks are not supported for {connection.vendor}")
+        for name, queryset in hot_queries().items():
+            with self.subTest(query=name):
+                plan = explain(queryset)
+                self.assertEqual(full_scans(plan), [], f"{name}: full table scan\n{plan}")
+
+
+class ListQueryCountTests(TestCase):
+    """
+    Число запросов списочных эндпоинтов не зависит от числа строк.
+    """
+    WEEK = date(2000, 1, 2)
+    # имя -> (ожидаемое число запросов, фабрика (view, путь) по филиалу)
+    ENDPOINTS = {
+        'schedules': (1, lambda branch: (ScheduleViewSet.as_view({'get': 'list'}), f'/api/schedules/?branch={branch.pk}')),
+        'schedules (paginated)': (2, lambda branch: (
+            ScheduleViewSet.as_view({'get': 'list'}), f'/api/schedules/?branch={branch.pk}&page_size=1000',
+        )),
+        'employees': (1, lambda branch: (EmployeeViewSet.as_view({'get': 'list'}), f'/api/employees/?branch={branch.pk}')),
+        'rooms by branch': (1, lambda branch: (
+            lambda request: RoomsByBranchView.as_view()(request, branch_id=branch.pk), f'/api/branches/{branch.pk}/rooms/',
+        )),
+        'shift preferences (admin)': (1, lambda branch: (
+            ShiftPreferenceAdminView.as_view(),
+            f'/api/shift-preferences-admin/?branch_id={branch.pk}&week_start_date={ListQueryCountTests.WEEK}',
+        )),
+    }
+
+    @classmethod
+    def fixture(cls, rows):
+        """
+        Филиал с rows записями расписания (половина с сотрудниками).
+        """
+        branch = Branch.objects.create(name=f'branch-{rows}')
+        room = Room.objects.create(name='room', branch=branch)
+        Room.objects.bulk_create([Room(name=f'room-{i}', branch=branch) for i in range(rows)])
+        users = User.objects.bulk_create([User(username=f'user-{rows}-{i}') for i in range(rows)])
+        employees = Employee.objects.bulk_create([Employee(user=user, branch=branch, phone_number='0') for user in users])
+        ShiftPreference.objects.bulk_create([
+            ShiftPreference(employee=employee, branch=branch, week_start_date=cls.WEEK, day='ראשון', shift_type=Shift.MORNING, room=room)
+            for employee in employees
+        ])
+        shifts = Shift.objects.bulk_create([
+            Shift(room=room, shift_type=Shift.MORNING, day_of_week=str(i), date=cls.WEEK) for i in range(rows)
+        ])
+        Schedule.objects.bulk_create([
+            Schedule(branch=branch, week_start_date=cls.WEEK, shift=shift, employee=employees[i] if i % 2 else None)
+            for i, shift in enumerate(shifts)
+        ])
+        return branch
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.branches = {rows: cls.fixture(rows) for rows in (20, 100)}
+        cls.admin = User.objects.create(username='admin', is_staff=True)
+        cls.admin.groups.add(Group.objects.create(name=ADMIN))
+
+    def setUp(self):
+        # Роли администратора уже в кэше, как после первого запроса
+        load_roles(self.admin)
+
+    def test_list_endpoints_issue_constant_queries(self):
+        factory = APIRequestFactory()
+        for name, (expected, endpoint) in self.ENDPOINTS.items():
+            for rows, branch in self.branches.items():
+                with self.subTest(endpoint=name, rows=rows):
+                    view, path = endpoint(branch)
+                    request = factory.get(path)
+                    force_authenticate(request, user=self.admin)
+                    with self.assertNumQueries(expected):
+                        response = view(request)
+                        response.render()
+                    self.assertEqual(response.status_code, 200)
+
+
+class CreateScheduleQueryCountTests(TestCase):
+    """
+    create-schedule создаёт неделю за постоянное число запросов.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin')
+        self.admin.groups.add(Group.objects.create(name=ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        load_roles(self.admin)
+
+    def create_week(self, rooms):
+        branch = Branch.objects.create(name=f'branch-{rooms}', location='L')
+        Room.objects.bulk_create([Room(name=f'room-{i}', branch=branch) for i in range(rooms)])
+        users = User.objects.bulk_create([User(username=f'user-{rooms}-{i}') for i in range(rooms)])
+        employees = Employee.objects.bulk_create([Employee(user=user, branch=branch, phone_number='0') for user in users])
+        grid = [
+            {'day': day, 'shifts': [
+                {'shift': shift_type, 'rooms': [
+                    {'room': f'room-{i}', 'employee': employee.pk} for i, employee in enumerate(employees)
+                ]}
+                for shift_type in (Shift.MORNING, Shift.EVENING)
+            ]}
+            for day in ('ראשון', 'שני', 'שלישי')
+        ]
+        return branch, {'branch_id': branch.pk, 'start_date': str(self.WEEK), 'schedule': grid}
+
+    def post(self, payload):
+        response = self.client.post('/api/create-schedule/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_query_count_does_not_depend_on_grid_size(self):
+        # Обе сетки помещаются в одну пачку INSERT (на SQLite — 999 параметров)
+        _, small = self.create_week(4)
+        large_branch, large = self.create_week(20)
+        with CaptureQueriesContext(connection) as queries:
+            self.post(small)
+        with self.assertNumQueries(len(queries)):
+            self.post(large)
+        self.assertEqual(Schedule.objects.filter(branch=large_branch).count(), 20 * 2 * 3)
+
+    def test_impossible_date_is_bad_request(self):
+        _, payload = self.create_week(1)
+        for extra in ({}, {'async': True}):
+            response = self.client.post('/api/create-schedule/', {**payload, 'start_date': '2024-02-30', **extra}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+
+class TokenRevocationTests(TestCase):
+    """
+    Отзыв токенов хранится в БД (UserTokenState) и переживает очистку кэша.
+    """
+
+    def setUp(self):
+        self.worker_group = Group.objects.create(name='Worker')
+        self.user = User.objects.create_user(username='worker', password='pw')
+        self.user.groups.add(self.worker_group)
+        Employee.objects.create(user=self.user, phone_number='050', branch=Branch.objects.create(name='B', location='L'))
+        self.tokens = self.login()
+
+    def login(self):
+        response = APIClient().post('/api/token/', {'username': 'worker', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def refresh(self, refresh_token):
+        return APIClient().post('/api/token/refresh/', {'refresh': refresh_token}, format='json')
+
+    def user_info_status(self, access_token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        return client.get('/api/user-info/').status_code
+
+    def test_revocation_survives_cache_clear(self):
+        self.user.groups.clear()
+        cache.clear()  # как после перезапуска процесса
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.assertEqual(self.user_info_status(self.tokens['access']), 401)
+
+    def test_login_right_after_group_change_is_valid(self):
+        self.user.groups.add(Group.objects.create(name='Admin'))
+        tokens = self.login()
+        self.assertEqual(self.user_info_status(tokens['access']), 200)
+        self.assertEqual(AccessToken(tokens['access'])['role'], 'Admin')
+
+    def test_refresh_rebuilds_claims_from_db(self):
+        # Изменение групп в обход сигналов: токен не отозван, но роль берётся из БД
+        User.groups.through.objects.filter(user=self.user).delete()
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(AccessToken(response.data['access'])['role'])
+
+    def test_inactive_or_deleted_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.user_info_status(self.tokens['access']), 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+        User.objects.filter(pk=self.user.pk).delete()
+        cache.clear()
+        self.assertEqual(self.user_info_status(self.tokens['access']), 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+
+
+class JobRequeueTests(TestCase):
+    """
+    Задачи, зависшие в running после падения воркера, возвращаются в очередь.
+    """
+
+    def test_stale_running_job_is_requeued(self):
+        stale = Job.objects.create(kind='noop', status=Job.RUNNING, started_at=timezone.now() - timedelta(hours=1))
+        fresh = Job.objects.create(kind='noop', status=Job.RUNNING, started_at=timezone.now())
+
+        self.assertEqual(requeue_stale(timeout=60), [stale.pk])
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.started_at), (Job.QUEUED, None))
+        self.assertEqual(fresh.status, Job.RUNNING)
+
+    def test_long_job_with_heartbeat_is_not_requeued(self):
+        now = timezone.now()
+        alive = Job.objects.create(kind='noop', status=Job.RUNNING, started_at=now - timedelta(hours=2), heartbeat_at=now)
+        dead = Job.objects.create(
+            kind='noop', status=Job.RUNNING, started_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(minutes=10),
+        )
+
+        self.assertEqual(requeue_stale(timeout=60), [dead.pk])
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, Job.RUNNING)
+
+    def test_claim_batch_picks_up_stale_jobs(self):
+        stale = Job.objects.create(kind='noop', status=Job.RUNNING, started_at=timezone.now() - timedelta(days=1))
+        self.assertEqual([job.pk for job in claim_batch(5)], [stale.pk])
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Job.RUNNING)
+
+
+class InvalidDateParamTests(TestCase):
+    """
+    Несуществующая дата в параметрах (2025-02-30) — 400, а не 500.
+    """
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', password='pw')
+        admin.groups.add(Group.objects.create(name='Admin'))
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def assertBadRequest(self, response):
+        self.assertEqual(response.status_code, 400, getattr(response, 'data', response))
+
+    def test_schedule_range_export(self):
+        self.assertBadRequest(self.client.get('/api/schedule-range/', {'start': '2025-02-30', 'end': '2025-03-02'}))
+
+    def test_payroll_export(self):
+        self.assertBadRequest(self.client.get('/api/payroll-export/', {'start': '2025-02-01', 'end': '2025-02-30'}))
+
+    def test_preference_matrix(self):
+        self.assertBadRequest(self.client.get('/api/shift-preferences/matrix/', {'branch_id': self.branch.pk, 'week_start_date': '2025-02-30'}))
+
+    def test_schedule_conflicts(self):
+        self.assertBadRequest(self.client.get('/api/schedule-conflicts/', {'branch_id': self.branch.pk, 'week_start_date': '2025-02-30'}))
+        self.assertBadRequest(self.client.post('/api/schedule-conflicts/', {'branch_id': self.branch.pk, 'start_date': '2025-02-30'}, format='json'))
+
+    def test_day_view(self):
+        self.assertBadRequest(self.client.get('/api/day-view/', {'date': '2025-02-30'}))
+
+    def test_update_schedule_entries(self):
+        entry = {'week_start_date': '2025-03-02', 'day': 'ראשון', 'shift_details': {'shift_type': 'בוקר', 'room': 'A'}}
+        for bad in (
+            {**entry, 'week_start_date': '2025-02-30'},
+            {key: value for key, value in entry.items() if key != 'shift_details'},
+            {**entry, 'employee_id': 'abc'},
+            'not an object',
+        ):
+            for extra in ({}, {'async': True}):
+                with self.subTest(entry=bad, **extra):
+                    self.assertBadRequest(self.client.post('/api/update-schedule/', {
+                        'branch_id': self.branch.pk, 'schedules': [bad], **extra,
+                    }, format='json'))
+        self.assertFalse(Job.objects.exists())
+
+    def test_save_schedule(self):
+        self.assertBadRequest(self.client.post('/api/save-schedule/', {'branch_id': self.branch.pk, 'start_date': '2025-02-30', 'schedule': []}, format='json'))
+
+    def test_get_schedule(self):
+        self.assertBadRequest(self.client.get(f'/api/get-schedule/{self.branch.pk}/draft/', {'week_start_date': '2025-02-30'}))
+
+    def test_solve_schedule(self):
+        self.assertBadRequest(self.client.post('/api/solve-schedule/', {'branch_id': self.branch.pk, 'start_date': '2025-02-30'}, format='json'))
+
+    def test_delete_by_week(self):
+        response = self.client.delete(f'/api/schedules/delete-by-week/?branch_id={self.branch.pk}&week_start_date=2025-02-30')
+        self.assertBadRequest(response)
+
+    def test_clone_week(self):
+        self.assertBadRequest(self.client.post('/api/schedules/clone-week/', {
+            'branch_id': self.branch.pk, 'source_week_start_date': '2025-02-30', 'target_week_start_date': '2025-03-02',
+        }, format='json'))
+
+    def test_bulk_preference_status(self):
+        self.assertBadRequest(self.client.post('/api/shift-preferences/bulk-status/', {
+            'branch_id': self.branch.pk, 'status': 'approved', 'week_start_date': '2025-02-30',
+        }, format='json'))
+
+    def test_schedule_list_filters(self):
+        self.assertBadRequest(self.client.get('/api/schedules/', {'week_start_date': '2025-02-30'}))
+        self.assertBadRequest(self.client.get('/api/schedules/', {'branch': 'abc'}))
+
+
+class DoubleBookingApiTests(TestCase):
+    """
+    ScheduleViewSet и ShiftViewSet отвечают 409 на двойное назначение сотрудника.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', password='pw')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username='worker'), phone_number='050', branch=self.branch,
+        )
+        room_a = Room.objects.create(name='A', branch=self.branch)
+        room_b = Room.objects.create(name='B', branch=self.branch)
+        room_c = Room.objects.create(name='C', branch=self.branch)
+        self.morning = Shift.objects.create(room=room_a, shift_type=Shift.MORNING, day_of_week='ראשון', date=self.WEEK)
+        self.other_morning = Shift.objects.create(room=room_b, shift_type=Shift.MORNING, day_of_week='ראשון', date=self.WEEK)
+        self.evening = Shift.objects.create(room=room_c, shift_type=Shift.EVENING, day_of_week='ראשון', date=self.WEEK)
+        self.booked = Schedule.objects.create(branch=self.branch, week_start_date=self.WEEK, shift=self.morning, employee=self.employee)
+
+    def schedule_payload(self, shift):
+        return {'branch': self.branch.pk, 'week_start_date': str(self.WEEK), 'shift': shift.pk, 'employee': self.employee.pk}
+
+    def test_create_double_booking_is_conflict(self):
+        response = self.client.post('/api/schedules/', self.schedule_payload(self.other_morning), format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'][0]['employee_id'], self.employee.pk)
+        self.assertEqual(Schedule.objects.count(), 1)
+
+        response = self.client.post('/api/schedules/', self.schedule_payload(self.evening), format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_keeps_own_booking(self):
+        response = self.client.patch(f'/api/schedules/{self.booked.pk}/', {'status': Schedule.APPROVED}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_saving_duplicated_legacy_cell_assigns_one_row(self):
+        room = Room.objects.create(name='D', branch=self.branch)
+        shift = Shift.objects.create(room=room, shift_type=Shift.AFTERNOON, day_of_week='שני', date=self.WEEK)
+        rows = Schedule.objects.bulk_create([
+            Schedule(branch=self.branch, week_start_date=self.WEEK, shift=shift, day_of_week='שני', shift_type=Shift.AFTERNOON)
+            for _ in range(2)
+        ])
+        grid = [{'day': 'שני', 'shifts': [{'shift': Shift.AFTERNOON, 'rooms': [{'room': 'D', 'employee': self.employee.pk}]}]}]
+
+        summary = save_week_diff(self.branch, self.WEEK, grid)
+        self.assertEqual(summary['changed'], 1)
+        self.assertEqual(
+            list(Schedule.objects.filter(pk__in=[row.pk for row in rows]).order_by('id').values_list('employee_id', flat=True)),
+            [self.employee.pk, None],
+        )
+
+    def test_moving_shift_onto_booked_slot_is_conflict(self):
+        Schedule.objects.create(branch=self.branch, week_start_date=self.WEEK, shift=self.evening, employee=self.employee)
+        response = self.client.patch(f'/api/shifts/{self.evening.pk}/', {'shift_type': Shift.MORNING}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.evening.refresh_from_db()
+        self.assertEqual(self.evening.shift_type, Shift.EVENING)
+
+    def test_materialize_into_published_week_is_conflict(self):
+        Schedule.objects.filter(pk=self.booked.pk).update(status=Schedule.APPROVED)
+        preference = ShiftPreference.objects.create(
+            employee=self.employee, branch=self.branch, week_start_date=self.WEEK,
+            day='ראשון', shift_type=Shift.EVENING, room=self.evening.room,
+        )
+        response = self.client.post('/api/shift-preferences/bulk-status/', {
+            'branch_id': self.branch.pk, 'status': 'approved', 'ids': [preference.pk], 'materialize': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        # Смена статуса откатывается вместе с переносом
+        preference.refresh_from_db()
+        self.assertEqual(preference.status, 'pending')
+        self.assertEqual(Schedule.objects.count(), 1)
+
+
+class ShiftCalendarDateTests(TestCase):
+    """
+    Календарная дата смены вычисляется для дней на иврите и по-английски.
+    """
+    WEEK = date(2025, 3, 2)  # воскресенье
+
+    def test_shift_date_accepts_both_spellings(self):
+        self.assertEqual(shift_date(self.WEEK, 'ראשון'), self.WEEK)
+        self.assertEqual(shift_date(self.WEEK, 'שבת'), date(2025, 3, 8))
+        self.assertEqual(shift_date(self.WEEK, Shift.SUNDAY), self.WEEK)
+        self.assertEqual(shift_date(self.WEEK, Shift.MONDAY), date(2025, 3, 3))
+        self.assertIsNone(shift_date(self.WEEK, 'Someday'))
+
+    def test_saved_shift_with_english_day_gets_calendar_date(self):
+        room = Room.objects.create(name='A', branch=Branch.objects.create(name='B', location='L'))
+        shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week=Shift.TUESDAY, date=self.WEEK)
+        shift.refresh_from_db()
+        self.assertEqual(shift.calendar_date, date(2025, 3, 4))
+
+
+class RevisionTests(TestCase):
+    """
+    Ревизии для ETag хранятся в БД: изменение из другого процесса видно сразу.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.scope = schedule_week_scope(self.branch.pk, self.WEEK)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='worker'))
+
+    def test_validators_survive_cache_clear(self):
+        etag, _ = get_validators([self.scope], 'draft')
+        cache.clear()
+        self.assertEqual(get_validators([self.scope], 'draft')[0], etag)
+        bump_revision(self.scope)
+        self.assertNotEqual(get_validators([self.scope], 'draft')[0], etag)
+
+    def test_change_from_another_process_is_not_304(self):
+        url = f'/api/get-schedule/{self.branch.pk}/draft/?week_start_date={self.WEEK}'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Другой процесс записал изменение: ревизия в БД выросла, локальный кэш не тронут
+        DataRevision.objects.filter(scope=self.scope).update(revision=F('revision') + 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_week_grid_is_rebuilt_after_change_from_another_process(self):
+        url = f'/api/get-schedule/{self.branch.pk}/draft/?week_start_date={self.WEEK}'
+        self.assertEqual(self.client.get(url).json(), [])
+        room = Room.objects.create(name='A', branch=self.branch)
+        shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week='ראשון', date=self.WEEK)
+        # Запись в обход сигналов, как из другого процесса: кэш этого процесса не сброшен
+        Schedule.objects.bulk_create([Schedule(branch=self.branch, week_start_date=self.WEEK, shift=shift)])
+        self.assertEqual(self.client.get(url).json(), [])
+        bump_revision(self.scope)
+        self.assertEqual(len(self.client.get(url).json()), 1)
+
+
+class RevocationFilterTests(TestCase):
+    """
+    Фильтр blacklist видит записи других процессов, в том числе закоммиченные не по порядку id.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='worker')
+        now = timezone.now()
+        self.tokens = [
+            OutstandingToken.objects.create(user=user, jti=f'jti-{i}', token=f'token-{i}', expires_at=now + timedelta(days=1))
+            for i in range(3)
+        ]
+        self.filter = RevocationFilter()
+
+    def blacklist(self, token, id=None, blacklisted_at=None):
+        # bulk_create без сигналов — как запись из другого процесса
+        row, = BlacklistedToken.objects.bulk_create([BlacklistedToken(id=id, token=token)])
+        if blacklisted_at:
+            BlacklistedToken.objects.filter(pk=row.pk).update(blacklisted_at=blacklisted_at)
+
+    def test_row_committed_out_of_id_order_is_seen(self):
+        self.blacklist(self.tokens[0], id=100)
+        self.assertTrue(self.filter.might_contain('jti-0'))
+        # Транзакция с меньшим id закоммичена позже, blacklisted_at — момент её записи
+        self.blacklist(self.tokens[1], id=50, blacklisted_at=timezone.now() - timedelta(seconds=5))
+        self.assertTrue(self.filter.might_contain('jti-1'))
+        self.assertFalse(self.filter.might_contain('jti-2'))
+
+    def test_overlapping_windows_do_not_grow_count(self):
+        self.blacklist(self.tokens[0])
+        self.filter.refresh()
+        self.filter.refresh(force=True)
+        self.filter.refresh(force=True)
+        self.assertEqual(self.filter._bloom.count, 1)
+
+
+class BranchAdminCacheTests(TestCase):
+    """
+    Изменение сотрудника сбрасывает кэш администраторов только его филиалов.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.old, self.new, self.other = (Branch.objects.create(name=name, location='L') for name in 'ABC')
+        user = User.objects.create_user(username='admin')
+        user.groups.add(Group.objects.create(name=ADMIN))
+        self.admin = Employee.objects.create(user=user, phone_number='050', branch=self.old)
+
+    def test_moving_admin_invalidates_old_and_new_branch(self):
+        for branch in (self.old, self.new, self.other):
+            branch_admin_ids(branch.id)
+        self.admin.branch = self.new
+        self.admin.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(branch_admin_ids(self.other.id), [])
+        self.assertEqual(branch_admin_ids(self.old.id), [])
+        self.assertEqual(branch_admin_ids(self.new.id), [self.admin.pk])
+
+    def test_group_change_invalidates_employee_branch(self):
+        self.assertEqual(branch_admin_ids(self.old.id), [self.admin.pk])
+        self.admin.user.groups.clear()
+        self.assertEqual(branch_admin_ids(self.old.id), [])
+
+
+class SolverTests(TestCase):
+    """
+    Ограничения решателя (shifts/solver.py) и отказ перезаписывать опубликованную неделю.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def test_no_morning_after_evening(self):
+        evening = slot_index('ראשון', Shift.EVENING)
+        morning = slot_index('שני', Shift.MORNING)
+        result = assign([(evening, 1), (morning, 1)], [(7, evening, 1, 2), (7, morning, 1, 1)], max_shifts=6)
+        self.assertEqual(result, {(evening, 1): 7})
+
+        # Смена в другом филиале тоже требует отдыха
+        self.assertEqual(assign([(morning, 1)], [(7, morning, 1, 1)], 6, booked={7: 1 << evening}), {})
+
+    def test_max_shifts_per_week(self):
+        slots = [slot_index(day, Shift.MORNING) for day in ('ראשון', 'שני', 'שלישי')]
+        result = assign([(slot, 1) for slot in slots], [(7, slot, 1, 1) for slot in slots], max_shifts=2)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(assign([(slots[0], 1)], [(7, slots[0], 1, 1)], 1, booked={7: 1 << slots[1]}), {})
+
+    def test_one_shift_per_slot(self):
+        slot = slot_index('ראשון', Shift.MORNING)
+        result = assign([(slot, 1), (slot, 2)], [(7, slot, 1, 1), (7, slot, 2, 1), (8, slot, 2, 1)], max_shifts=6)
+        self.assertEqual(sorted(result.values()), [7, 8])
+
+    def test_published_week_is_refused(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        client = APIClient()
+        client.force_authenticate(admin)
+        branch = Branch.objects.create(name='B', location='L')
+        room = Room.objects.create(name='A', branch=branch)
+        employee = Employee.objects.create(user=User.objects.create_user(username='worker'), phone_number='050', branch=branch)
+        shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week='ראשון', date=self.WEEK)
+        Schedule.objects.create(branch=branch, week_start_date=self.WEEK, shift=shift, status=Schedule.APPROVED)
+        ShiftPreference.objects.create(
+            employee=employee, branch=branch, week_start_date=self.WEEK, day='ראשון', shift_type=Shift.MORNING, room=room,
+        )
+
+        response = client.post('/api/solve-schedule/', {'branch_id': branch.pk, 'start_date': str(self.WEEK)}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Schedule.objects.filter(employee=employee).exists())
+
+
+class CloneWeekTests(TestCase):
+    """
+    clone-week копирует время и календарную дату смен и не пишет поверх существующей недели.
+    """
+    SOURCE = date(2025, 3, 2)
+    TARGET = date(2025, 3, 9)
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username='worker'), phone_number='050', branch=self.branch,
+        )
+        room = Room.objects.create(name='A', branch=self.branch)
+        shift = Shift.objects.create(
+            room=room, shift_type=Shift.EVENING, day_of_week='שלישי', date=self.SOURCE,
+            start_time='16:00', end_time='23:30',
+        )
+        Schedule.objects.create(branch=self.branch, week_start_date=self.SOURCE, shift=shift, employee=self.employee)
+
+    def clone(self):
+        return self.client.post('/api/schedules/clone-week/', {
+            'branch_id': self.branch.pk, 'source_week_start_date': str(self.SOURCE), 'target_week_start_date': str(self.TARGET),
+        }, format='json')
+
+    def test_copies_times_and_calendar_date(self):
+        response = self.clone()
+        self.assertEqual(response.status_code, 201)
+        cloned = Schedule.objects.select_related('shift').get(week_start_date=self.TARGET)
+        self.assertEqual(cloned.status, Schedule.DRAFT)
+        self.assertEqual(cloned.employee, self.employee)
+        self.assertEqual((str(cloned.shift.start_time), str(cloned.shift.end_time)), ('16:00:00', '23:30:00'))
+        self.assertEqual(cloned.shift.date, self.TARGET)
+        self.assertEqual(cloned.shift.calendar_date, date(2025, 3, 11))
+
+    def test_existing_target_week_is_refused(self):
+        self.assertEqual(self.clone().status_code, 201)
+        response = self.clone()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Schedule.objects.filter(week_start_date=self.TARGET).count(), 1)
+
+
+class ScheduleRangeExportTests(TestCase):
+    """
+    schedule-range отдаёт записи потоком: NDJSON по строке на запись или один JSON-массив.
+    """
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.employee = Employee.objects.create(
+            user=User.objects.create_user(username='worker', first_name='דנה', last_name='כהן'), phone_number='050', branch=self.branch,
+        )
+        room = Room.objects.create(name='A', branch=self.branch)
+        for week in (date(2025, 3, 2), date(2025, 3, 9), date(2025, 3, 16)):
+            shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week='ראשון', date=week)
+            Schedule.objects.create(branch=self.branch, week_start_date=week, shift=shift, employee=self.employee)
+
+    def export(self, output):
+        response = self.client.get('/api/schedule-range/', {'start': '2025-03-02', 'end': '2025-03-09', 'output': output})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        response, body = self.export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['week_start_date'] for row in rows], ['2025-03-02', '2025-03-09'])
+        self.assertEqual(rows[0]['employee_name'], 'דנה כהן')
+        self.assertEqual(rows[0]['shift_details']['room'], 'A')
+
+    def test_json_array_matches_ndjson(self):
+        response, body = self.export('json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        _, ndjson = self.export('ndjson')
+        self.assertEqual(json.loads(body), [json.loads(line) for line in ndjson.splitlines()])
+
+
+class PayrollExportTests(TestCase):
+    """
+    payroll-export считает часы по времени смены (через полночь +24ч), иначе по типу смены.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def test_hours_include_overnight_shift(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        client = APIClient()
+        client.force_authenticate(admin)
+        branch = Branch.objects.create(name='B', location='L')
+        room = Room.objects.create(name='A', branch=branch)
+        employee = Employee.objects.create(user=User.objects.create_user(username='worker'), phone_number='050', branch=branch)
+        for day, shift_type, start_time, end_time in (
+            ('ראשון', Shift.MORNING, None, None),  # 8ч по умолчанию
+            ('שני', Shift.EVENING, '16:00', '23:30'),  # 7.5ч
+            ('רביעי', Shift.EVENING, '22:00', '05:00'),  # 7ч через полночь
+        ):
+            shift = Shift.objects.create(
+                room=room, shift_type=shift_type, day_of_week=day, date=self.WEEK, start_time=start_time, end_time=end_time,
+            )
+            Schedule.objects.create(branch=branch, week_start_date=self.WEEK, shift=shift, employee=employee, status=Schedule.APPROVED)
+        draft_shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week='חמישי', date=self.WEEK)
+        Schedule.objects.create(branch=branch, week_start_date=self.WEEK, shift=draft_shift, employee=employee)
+
+        response = client.get('/api/payroll-export/', {'start': str(self.WEEK), 'end': str(self.WEEK)})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['employee_id,first_name,last_name,branch,shifts,hours', f'{employee.pk},,,B,3,22.5'])
+
+
+class FastSerializerTests(TestCase):
+    """
+    RowSerializer + FastJSONRenderer дают те же байты, что ModelSerializer + JSONRenderer.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        branch = Branch.objects.create(name='סניף "מרכז"', location='L', notes='a b')
+        room = Room.objects.create(name='A', branch=branch, description=None)
+        Room.objects.create(name='ב', branch=branch, description='חדר\n2')
+        employee = Employee.objects.create(
+            user=User.objects.create_user(username='worker', first_name='דנה', last_name='כהן', email='d@example.com'),
+            phone_number='050', branch=branch, notes='שורה\u2028שורה\u2029',
+        )
+        Employee.objects.create(user=User.objects.create_user(username='nobranch'), phone_number='', branch=None)
+        for shift_type, assigned in ((Shift.MORNING, employee), (Shift.EVENING, None)):
+            shift = Shift.objects.create(room=room, shift_type=shift_type, day_of_week='ראשון', date=self.WEEK)
+            Schedule.objects.create(branch=branch, week_start_date=self.WEEK, shift=shift, employee=assigned)
+        ShiftPreference.objects.create(
+            employee=employee, branch=branch, week_start_date=self.WEEK, day='ראשון', shift_type=Shift.MORNING, room=room,
+        )
+
+    def test_byte_identical_to_drf(self):
+        cases = {
+            'rooms': (ROOM_ROWS, RoomSerializer, Room.objects.order_by('id')),
+            'employees': (EMPLOYEE_ROWS, EmployeeSerializer, Employee.objects.order_by('id')),
+            'schedules': (SCHEDULE_ROWS, ScheduleSerializer, Schedule.objects.order_by('id')),
+            'shift preferences': (SHIFT_PREFERENCE_ROWS, ShiftPreferenceSerializer, ShiftPreference.objects.order_by('id')),
+        }
+        for name, (rows, serializer_class, queryset) in cases.items():
+            with self.subTest(serializer=name):
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                self.assertEqual(FastJSONRenderer().render(rows.serialize(queryset)), expected)
+
+
+class EmployeeSearchTests(TestCase):
+    """
+    ?search= находит сотрудника по имени, логину и телефону, в том числе по одним цифрам.
+    """
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        branch = Branch.objects.create(name='B', location='L')
+        self.dana = Employee.objects.create(
+            user=User.objects.create_user(username='dana.k', first_name='Dana', last_name='כהן'), phone_number='050-1234567', branch=branch,
+        )
+        Employee.objects.create(
+            user=User.objects.create_user(username='avi', first_name='Avi', last_name='Levi'), phone_number='052-7654321', branch=branch,
+        )
+
+    def search(self, term):
+        response = self.client.get('/api/employees/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()]
+
+    def test_search_terms(self):
+        # Короткие термы ищутся через LIKE, длинные — через индекс
+        for term in ('DANA', 'כהן', 'na.', '050-1234567', '0501234567', '1234', 'ah'):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), [self.dana.pk] if term != 'ah' else [])
+
+    def test_rename_updates_index(self):
+        user = self.dana.user
+        user.first_name = 'Noa'
+        user.save()
+        self.assertEqual(self.search('dana'), [self.dana.pk])  # логин dana.k остался
+        self.assertEqual(self.search('noa'), [self.dana.pk])
+
+        self.dana.phone_number = '054-1112233'
+        self.dana.save()
+        self.assertEqual(self.search('0541112233'), [self.dana.pk])
+        self.assertEqual(self.search('0501234567'), [])
+
+
+class PreferenceUpsertTests(TestCase):
+    """
+    Повторная отправка пожеланий не дублирует строки, а пакет стоит постоянного числа запросов.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        branch = Branch.objects.create(name='B', location='L')
+        self.rooms = Room.objects.bulk_create([Room(name=f'room-{i}', branch=branch) for i in range(20)])
+        user = User.objects.create_user(username='worker')
+        self.employee = Employee.objects.create(user=user, phone_number='050', branch=branch)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def items(self, rooms):
+        return [
+            {'week_start_date': str(self.WEEK), 'day': 'ראשון', 'shift_type': shift_type, 'room': room.pk}
+            for room in rooms for shift_type in (Shift.MORNING, Shift.AFTERNOON, Shift.EVENING)
+        ]
+
+    def submit(self, items):
+        return self.client.post('/api/shift-preferences/', items, format='json')
+
+    def test_resubmission_is_idempotent(self):
+        item = self.items(self.rooms[:1])[0]
+        first = self.submit(item)
+        self.assertEqual((first.status_code, first.data['result']), (201, 'created'))
+        second = self.submit(item)
+        self.assertEqual((second.status_code, second.data['result']), (200, 'updated'))
+        self.assertEqual(second.data['id'], first.data['id'])
+
+        response = self.submit(self.items(self.rooms[:2]))
+        self.assertEqual([result['result'] for result in response.data], ['updated'] + ['created'] * 5)
+        self.assertEqual(ShiftPreference.objects.filter(employee=self.employee).count(), 6)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        self.submit(self.items(self.rooms[:1]))  # роли и сотрудник уже в кэше
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.submit(self.items(self.rooms[1:2])).status_code, 201)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(self.submit(self.items(self.rooms[2:])).status_code, 201)
+        self.assertEqual(ShiftPreference.objects.filter(employee=self.employee).count(), 60)
+
+
+class PreferenceMatrixTests(TestCase):
+    """
+    Матрица пожеланий: slots[день][тип смены][комната] с назначением и списком желающих.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def test_matrix_shape(self):
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        client = APIClient()
+        client.force_authenticate(admin)
+        branch = Branch.objects.create(name='B', location='L')
+        room = Room.objects.create(name='A', branch=branch)
+        dana = Employee.objects.create(
+            user=User.objects.create_user(username='dana', first_name='Dana', last_name='Cohen'), phone_number='050', branch=branch,
+        )
+        avi = Employee.objects.create(
+            user=User.objects.create_user(username='avi', first_name='Avi', last_name='Levi'), phone_number='052', branch=branch,
+        )
+        shift = Shift.objects.create(room=room, shift_type=Shift.MORNING, day_of_week='ראשון', date=self.WEEK)
+        Schedule.objects.create(branch=branch, week_start_date=self.WEEK, shift=shift, employee=dana)
+        first = ShiftPreference.objects.create(
+            employee=dana, branch=branch, week_start_date=self.WEEK, day='ראשון', shift_type=Shift.MORNING, room=room, status='approved',
+        )
+        second = ShiftPreference.objects.create(
+            employee=avi, branch=branch, week_start_date=self.WEEK, day='ראשון', shift_type=Shift.MORNING, room=room,
+        )
+        evening = ShiftPreference.objects.create(
+            employee=avi, branch=branch, week_start_date=self.WEEK, day='שני', shift_type=Shift.EVENING, room=room,
+        )
+
+        response = client.get('/api/shift-preferences/matrix/', {'branch_id': branch.pk, 'week_start_date': str(self.WEEK)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {
+            'branch_id': branch.pk,
+            'week_start_date': '2025-03-02',
+            'employees': {str(dana.pk): 'Dana Cohen', str(avi.pk): 'Avi Levi'},
+            'rooms': {str(room.pk): 'A'},
+            'slots': {
+                'ראשון': {Shift.MORNING: {str(room.pk): {
+                    'assigned': dana.pk, 'status': Schedule.DRAFT,
+                    'requested': [[dana.pk, 'approved', first.pk], [avi.pk, 'pending', second.pk]],
+                }}},
+                'שני': {Shift.EVENING: {str(room.pk): {
+                    'assigned': None, 'status': None, 'requested': [[avi.pk, 'pending', evening.pk]],
+                }}},
+            },
+        })
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Курсор по (created_at, id) не теряет и не повторяет записи при вставках между страницами.
+    """
+
+    def setUp(self):
+        branch = Branch.objects.create(name='B', location='L')
+        self.employee = Employee.objects.create(user=User.objects.create_user(username='worker'), phone_number='050', branch=branch)
+        Notification.objects.bulk_create([Notification(employee=self.employee, message=str(i)) for i in range(5)])
+        # Одинаковое время у всех записей: порядок решает id
+        self.created_at = timezone.now() - timedelta(minutes=1)
+        Notification.objects.update(created_at=self.created_at)
+        self.queryset = Notification.objects.filter(employee=self.employee)
+
+    def test_cursor_walk_is_stable(self):
+        expected = list(self.queryset.order_by('-id').values_list('id', flat=True))
+        seen = []
+        items, headers = paginate_keyset(self.queryset, {'limit': '2'})
+        poll = headers['X-Poll-Cursor']
+        while True:
+            seen += [item.id for item in items]
+            if 'X-Next-Cursor' not in headers:
+                break
+            # Новая запись между страницами не сдвигает курсор
+            newest = Notification.objects.create(employee=self.employee, message='new')
+            items, headers = paginate_keyset(self.queryset, {'limit': '2', 'cursor': headers['X-Next-Cursor']})
+        self.assertEqual(seen, expected)
+
+        items, headers = paginate_keyset(self.queryset, {'since': poll})
+        self.assertEqual([item.id for item in items][0], newest.id)
+        self.assertEqual(len(items), 2)
+        items, _ = paginate_keyset(self.queryset, {'since': headers['X-Poll-Cursor']})
+        self.assertEqual(items, [])
+
+
+@override_settings(NOTIFICATION_OUTBOX_AUTODRAIN=False)
+class NotificationOutboxTests(TestCase):
+    """
+    Утверждение смены пишет событие в outbox, уведомления создаёт drain_outbox.
+    """
+    WEEK = date(2025, 3, 2)
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='B', location='L')
+        self.room = Room.objects.create(name='A', branch=self.branch)
+        self.workers = [
+            Employee.objects.create(user=User.objects.create_user(username=f'worker-{i}'), phone_number='050', branch=self.branch)
+            for i in range(2)
+        ]
+        admin = User.objects.create_user(username='admin')
+        admin.groups.add(Group.objects.create(name=ADMIN))
+        self.admin = Employee.objects.create(user=admin, phone_number='052', branch=self.branch)
+
+    def approve(self, employee, day, week=WEEK):
+        shift = Shift.objects.create(room=self.room, shift_type=Shift.MORNING, day_of_week=day, date=week)
+        return Schedule.objects.create(
+            branch=self.branch, week_start_date=week, shift=shift, employee=employee, status=Schedule.APPROVED,
+        )
+
+    def test_delivery(self):
+        self.approve(self.workers[0], 'ראשון')
+        self.approve(self.workers[0], 'שני')
+        withdrawn = self.approve(self.workers[1], 'שלישי')
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+        self.assertFalse(Notification.objects.exists())
+        # Доставляется только то, что утверждено на момент разбора очереди
+        Schedule.objects.filter(pk=withdrawn.pk).update(status=Schedule.DRAFT)
+
+        self.assertEqual(drain_outbox(), 3)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(
+            Notification.objects.filter(kind=Notification.SHIFT_APPROVED).filter(employee=self.workers[0]).count(), 2,
+        )
+        self.assertFalse(Notification.objects.filter(employee=self.workers[1]).exists())
+        self.workers[0].refresh_from_db()
+        self.assertEqual(self.workers[0].unread_notifications, 2)
+        self.assertEqual(drain_outbox(), 0)
+
+    def test_admin_notification_once_per_week(self):
+        next_week = self.WEEK + timedelta(days=7)
+        for employee, day, week in (
+            (self.workers[0], 'ראשון', self.WEEK), (self.workers[1], 'שני', self.WEEK), (self.workers[0], 'ראשון', next_week),
+        ):
+            self.approve(employee, day, week)
+            drain_outbox()  # отдельная доставка на каждое утверждение
+
+        admin_notifications = Notification.objects.filter(employee=self.admin, kind=Notification.WEEK_APPROVED)
+        self.assertEqual(sorted(admin_notifications.values_list('week_start_date', flat=True)), [self.WEEK, next_week])
+
+        # Дубликат отсекает частичный уникальный индекс, а не поиск по тексту
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notification.objects.create(
+                employee=self.admin, message='x', kind=Notification.WEEK_APPROVED, branch=self.branch, week_start_date=self.WEEK,
+            )
+        # Прочие уведомления условием индекса не ограничены
+        for _ in range(2):
+            Notification.objects.create(employee=self.admin, message='x', branch=self.branch, week_start_date=self.WEEK)
@@ -0,0 +1,125 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Проверка refresh-токена по blacklist без поиска jti по всей таблице.
+# В памяти процесса держится фильтр Блума по jti из token_blacklist:
+# промах фильтра означает "точно не в blacklist", попадание проверяется в БД.
+# Фильтр заполняется при первом обращении, а перед проверкой догружает записи,
+# появившиеся с прошлой синхронизации, по окну blacklisted_at с запасом
+# SYNC_OVERLAP_SECONDS (индекс token_blacklist_at_idx, миграция 0018): запись,
+# закоммиченная позже соседних или с меньшим id, всё равно попадает в окно.
+# TOKEN_BLACKLIST_SYNC_SECONDS (по умолчанию 0 — догрузка при каждой проверке)
+# задаёт, сколько другие процессы могут не видеть новый отзыв.
+
+SYNC_SECONDS = getattr(settings, 'TOKEN_BLACKLIST_SYNC_SECONDS', 0)
+SYNC_OVERLAP_SECONDS = 60
+REBUILD_SECONDS = 60 * 60  # полная пересборка убирает удалённые compaction-ом jti
+INITIAL_CAPACITY = 100_000
+FALSE_POSITIVE_RATE = 0.01
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._synced_from = None  # начало прошлой синхронизации: с него (минус запас) читается следующее окно
+        self._synced_at = 0
+        self._built_at = 0
+
+    def _rebuild(self):
+        started = timezone.now()
+        jtis = list(BlacklistedToken.objects.values_list('token__jti', flat=True).iterator(chunk_size=5000))
+        bloom = BloomFilter(max(INITIAL_CAPACITY, len(jtis) * 2))
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom, self._synced_from = bloom, started
+        self._built_at = self._synced_at = time.monotonic()
+
+    def _sync(self):
+        started = timezone.now()
+        rows = BlacklistedToken.objects.filter(
+            blacklisted_at__gte=self._synced_from - timedelta(seconds=SYNC_OVERLAP_SECONDS),
+        ).values_list('token__jti', flat=True)
+        for jti in rows.iterator(chunk_size=5000):
+            # Окна перекрываются: уже добавленные jti не увеличивают count
+            if jti not in self._bloom:
+                self._bloom.add(jti)
+        self._synced_from = started
+        self._synced_at = time.monotonic()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if self._bloom is None or now - self._built_at > REBUILD_SECONDS or self._bloom.count > self._bloom.capacity:
+                self._rebuild()
+            elif force or now - self._synced_at >= SYNC_SECONDS:
+                self._sync()
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def might_contain(self, jti):
+        self.refresh()
+        return jti in self._bloom
+
+
+revocation_filter = RevocationFilter()
+
+
+def is_blacklisted(jti):
+    """
+    Точная проверка: БД запрашивается только при срабатывании фильтра.
+    """
+    if not revocation_filter.might_contain(jti):
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+class BlacklistedTokenError(TokenError):
+    pass
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    RefreshToken, проверяющий blacklist через фильтр вместо запроса на каждый вызов.
+    """
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise BlacklistedTokenError("Token is blacklisted")
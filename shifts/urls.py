@@ -6,7 +6,10 @@ from .views import (
     GetScheduleView, RoomViewSet, RoomsByBranchView, ShiftViewSet, EmployeeViewSet,
     ScheduleViewSet, CreateEmployeeView, CreateScheduleView, SaveScheduleView,
     UpdateScheduleView, refresh_token, UpdateUserView, ShiftPreferenceView,
-    ShiftPreferenceAdminView, ShiftPreferenceDetailView
+    ShiftPreferenceAdminView, ShiftPreferenceDetailView, UnreadNotificationsCountView,
+    MarkNotificationsReadView, SolveScheduleView, JobDetailView, ScheduleRangeExportView,
+    PayrollExportView, PreferenceMatrixView, BulkPreferenceStatusView, ScheduleConflictsView,
+    DayView,
     )
 
 router = DefaultRouter()
@@ -23,13 +26,23 @@ urlpatterns = [
     path('branches/<int:branch_id>/rooms/', RoomsByBranchView.as_view(), name='rooms-by-branch'),
     path('get-schedule/<int:branch_id>/<str:status>/', GetScheduleView.as_view(), name='get-schedule'),
     path('save-schedule/', SaveScheduleView.as_view(), name='save-schedule'),
+    path('solve-schedule/', SolveScheduleView.as_view(), name='solve-schedule'),
+    path('schedule-conflicts/', ScheduleConflictsView.as_view(), name='schedule-conflicts'),
+    path('jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
     path('update-schedule/', UpdateScheduleView.as_view(), name='update-schedule'),
+    path('schedule-range/', ScheduleRangeExportView.as_view(), name='schedule-range'),
+    path('day-view/', DayView.as_view(), name='day-view'),
+    path('payroll-export/', PayrollExportView.as_view(), name='payroll-export'),
     path('available-weeks/<int:branch_id>/', AvailableWeeksView.as_view(), name='available-weeks'),
     path('employee-notifications/', EmployeeNotificationsView.as_view(), name='employee-notifications'),
     path('admin-notifications/', AdminNotificationsView.as_view(), name='admin-notifications'),
+    path('notifications/unread-count/', UnreadNotificationsCountView.as_view(), name='notifications-unread-count'),
+    path('notifications/mark-read/', MarkNotificationsReadView.as_view(), name='notifications-mark-read'),
     path('token/refresh/', refresh_token, name='token-refresh'),
     path('update-user/', UpdateUserView.as_view(), name='update-user'),
     path('shift-preferences/', ShiftPreferenceView.as_view(), name='shift-preferences'),
     path('shift-preferences-admin/', ShiftPreferenceAdminView.as_view(), name='shift-preferences-admin'),
+    path('shift-preferences/matrix/', PreferenceMatrixView.as_view(), name='shift-preference-matrix'),
+    path('shift-preferences/bulk-status/', BulkPreferenceStatusView.as_view(), name='shift-preference-bulk-status'),
     path('shift-preferences/<int:pk>/', ShiftPreferenceDetailView.as_view(), name='shift-preference-detail'),
 ]
@@ -5,17 +5,40 @@ from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.decorators import api_view
-from .models import Branch, Notification, Room, Shift, Employee, Schedule, ShiftPreference
+from rest_framework.renderers import BrowsableAPIRenderer
+from .models import Branch, Job, Notification, Room, Shift, Employee, Schedule, ShiftPreference
 from .serializers import BranchSerializer, RoomSerializer, ShiftSerializer, EmployeeSerializer, ScheduleSerializer, UserEmployeeSerializer, ShiftPreferenceSerializer
 from .permissions import IsAdminGroup, IsAdminOrReadOnly, IsWorkerOrAdmin
+from .roles import ADMIN, has_role, primary_role
+from .jobs import enqueue, serialize_job
+from .search import search_employees
+from .preferences import CREATED, ERROR, bulk_set_status, preference_matrix, upsert_preferences
+from .exports import PAYROLL_HEADER, iter_csv, iter_json_array, iter_ndjson, payroll_rows, schedule_range_rows
+from .authentication import load_token_state, resolve_user, set_user_claims, token_rejection
+from .token_revocation import BlacklistedTokenError, FilteredRefreshToken
+from .notifications import mark_read, unread_count
+from .pagination import OptionalPageNumberPagination, paginate_keyset
+from .fast_serializers import EMPLOYEE_ROWS, ROOM_ROWS, SCHEDULE_ROWS, SHIFT_PREFERENCE_ROWS, FastJSONRenderer
+from .read_models import build_day_view, current_week_start, get_week_grid, resolve_default_week
+from .revisions import (
+    get_validators, not_modified, set_validators, get_employee_scope,
+    schedule_branch_scope, schedule_week_scope,
+    employee_notifications_scope, branch_notifications_scope,
+)
+from .services import (
+    ScheduleConflictError, ScheduleGridError, WeekPublishedError, bulk_create_week, clone_week, delete_week,
+    generate_week_draft, preview_week_conflicts, save_week_diff, update_week_entries, validate_update_entries,
+)
+from .conflicts import week_conflicts
 from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.dateparse import parse_date
 import logging
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from datetime import date, timedelta
 from django.db.models import Min
 from django.db.models import Q
@@ -23,6 +46,62 @@ from django.db.models import Max
 
 logger = logging.getLogger('system_logger')
 
+
+def wants_async(request):
+    """
+    async=true в теле запроса или в query string — выполнить как фоновую задачу.
+    """
+    value = request.query_params.get('async')
+    if value is None and isinstance(request.data, dict):
+        value = request.data.get('async')
+    return str(value).lower() in ('true', '1')
+
+
+def parse_date_param(value):
+    """
+    Дата из параметра запроса (YYYY-MM-DD). None, если параметра нет или дата
+    некорректна: parse_date бросает ValueError на несуществующих датах вроде 2025-02-30.
+    """
+    try:
+        return parse_date(str(value or ''))
+    except ValueError:
+        return None
+
+
+def conflict_response(error):
+    return Response({"error": str(error), "conflicts": error.conflicts}, status=status.HTTP_409_CONFLICT)
+
+
+def job_accepted(job):
+    return Response(
+        {"job_id": job.pk, "status": job.status, "status_url": f"/api/jobs/{job.pk}/"},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+class SlotConflictMixin:
+    """
+    create/update: двойное назначение сотрудника — 409, а не 500. Сериализатор
+    проверяет конфликты заранее; IntegrityError от schedule_employee_slot_uniq
+    остаётся на случай параллельной записи и откатывает всю операцию.
+    """
+
+    def _without_double_booking(self, method, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return method(request, *args, **kwargs)
+        except ScheduleConflictError as e:
+            return conflict_response(e)
+        except IntegrityError:
+            logger.warning(f"User {request.user.username} hit schedule_employee_slot_uniq: {request.data}")
+            return Response({"error": "Employee is already booked for this slot", "conflicts": []}, status=status.HTTP_409_CONFLICT)
+
+    def create(self, request, *args, **kwargs):
+        return self._without_double_booking(super().create, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self._without_double_booking(super().update, request, *args, **kwargs)
+
+
 class BranchViewSet(viewsets.ModelViewSet):
     queryset = Branch.objects.all()
     serializer_class = BranchSerializer
@@ -35,23 +114,40 @@ class RoomViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]  # Только админ может изменять данные
 
 
-class ShiftViewSet(viewsets.ModelViewSet):
+class ShiftViewSet(SlotConflictMixin, viewsets.ModelViewSet):
     queryset = Shift.objects.all()
     serializer_class = ShiftSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]  # Только админ может изменять данные
 
 
 class EmployeeViewSet(viewsets.ModelViewSet):
-    queryset = Employee.objects.all()
+    queryset = Employee.objects.select_related('user', 'branch')
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]  # Только админ может изменять данные
     
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    pagination_class = OptionalPageNumberPagination
+
     def get_queryset(self):
         # Получаем параметр branch из GET запроса
+        queryset = self.queryset
         branch_id = self.request.query_params.get("branch")
         if branch_id:
-            return self.queryset.filter(branch_id=branch_id)
-        return self.queryset
+            queryset = queryset.filter(branch_id=branch_id)
+        # ?search= — подстрока имени, фамилии, логина или телефона (индекс в shifts/search.py)
+        search = self.request.query_params.get("search")
+        if search:
+            queryset = search_employees(queryset, search)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Список только для чтения — без EmployeeSerializer, из одного values_list
+        queryset = self.get_queryset().order_by('id')
+        page = self.paginate_queryset(EMPLOYEE_ROWS.rows(queryset))
+        if page is not None:
+            return self.get_paginated_response(EMPLOYEE_ROWS.serialize(page))
+        return Response(EMPLOYEE_ROWS.serialize(queryset))
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -79,11 +175,77 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ScheduleViewSet(viewsets.ModelViewSet):
-    queryset = Schedule.objects.all()
+class ScheduleViewSet(SlotConflictMixin, viewsets.ModelViewSet):
+    queryset = Schedule.objects.select_related('shift__room', 'employee__user').order_by('id')
     serializer_class = ScheduleSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = OptionalPageNumberPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        # Список только для чтения — без ScheduleSerializer, из одного values_list
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(SCHEDULE_ROWS.rows(queryset))
+        if page is not None:
+            return self.get_paginated_response(SCHEDULE_ROWS.serialize(page))
+        return Response(SCHEDULE_ROWS.serialize(queryset))
+
+    def get_queryset(self):
+        # Фильтры: ?branch=, ?week_start_date=, ?status=
+        queryset = self.queryset
+        params = self.request.query_params
+        if params.get('branch'):
+            if not params['branch'].isdigit():
+                raise ValidationError({"branch": "Invalid branch ID."})
+            queryset = queryset.filter(branch_id=params['branch'])
+        if params.get('week_start_date'):
+            week_start_date = parse_date_param(params['week_start_date'])
+            if not week_start_date:
+                raise ValidationError({"week_start_date": "Invalid date."})
+            queryset = queryset.filter(week_start_date=week_start_date)
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        return queryset
     
+    @action(detail=False, methods=['post'], url_path='clone-week')
+    def clone_week(self, request):
+        """
+        Копирует неделю (смены и записи расписания) на другую неделю как черновик.
+        """
+        branch_id = request.data.get('branch_id')
+        source_week = parse_date_param(request.data.get('source_week_start_date'))
+        target_week = parse_date_param(request.data.get('target_week_start_date'))
+        clear_employees = str(request.data.get('clear_employees', False)).lower() in ('true', '1')
+
+        if not branch_id or not source_week or not target_week:
+            return Response({"error": "Branch ID, source and target week start dates are required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            branch = Branch.objects.get(pk=branch_id)
+        except Branch.DoesNotExist:
+            return Response({"error": "Branch not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if wants_async(request):
+            job = enqueue('clone_week', {
+                'branch_id': branch.pk,
+                'source_week_start_date': source_week.isoformat(),
+                'target_week_start_date': target_week.isoformat(),
+                'clear_employees': clear_employees,
+            }, user_id=request.user.id)
+            return job_accepted(job)
+
+        try:
+            cloned_count = clone_week(branch, source_week, target_week, clear_employees=clear_employees)
+        except ScheduleConflictError as e:
+            return conflict_response(e)
+        except ScheduleGridError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not cloned_count:
+            return Response({"error": "No schedules found for the source week"}, status=status.HTTP_404_NOT_FOUND)
+        logger.info(f"User {request.user.username} cloned week {source_week} to {target_week} in branch {branch.name} ({cloned_count} entries).")
+        return Response({"message": f"Cloned {cloned_count} schedule entries", "cloned_count": cloned_count}, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['delete'], url_path='delete-by-week')
     def delete_by_week(self, request):
         branch_id = request.query_params.get('branch_id')
@@ -92,9 +254,14 @@ class ScheduleViewSet(viewsets.ModelViewSet):
         if not branch_id or not week_start_date:
             return Response({"error": "Branch ID and week start date are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        deleted_count, _ = Schedule.objects.filter(
-            branch_id=branch_id, week_start_date=week_start_date
-        ).delete()
+        if not parse_date_param(week_start_date):
+            return Response({"error": "Invalid week start date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if wants_async(request):
+            job = enqueue('delete_week', {'branch_id': branch_id, 'week_start_date': week_start_date}, user_id=request.user.id)
+            return job_accepted(job)
+
+        deleted_count = delete_week(branch_id, week_start_date)
 
         if deleted_count > 0:
             logger.info(f"User {request.user.username} deleted {deleted_count} schedule entries for week {week_start_date} in branch {branch_id}.")
@@ -135,18 +302,21 @@ class UserInfoView(APIView):
 
     def get(self, request):
         user = request.user
-        employee = Employee.objects.get(user=user)
-        
-        # Получаем группы, к которым принадлежит пользователь (в данном случае будет только одна)
-        groups = user.groups.all()
-        group_name = groups[0].name if groups else "No Group"
+        employee_scope = get_employee_scope(user)
+        if employee_scope is None:
+            return Response({"error": "Employee not found"}, status=404)
+        # Один запрос: сотрудник вместе с пользователем
+        employee = Employee.objects.select_related('user').get(pk=employee_scope[0])
+
+        # Роль пользователя (группа) из токена или кэша ролей
+        group_name = primary_role(user) or "No Group"
         data = {
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
+            'username': employee.user.username,
+            'email': employee.user.email,
+            'first_name': employee.user.first_name,
+            'last_name': employee.user.last_name,
             'phone_number': employee.phone_number,
-            'branch': employee.branch.id,
+            'branch': employee.branch_id,
             'notes': employee.notes,
             'group': group_name
         }
@@ -173,56 +343,32 @@ class CreateScheduleView(APIView):
             logger.error(f"Branch not found: {branch_id}")
             return Response({'error': 'Branch not found.'}, status=status.HTTP_404_NOT_FOUND)
 
+        start_date = parse_date_param(start_date)
+        if not start_date:
+            logger.error("Invalid date format provided")
+            return Response({'error': 'Invalid start date format.'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            start_date = parse_date(start_date)
-            if not start_date:
-                logger.error("Invalid date format provided")
-                return Response({'error': 'Invalid start date format.'}, status=status.HTTP_400_BAD_REQUEST)
-            # Счетчик успешных созданий
-            created_shifts_count = 0
-
-            # Проходим по расписанию
-            for day_data in schedule_data:
-                day_of_week = day_data.get('day')  # Например, ראשון
-                for shift_data in day_data.get('shifts', []):
-                    shift_type = shift_data.get('shift')  # Например, בוקר
-                    for room_data in shift_data.get('rooms', []):
-                        room_name = room_data.get('room')
-                        employee_id = room_data.get('employee', None)
-
-                        try:
-                            room = Room.objects.get(name=room_name, branch=branch)
-                        except Room.DoesNotExist:
-                            logger.error(f"Room not found: {room_name} in branch {branch.name}")
-                            return Response(
-                                {'error': f'Room "{room_name}" does not exist in branch "{branch.name}".'},
-                                status=status.HTTP_400_BAD_REQUEST
-                            )
-
-                        employee = None
-                        if employee_id:
-                            employee = Employee.objects.filter(id=employee_id).first()
-
-                        # Создаём смену
-                        shift = Shift.objects.create(
-                            room=room,
-                            shift_type=shift_type,
-                            day_of_week=day_of_week,
-                            date=start_date,
-                            start_time=None,
-                            end_time=None
-                        )
-
-                        # Создаём запись расписания
-                        Schedule.objects.create(
-                            week_start_date=start_date,
-                            shift=shift,
-                            employee=employee,
-                            branch=branch,
-                            status=Schedule.DRAFT  # Отмечаем, что это шаблон
-                        )
-                        created_shifts_count += 1
-                        
+            if wants_async(request):
+                job = enqueue('create_week', {
+                    'branch_id': branch.pk,
+                    'start_date': start_date.isoformat(),
+                    'schedule': schedule_data,
+                }, user_id=user.id)
+                logger.info(f"User {user.username} queued schedule creation for branch {branch.name} as job {job.pk}")
+                return job_accepted(job)
+
+            # Комнаты и сотрудники загружаются одним запросом, смены и записи
+            # расписания вставляются пачками в одной транзакции
+            try:
+                created_shifts_count = bulk_create_week(branch, start_date, schedule_data)
+            except ScheduleConflictError as e:
+                logger.warning(f"Schedule grid for branch {branch.name} has double bookings: {e}")
+                return conflict_response(e)
+            except ScheduleGridError as e:
+                logger.error(f"Invalid schedule grid for branch {branch.name}: {e}")
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
             logger.info(f"User {user.username} successfully created a schedule with {created_shifts_count} shifts for branch {branch.name}")
             return Response({'status': 'Schedule successfully created'}, status=status.HTTP_201_CREATED)
 
@@ -242,39 +388,28 @@ class SaveScheduleView(APIView):
         if not branch_id:
             logger.warning(f"User {user.username} tried to save schedule without branch_id.")
             return Response({"error": "Branch ID is required"}, status=400)
+        week_start_date = parse_date_param(week_start_date)
+        if not week_start_date:
+            logger.warning(f"User {user.username} tried to save schedule without a valid start_date.")
+            return Response({"error": "Valid start date is required"}, status=400)
         try:
             branch = Branch.objects.get(pk=branch_id)
-            for day in schedule_data:
-                for shift in day['shifts']:
-                    for room in shift['rooms']:
-                        shift_instances = Shift.objects.filter(
-                            room__name=room['room'], 
-                            shift_type=shift['shift'],
-                            day_of_week=day['day'],
-                            room__branch_id=branch_id
-                        )
-                        
-                        for shift_instance in shift_instances:
-                            employee_id = room.get('employee')
-                            employee = Employee.objects.filter(id=employee_id).first() if employee_id else None
-
-                            # Обновляем или создаем расписание для каждой смены
-                            schedule, created = Schedule.objects.update_or_create(
-                                week_start_date=week_start_date,
-                                branch=branch,
-                                shift=shift_instance,
-                                defaults={
-                                    'employee': employee,
-                                    'status': request.data.get('status', Schedule.DRAFT),
-                                }
-                            )
-                            if created:
-                                logger.info(f"User {user.username} created a new schedule for {shift_instance}.")
-                            else:
-                                logger.info(f"User {user.username} updated schedule for {shift_instance}.")
-
-            logger.info(f"User {user.username} successfully saved schedule for branch {branch.name}.")
-            return Response({"status": "Schedule saved successfully"})
+            # Загружаем неделю один раз и записываем только изменившиеся ячейки
+            summary = save_week_diff(
+                branch,
+                week_start_date,
+                schedule_data or [],
+                status=request.data.get('status', Schedule.DRAFT),
+            )
+
+            logger.info(f"User {user.username} successfully saved schedule for branch {branch.name}: {summary}.")
+            return Response({"status": "Schedule saved successfully", **summary})
+        except ScheduleConflictError as e:
+            logger.warning(f"User {user.username} sent a schedule grid with double bookings: {e}")
+            return conflict_response(e)
+        except ScheduleGridError as e:
+            logger.warning(f"User {user.username} sent an invalid schedule grid: {e}")
+            return Response({"error": str(e)}, status=400)
         except Branch.DoesNotExist:
             logger.exception(f"User {user.username} tried to save schedule for a non-existent branch: {branch_id}")
             return Response({"error": "Branch not found"}, status=404)
@@ -282,6 +417,188 @@ class SaveScheduleView(APIView):
             logger.exception(f"User {user.username} encountered an error while saving schedule: {str(e)}")
             return Response({"error": str(e)}, status=500)
 
+class SolveScheduleView(APIView):
+    """
+    Автоматически заполняет неделю по пожеланиям сотрудников и сохраняет её как черновик.
+    С "save": false только возвращает предложенную сетку.
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def post(self, request):
+        user = request.user
+        branch_id = request.data.get('branch_id')
+        week_start_date = parse_date_param(request.data.get('start_date'))
+        if not branch_id or not week_start_date:
+            return Response({"error": "Branch ID and a valid start date are required"}, status=400)
+
+        try:
+            max_shifts = request.data.get('max_shifts_per_week')
+            max_shifts = int(max_shifts) if max_shifts is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "max_shifts_per_week must be an integer"}, status=400)
+
+        try:
+            branch = Branch.objects.get(pk=branch_id)
+        except Branch.DoesNotExist:
+            return Response({"error": "Branch not found"}, status=404)
+
+        save = request.data.get('save', True) not in (False, 'false', '0')
+        if save and wants_async(request):
+            job = enqueue('solve_week', {
+                'branch_id': branch.pk,
+                'start_date': week_start_date.isoformat(),
+                'max_shifts': max_shifts,
+            }, user_id=user.id)
+            return job_accepted(job)
+
+        try:
+            result = generate_week_draft(branch, week_start_date, max_shifts, save=save)
+            if not save:
+                return Response(result)
+
+            logger.info(f"User {user.username} generated schedule for branch {branch.name} ({week_start_date}): {result['assigned']} cells assigned")
+            return Response({"status": "Draft schedule generated", **result})
+        except WeekPublishedError as e:
+            return Response({"error": str(e)}, status=409)
+        except ScheduleConflictError as e:
+            return conflict_response(e)
+        except Exception as e:
+            logger.exception(f"Error while generating schedule: {str(e)}")
+            return Response({"error": str(e)}, status=500)
+
+class ScheduleConflictsView(APIView):
+    """
+    GET: отчёт по неделе филиала — двойные назначения и вечерняя смена перед утренней
+    (с учётом смен сотрудников в других филиалах).
+    POST: проверка сетки в формате SaveScheduleView без сохранения.
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def _branch(self, branch_id):
+        try:
+            return Branch.objects.get(pk=branch_id)
+        except (Branch.DoesNotExist, ValueError, TypeError):
+            return None
+
+    def get(self, request):
+        branch_id = request.query_params.get('branch_id')
+        week_start_date = parse_date_param(request.query_params.get('week_start_date'))
+        if not branch_id or not week_start_date:
+            return Response({"error": "Branch ID and a valid week start date are required"}, status=400)
+        branch = self._branch(branch_id)
+        if branch is None:
+            return Response({"error": "Branch not found"}, status=404)
+        return Response(week_conflicts(branch, week_start_date))
+
+    def post(self, request):
+        branch_id = request.data.get('branch_id')
+        week_start_date = parse_date_param(request.data.get('start_date'))
+        if not branch_id or not week_start_date:
+            return Response({"error": "Branch ID and a valid start date are required"}, status=400)
+        branch = self._branch(branch_id)
+        if branch is None:
+            return Response({"error": "Branch not found"}, status=404)
+        conflicts = preview_week_conflicts(branch, week_start_date, request.data.get('schedule') or [])
+        return Response({"branch_id": branch.id, "week_start_date": week_start_date, "double_bookings": conflicts})
+
+
+class ScheduleRangeExportView(APIView):
+    """
+    Расписание нескольких филиалов за диапазон недель, потоком:
+    NDJSON (output=ndjson, по умолчанию) или JSON-массив (output=json).
+    Параметры: start, end (week_start_date), branch_ids=1,2 и status=approved,draft (необязательно).
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def get(self, request):
+        params = request.query_params
+        start_date = parse_date_param(params.get('start'))
+        end_date = parse_date_param(params.get('end'))
+        if not start_date or not end_date or start_date > end_date:
+            return Response({"error": "Valid start and end dates are required"}, status=400)
+
+        try:
+            branch_ids = [int(value) for value in params.get('branch_ids', '').split(',') if value]
+        except ValueError:
+            return Response({"error": "branch_ids must be a comma-separated list of ids"}, status=400)
+        statuses = [value for value in params.get('status', '').split(',') if value]
+        if any(value not in dict(Schedule.STATUS_CHOICES) for value in statuses):
+            return Response({"error": "Invalid status"}, status=400)
+
+        rows = schedule_range_rows(branch_ids, start_date, end_date, statuses)
+        if params.get('output', 'ndjson') == 'json':
+            response = StreamingHttpResponse(iter_json_array(rows), content_type='application/json')
+        else:
+            response = StreamingHttpResponse(iter_ndjson(rows), content_type='application/x-ndjson')
+        logger.info(f"User {request.user.username} exported schedules {start_date}..{end_date} for branches {branch_ids or 'all'}")
+        return response
+
+
+class DayView(APIView):
+    """
+    Смены всех филиалов на одну дату: ?date=YYYY-MM-DD, необязательно branch_ids=1,2 и status.
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def get(self, request):
+        params = request.query_params
+        day = parse_date_param(params.get('date'))
+        if not day:
+            return Response({"error": "A valid date is required"}, status=400)
+
+        try:
+            branch_ids = [int(value) for value in params.get('branch_ids', '').split(',') if value]
+        except ValueError:
+            return Response({"error": "branch_ids must be a comma-separated list of ids"}, status=400)
+        statuses = [value for value in params.get('status', '').split(',') if value]
+        if any(value not in dict(Schedule.STATUS_CHOICES) for value in statuses):
+            return Response({"error": "Invalid status"}, status=400)
+
+        return Response(build_day_view(day, branch_ids, statuses))
+
+
+class PayrollExportView(APIView):
+    """
+    CSV по сотрудникам: количество смен и часы за период (недели с start по end).
+    Параметры: start, end, branch_ids=1,2 и status (по умолчанию approved).
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def get(self, request):
+        params = request.query_params
+        start_date = parse_date_param(params.get('start'))
+        end_date = parse_date_param(params.get('end'))
+        if not start_date or not end_date or start_date > end_date:
+            return Response({"error": "Valid start and end dates are required"}, status=400)
+
+        try:
+            branch_ids = [int(value) for value in params.get('branch_ids', '').split(',') if value]
+        except ValueError:
+            return Response({"error": "branch_ids must be a comma-separated list of ids"}, status=400)
+        statuses = [value for value in params.get('status', Schedule.APPROVED).split(',') if value]
+        if any(value not in dict(Schedule.STATUS_CHOICES) for value in statuses):
+            return Response({"error": "Invalid status"}, status=400)
+
+        rows = payroll_rows(start_date, end_date, branch_ids, statuses)
+        response = StreamingHttpResponse(iter_csv(PAYROLL_HEADER, rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="payroll_{start_date}_{end_date}.csv"'
+        logger.info(f"User {request.user.username} exported payroll {start_date}..{end_date} for branches {branch_ids or 'all'}")
+        return response
+
+
+class JobDetailView(APIView):
+    """
+    Статус и прогресс фоновой задачи. Видна создателю и администраторам.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = Job.objects.filter(pk=pk).first()
+        if job is None or (job.created_by_id != request.user.id and not has_role(request.user, ADMIN)):
+            return Response({"error": "Job not found"}, status=404)
+        return Response(serialize_job(job))
+
+
 class GetScheduleView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -289,81 +606,47 @@ class GetScheduleView(APIView):
         # Получаем параметр week_start_date из запроса
         week_start_date = request.query_params.get('week_start_date', None)
         logger.debug(f"Branch ID: {branch_id}, Status: {status}, Week Start Date: {week_start_date}")
-        
+
+        if status not in dict(Schedule.STATUS_CHOICES):
+            return Response([], status=200)
+
         if week_start_date:
-            # Фильтруем по указанной неделе
-            schedules = Schedule.objects.filter(
-                branch_id=branch_id,
-                status=status,
-                week_start_date=week_start_date
-            ).select_related('shift__room', 'employee__user') 
+            week_start_date = parse_date_param(week_start_date)
+            if not week_start_date:
+                return Response({"error": "Invalid week start date format."}, status=400)
+            scope = schedule_week_scope(branch_id, week_start_date)
         else:
-            # Если неделя не указана, ищем ближайшую или последнюю доступную
-            today = date.today()
-            current_week_start = today - timedelta(days=today.weekday() + 1)  # Начало текущей недели (воскресенье)   
-            # Попробуем найти расписание для текущей недели
-            schedules = Schedule.objects.filter(
-                branch_id=branch_id,
-                status=status,
-                week_start_date=current_week_start
-            ).select_related('shift__room', 'employee__user') 
-            
-            if not schedules.exists():
-                # Если расписания для текущей недели нет, находим последнюю доступную неделю
-                last_week_start = Schedule.objects.filter(
-                    branch_id=branch_id,
-                    status=status,
-                ).aggregate(Max('week_start_date'))['week_start_date__max']
-
-                if last_week_start:
-                    schedules = Schedule.objects.filter(
-                        branch_id=branch_id,
-                        # status=status.upper(),
-                        # status__in=[Schedule.DRAFT, Schedule.APPROVED],
-                        status=status,
-                        week_start_date=last_week_start
-                    ).select_related('shift__room', 'employee__user')
-              
-        # Если расписания не найдены, возвращаем пустой массив
-        if not schedules.exists():
-            logger.info(f"No schedules found for Branch {branch_id} with status {status} on Week {week_start_date}.")
-            return Response([], status=200)
-        
-        # Формируем данные для ответа
-        data = [
-            {
-                "week_start_date": schedule.week_start_date,
-                "shift_details": {
-                    "shift_type": schedule.shift.shift_type,
-                    "room": schedule.shift.room.name if schedule.shift.room else None,
-                    "room_details": {
-                      "id": schedule.shift.room.id if schedule.shift.room else None,
-                      "name": schedule.shift.room.name if schedule.shift.room else None,
-                    }
-                },
-                "day": schedule.shift.day_of_week,
-                "employee_name": schedule.employee.user.get_full_name() if schedule.employee else None,
-                "employee_id": schedule.employee.id if schedule.employee else None,
-            }
-            for schedule in schedules
-        ]
+            # Неделя по умолчанию зависит от всего филиала и от текущей даты
+            scope = schedule_branch_scope(branch_id)
 
-        logger.debug(f"Response Data: {data}")
-        return Response(data, status=200)
+        etag, last_modified = get_validators([scope], status, current_week_start())
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if not week_start_date:
+            # Если неделя не указана, берём текущую или последнюю доступную
+            week_start_date = resolve_default_week(branch_id, status)
+            if not week_start_date:
+                logger.info(f"No schedules found for Branch {branch_id} with status {status}.")
+                return set_validators(Response([], status=200), etag, last_modified)
+
+        # Готовый JSON из кэша; при промахе собирается из БД
+        content = get_week_grid(branch_id, week_start_date, status)
+        return set_validators(HttpResponse(content, content_type='application/json', status=200), etag, last_modified)
 
 
 class RoomsByBranchView(generics.ListAPIView):
     serializer_class = RoomSerializer
     permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_queryset(self):
         branch_id = self.kwargs['branch_id']
         return Room.objects.filter(branch_id=branch_id)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(ROOM_ROWS.serialize(self.get_queryset().order_by('id')))
     
 class UpdateScheduleView(APIView):
     permission_classes = [IsAuthenticated]
@@ -380,48 +663,35 @@ class UpdateScheduleView(APIView):
             return Response({"error": "Branch ID and schedules are required"}, status=400)
 
         try:
-            updated_count = 0  # Для логирования успешных обновлений
-            
-            for schedule_data in updated_schedules:
-                day = schedule_data.get('day')
-                shift_type = schedule_data['shift_details']['shift_type']
-                room_name = schedule_data['shift_details']['room']
-                employee_id = schedule_data.get('employee_id')
-
-                # Получаем ВСЕ смены для указанной комнаты, типа смены и дня недели
-                shifts = Shift.objects.filter(
-                    room__name=room_name,
-                    shift_type=shift_type,
-                    day_of_week=day,
-                    room__branch_id=branch_id
-                )
-                
-                if not shifts.exists():
-                    logger.warning(f"No matching shifts found for {room_name} {shift_type} on {day}")
-                    continue
-
-                for shift_instance in shifts:
-                    # Поиск всех расписаний для этой смены
-                    schedules = Schedule.objects.filter(
-                        shift=shift_instance,
-                        week_start_date=schedule_data['week_start_date'],
-                        branch_id=branch_id
-                    )
-
-                    if schedules.exists():
-                        for schedule in schedules:
-                            # Обновляем расписание
-                            schedule.employee = Employee.objects.filter(id=employee_id).first() if employee_id else None
-                            if new_status:
-                                schedule.status = new_status  # Применяем новый статус, если передан
-                            schedule.save()
-                            updated_count += 1
-                            logger.info(f"Updated schedule {schedule.id} - Status: {schedule.status}")
-                    else:
-                        logger.warning(f"No schedule found for shift {shift_instance} on {schedule_data['week_start_date']}")
-
-            logger.info(f"User {user.username} successfully updated {updated_count} schedules for branch {branch_id}.")
-            return Response({"status": "Schedules updated successfully", "updated_count": updated_count}, status=200)
+            branch = Branch.objects.get(pk=branch_id)
+        except Branch.DoesNotExist:
+            logger.warning(f"User {user.username} tried to update schedules for a non-existent branch: {branch_id}")
+            return Response({"error": "Branch not found"}, status=404)
+
+        try:
+            validate_update_entries(updated_schedules, new_status)
+        except ScheduleGridError as e:
+            logger.warning(f"User {user.username} sent invalid schedule updates: {e}")
+            return Response({"error": str(e)}, status=400)
+
+        if wants_async(request):
+            job = enqueue('update_week', {
+                'branch_id': branch.pk,
+                'schedules': updated_schedules,
+                'status': new_status,
+            }, user_id=user.id)
+            logger.info(f"User {user.username} queued schedule update for branch {branch_id} as job {job.pk}")
+            return job_accepted(job)
+
+        try:
+            # Один проход по сотрудникам, один запрос по неделе, bulk_update
+            updated_count, changed_count = update_week_entries(branch, updated_schedules, new_status)
+
+            logger.info(f"User {user.username} successfully updated {updated_count} schedules ({changed_count} changed) for branch {branch_id}.")
+            return Response({"status": "Schedules updated successfully", "updated_count": updated_count, "changed_count": changed_count}, status=200)
+        except ScheduleConflictError as e:
+            logger.warning(f"User {user.username} sent schedule updates with double bookings: {e}")
+            return conflict_response(e)
         except Exception as e:
             logger.exception("Error updating schedules")
             return Response({"error": str(e)}, status=500)
@@ -432,6 +702,11 @@ class AvailableWeeksView(APIView):
 
     def get(self, request, branch_id):
         status = request.query_params.get("status", None)  # Получаем статус из параметров
+        etag, last_modified = get_validators([schedule_branch_scope(branch_id)], status)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
         weeks_query = Schedule.objects.filter(branch_id=branch_id)
 
         if status:
@@ -439,7 +714,7 @@ class AvailableWeeksView(APIView):
 
         weeks = weeks_query.values_list("week_start_date", flat=True).distinct()
         sorted_weeks = sorted(set(weeks))  # Уникальные и отсортированные даты
-        return Response(sorted_weeks)
+        return set_validators(Response(sorted_weeks), etag, last_modified)
 
 class GetWeeklyScheduleView(APIView):
     permission_classes = [IsAuthenticated]
@@ -474,7 +749,7 @@ class SubmitAvailabilityView(APIView):
 
     def post(self, request):
         user = request.user
-        employee = Employee.objects.get(user=user)
+        employee = Employee.objects.get(user_id=user.id)
         availability_data = request.data.get('availability')
 
         if not availability_data:
@@ -493,12 +768,18 @@ class EmployeeNotificationsView(APIView):
 
     def get(self, request):
         user = request.user
-        try:
-            employee = Employee.objects.get(user=user)
-        except Employee.DoesNotExist:
+        employee_scope = get_employee_scope(user)
+        if employee_scope is None:
             return Response({"error": "Employee not found"}, status=404)
+        employee_id, _ = employee_scope
 
-        notifications = Notification.objects.filter(employee=employee).order_by("-created_at")
+        etag, last_modified = get_validators([employee_notifications_scope(employee_id)], request.query_params.urlencode())
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        # Keyset-пагинация: limit, cursor (старее), since (новее)
+        notifications, headers = paginate_keyset(Notification.objects.filter(employee_id=employee_id), request.query_params)
         data = [
             {
                 "id": notif.id,
@@ -508,7 +789,7 @@ class EmployeeNotificationsView(APIView):
             }
             for notif in notifications
         ]
-        return Response(data)
+        return set_validators(Response(data, headers=headers), etag, last_modified)
     
 @api_view(['POST'])
 def refresh_token(request):
@@ -521,15 +802,26 @@ def refresh_token(request):
             logger.warning("Попытка обновления токена без refresh-токена")
             return Response({"error": "Refresh token is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Проверяем, находится ли токен в черном списке
-        if BlacklistedToken.objects.filter(token=refresh_token).exists():
-            logger.warning(f"Попытка использования заблокированного refresh-токена: {refresh_token}")
+        # Подпись, срок и blacklist (по jti, через фильтр в памяти) проверяются при разборе
+        try:
+            refresh = FilteredRefreshToken(refresh_token)
+        except BlacklistedTokenError:
+            logger.warning("Попытка использования заблокированного refresh-токена")
             return Response({"error": "Token has been blacklisted"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        refresh = RefreshToken(refresh_token)
-        access_token = str(refresh.access_token)
+        # Версия токенов, существование и is_active пользователя — из БД, не из кэша
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        state = load_token_state(user_id)
+        rejection = token_rejection(refresh, state)
+        if rejection:
+            logger.warning(f"Отказ в обновлении refresh-токена пользователя {user_id}: {rejection}")
+            return Response({"error": rejection}, status=status.HTTP_401_UNAUTHORIZED)
 
-        logger.info(f"Access-токен успешно обновлен для пользователя {request.user.username}")
+        # Роль и филиал в новом access-токене — по текущим данным БД
+        user = User.objects.get(pk=user_id)
+        access_token = str(set_user_claims(refresh.access_token, user, token_version=state[1]))
+
+        logger.info(f"Access-токен успешно обновлен для пользователя {user.username}")
 
         return Response({"access": access_token}, status=status.HTTP_200_OK)
 
@@ -542,13 +834,18 @@ class AdminNotificationsView(APIView):
 
     def get(self, request):
         user = request.user
-        try:
-            admin_employee = Employee.objects.get(user=user)
-        except Employee.DoesNotExist:
+        employee_scope = get_employee_scope(user)
+        if employee_scope is None:
             return Response({"error": "Admin not found"}, status=404)
+        _, branch_id = employee_scope
+
+        etag, last_modified = get_validators([branch_notifications_scope(branch_id)], request.query_params.urlencode())
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
 
         # Получаем только уведомления, относящиеся к филиалу администратора
-        notifications = Notification.objects.filter(employee__branch=admin_employee.branch).order_by("-created_at")
+        notifications, headers = paginate_keyset(Notification.objects.filter(employee__branch_id=branch_id), request.query_params)
         
         data = [
             {
@@ -559,13 +856,51 @@ class AdminNotificationsView(APIView):
             }
             for notif in notifications
         ]
-        return Response(data)
+        return set_validators(Response(data, headers=headers), etag, last_modified)
     
+class UnreadNotificationsCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        employee_scope = get_employee_scope(request.user)
+        if employee_scope is None:
+            return Response({"error": "Employee not found"}, status=404)
+        employee_id, _ = employee_scope
+
+        etag, last_modified = get_validators([employee_notifications_scope(employee_id)], 'unread')
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        # Поддерживаемый счётчик вместо COUNT(*)
+        return set_validators(Response({"unread": unread_count(employee_id)}), etag, last_modified)
+
+
+class MarkNotificationsReadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        employee_scope = get_employee_scope(request.user)
+        if employee_scope is None:
+            return Response({"error": "Employee not found"}, status=404)
+        employee_id, branch_id = employee_scope
+
+        ids = request.data.get('ids')
+        if ids is None and not request.data.get('all'):
+            return Response({"error": "Provide notification ids or all=true"}, status=status.HTTP_400_BAD_REQUEST)
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return Response({"error": "ids must be a list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Один UPDATE на все уведомления
+        marked = mark_read(employee_id, branch_id, ids)
+        logger.info(f"User {request.user.username} marked {marked} notifications as read.")
+        return Response({"marked": marked, "unread": unread_count(employee_id)})
+
 class UpdateUserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        user = request.user  # Get authenticated user
+        user = resolve_user(request.user)  # Get authenticated user (DB model, not token claims)
         data = request.data
 
         try:
@@ -616,45 +951,141 @@ class ShiftPreferenceView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        employee = Employee.objects.get(user=self.request.user)
+        employee_id, _ = self.get_employee_scope()
         week_start_date = self.request.query_params.get('week_start_date')
-        return ShiftPreference.objects.filter(employee=employee, week_start_date=week_start_date)
+        return ShiftPreference.objects.filter(employee_id=employee_id, week_start_date=week_start_date)
+
+    def get_employee_scope(self):
+        employee_scope = get_employee_scope(self.request.user)
+        if employee_scope is None:
+            raise NotFound("Employee not found")
+        return employee_scope
 
     def create(self, request, *args, **kwargs):
-        employee = Employee.objects.get(user=request.user)
+        """
+        Один объект или список. Повторная отправка тех же пожеланий не ошибка
+        (result: updated); ?replace=true удаляет прочие ожидающие пожелания тех же недель.
+        """
+        employee_id, branch_id = self.get_employee_scope()
         many = isinstance(request.data, list)
-        serializer = self.get_serializer(data=request.data, many=many)
-        serializer.is_valid(raise_exception=True)
-        
-        if many:
-            objects = []
-            for item in serializer.validated_data:
-                item['employee'] = employee
-                item['branch'] = employee.branch
-                # status будет выставлен по умолчанию в 'pending'
-                objects.append(ShiftPreference(**item))
-            created_objs = ShiftPreference.objects.bulk_create(objects)
-            output_serializer = self.get_serializer(created_objs, many=True)
-            return Response(output_serializer.data, status=status.HTTP_201_CREATED)
+        items = request.data if many else [request.data]
+        replace = request.query_params.get('replace', '').lower() in ('true', '1')
+
+        results, deleted = upsert_preferences(employee_id, branch_id, items, replace=replace)
+        failed = sum(1 for result in results if result['result'] == ERROR)
+
+        if not many:
+            result = results[0]
+            if failed:
+                return Response(result['errors'], status=status.HTTP_400_BAD_REQUEST)
+            return Response(result, status=status.HTTP_201_CREATED if result['result'] == CREATED else status.HTTP_200_OK)
+
+        if failed == len(results) and results:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
         else:
-            self.perform_create(serializer)
-            headers = self.get_success_headers(serializer.data)
-            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-
-    def perform_create(self, serializer):
-        employee = Employee.objects.get(user=self.request.user)
-        serializer.save(employee=employee, branch=employee.branch)
+            response_status = status.HTTP_201_CREATED
+        headers = {'X-Deleted-Count': str(deleted)} if replace else None
+        return Response(results, status=response_status, headers=headers)
 
 # View для администраторов (просмотр предпочтений сотрудников филиала)
 class ShiftPreferenceAdminView(generics.ListAPIView):
     serializer_class = ShiftPreferenceSerializer
     permission_classes = [IsAuthenticated, IsAdminGroup]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_queryset(self):
         branch_id = self.request.query_params.get('branch_id')
         week_start_date = self.request.query_params.get('week_start_date')
         return ShiftPreference.objects.filter(branch_id=branch_id, week_start_date=week_start_date)
 
+    def list(self, request, *args, **kwargs):
+        return Response(SHIFT_PREFERENCE_ROWS.serialize(self.get_queryset().order_by('id')))
+
+class PreferenceMatrixView(APIView):
+    """
+    Пожелания сотрудников и назначения недели в одной компактной структуре
+    (день × тип смены × комната) для экрана утверждения.
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request):
+        branch_id = request.query_params.get('branch_id')
+        week_start_date = parse_date_param(request.query_params.get('week_start_date'))
+        if not branch_id or not week_start_date:
+            return Response({"error": "Branch ID and a valid week start date are required"}, status=400)
+        try:
+            branch_id = int(branch_id)
+        except ValueError:
+            return Response({"error": "Invalid branch ID"}, status=400)
+        return Response(preference_matrix(branch_id, week_start_date))
+
+class BulkPreferenceStatusView(APIView):
+    """
+    Пакетная смена статуса пожеланий филиала: по списку ids и/или фильтрам
+    (week_start_date, employee_ids, current_status). С materialize=true
+    утверждённые пожелания сразу попадают в черновик расписания недели.
+    """
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    def post(self, request):
+        user = request.user
+        data = request.data
+        branch_id = data.get('branch_id')
+        new_status = data.get('status')
+        statuses = dict(ShiftPreference.STATUS_CHOICES)
+        if not branch_id or new_status not in statuses:
+            return Response({"error": "Branch ID and a valid status are required"}, status=400)
+        if data.get('current_status') and data['current_status'] not in statuses:
+            return Response({"error": "Invalid current_status"}, status=400)
+
+        ids = data.get('ids')
+        employee_ids = data.get('employee_ids')
+        week_start_date = data.get('week_start_date')
+        if week_start_date:
+            week_start_date = parse_date_param(week_start_date)
+            if not week_start_date:
+                return Response({"error": "Invalid week start date"}, status=400)
+        if ids is None and not week_start_date:
+            # Без ids и недели UPDATE затронул бы все пожелания филиала
+            return Response({"error": "Either ids or week_start_date is required"}, status=400)
+        for name, values in (('ids', ids), ('employee_ids', employee_ids)):
+            if values is not None and (not isinstance(values, list) or not all(isinstance(value, int) for value in values)):
+                return Response({"error": f"{name} must be a list of ids"}, status=400)
+
+        materialize = str(data.get('materialize', False)).lower() in ('true', '1')
+        if materialize and new_status != 'approved':
+            return Response({"error": "materialize requires status 'approved'"}, status=400)
+
+        try:
+            branch = Branch.objects.get(pk=branch_id)
+        except Branch.DoesNotExist:
+            return Response({"error": "Branch not found"}, status=404)
+
+        try:
+            result = bulk_set_status(
+                branch, new_status,
+                ids=ids,
+                week_start_date=week_start_date,
+                employee_ids=employee_ids,
+                current_status=data.get('current_status'),
+                materialize=materialize,
+            )
+        except WeekPublishedError as e:
+            return Response({"error": str(e)}, status=409)
+        except ScheduleConflictError as e:
+            return conflict_response(e)
+        except ScheduleGridError as e:
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            logger.exception(f"Error while updating preference statuses: {str(e)}")
+            return Response({"error": str(e)}, status=500)
+
+        logger.info(f"User {user.username} set {result['updated']} preferences to {new_status} in branch {branch.name}")
+        return Response(result)
+
 # This view allows retrieving, updating, or deleting a single ShiftPreference object.
 class ShiftPreferenceDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ShiftPreferenceSerializer
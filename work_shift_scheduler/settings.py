@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,7 +49,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shifts.authentication.ClaimsJWTAuthentication',
     )
 }
 
@@ -72,6 +74,7 @@ SIMPLE_JWT = {
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'TOKEN_OBTAIN_SERIALIZER': 'shifts.authentication.EmployeeTokenObtainPairSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
@@ -113,6 +116,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'work_shift_scheduler.wsgi.application'
 
+# Файл логов. `manage.py test` пишет во временный каталог, чтобы прогон тестов
+# не засорял system.log проекта (он в .gitignore).
+TESTING = sys.argv[1:2] == ['test']
+LOG_FILE = os.environ.get("LOG_FILE") or (
+    os.path.join(tempfile.gettempdir(), 'easyshift-test.log') if TESTING else os.path.join(BASE_DIR, 'system.log')
+)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -130,7 +140,7 @@ LOGGING = {
         'file': {
             'level': 'INFO',  # Логи INFO и выше записываются в файл
             'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'system.log'),
+            'filename': LOG_FILE,
             'formatter': 'verbose',
         },
         'console': {
@@ -163,6 +173,49 @@ DATABASES = {
     }
 }
 
+# Cache
+# Сетка недели (shifts/read_models.py) хранится в кэше под ключом с ревизией
+# из БД, поэтому LocMem каждого процесса не отдаёт устаревшие данные; общий
+# кэш (Redis через REDIS_URL) лишь избавляет процессы от повторной сборки.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+WEEK_GRID_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Уведомления об утверждении расписания идут через outbox (shifts/notifications.py).
+# True — разбирать очередь в фоновом потоке после коммита; False — только
+# командой `python manage.py process_notification_outbox --loop`.
+NOTIFICATION_OUTBOX_AUTODRAIN = os.environ.get("NOTIFICATION_OUTBOX_AUTODRAIN", "true").lower() == "true"
+
+# Фоновые задачи (shifts/jobs.py). True — выполнять в пуле потоков этого
+# процесса после коммита; False — только `python manage.py run_jobs --loop`.
+# Отдельный воркер видит задачи веб-сервиса только при общей БД, поэтому
+# пока БД — локальный SQLite, задачи выполняет веб-процесс.
+JOBS_AUTORUN = os.environ.get("JOBS_AUTORUN", "true").lower() == "true"
+# Воркер обновляет heartbeat задачи раз в JOBS_HEARTBEAT_SECONDS; задача running
+# без heartbeat дольше JOBS_RUNNING_TIMEOUT секунд возвращается в очередь.
+JOBS_HEARTBEAT_SECONDS = int(os.environ.get("JOBS_HEARTBEAT_SECONDS", "30"))
+JOBS_RUNNING_TIMEOUT = int(os.environ.get("JOBS_RUNNING_TIMEOUT", "300"))
+
+# Часы смены для зарплатной выгрузки, если у смены не задано start_time/end_time
+PAYROLL_DEFAULT_SHIFT_HOURS = {
+    'בוקר': 8,
+    'אמצע': 8,
+    'ערב': 8,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -210,3 +263,10 @@ CORS_ALLOWED_ORIGINS = [
     'https://easy-shift-frontend-react.vercel.app',
     'https://easyshift.vercel.app'
 ]
+
+# Заголовки, которые фронтенд должен видеть в ответах (условные GET, курсоры лент)
+CORS_EXPOSE_HEADERS = [
+    'ETag',
+    'X-Next-Cursor',
+    'X-Poll-Cursor',
+]